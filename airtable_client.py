@@ -0,0 +1,251 @@
+"""Rate-limit-aware wrapper around the Airtable client.
+
+Airtable allows 5 requests per second per base and answers anything faster
+with a 429 (and, without a Retry-After header, a 30 second penalty). Every
+table call made through a ThrottledApi:
+
+* waits for a token from a per-base bucket refilled at AIRTABLE_REQUESTS_PER_SECOND,
+  one token per HTTP request (each page of a read, each 10-record batch);
+* on a 429, pauses all callers for Retry-After (or AIRTABLE_RETRY_AFTER_DEFAULT),
+  halves the request rate, then retries; the rate climbs back after a run of
+  successful requests;
+* splits batch creates/updates/deletes into requests of 10 records, so a retry
+  repeats one chunk rather than re-sending records already written;
+* shares one request between concurrent identical reads (e.g. the same
+  `{Applicant ID} = '...'` lookup from several workers).
+"""
+import copy
+import time
+import random
+import threading
+from config import (BATCH_SIZE, AIRTABLE_REQUESTS_PER_SECOND, AIRTABLE_MAX_RETRIES, AIRTABLE_RETRY_AFTER_DEFAULT)
+from metrics import metrics
+from rate_limiter import TokenBucket
+from utils import chunked
+
+# Slowest rate the throttle backs off to, and how many clean requests earn back 0.5 req/s
+MIN_REQUESTS_PER_SECOND = 0.5
+RECOVERY_REQUESTS = 20
+MAX_BACKOFF_SECONDS = 60
+
+def is_rate_limited(error):
+    response = getattr(error, 'response', None)
+    return getattr(response, 'status_code', None) == 429
+
+def retry_after(error, default=AIRTABLE_RETRY_AFTER_DEFAULT):
+    """Seconds the server asked us to wait, from the Retry-After header when it has one"""
+    headers = getattr(getattr(error, 'response', None), 'headers', None) or {}
+    try:
+        return max(0.0, float(headers.get('Retry-After')))
+    except (TypeError, ValueError):
+        return default
+
+class AdaptiveThrottle:
+    """Token bucket for one base whose rate backs off on 429s and recovers gradually"""
+
+    def __init__(self, requests_per_second=AIRTABLE_REQUESTS_PER_SECOND):
+        self.max_rate = requests_per_second
+        # Capacity 1 spaces requests evenly instead of allowing a burst above the per-second limit
+        self.bucket = TokenBucket(requests_per_second * 60, capacity=1)
+        self.paused_until = 0.0
+        self.clean_requests = 0
+        self.lock = threading.Lock()
+
+    @property
+    def rate(self):
+        return self.bucket.rate
+
+    def _set_rate(self, rate):
+        with self.bucket.lock:
+            self.bucket._refill()
+            self.bucket.rate = rate
+
+    def acquire(self):
+        """Block until a request may be sent, returning the seconds spent waiting"""
+        started = time.monotonic()
+        while True:
+            with self.lock:
+                pause = self.paused_until - time.monotonic()
+            if pause <= 0:
+                break
+            time.sleep(pause)
+        self.bucket.acquire()
+        return time.monotonic() - started
+
+    def succeeded(self):
+        with self.lock:
+            if self.rate >= self.max_rate:
+                return
+            self.clean_requests += 1
+            if self.clean_requests >= RECOVERY_REQUESTS:
+                self.clean_requests = 0
+                self._set_rate(min(self.max_rate, self.rate + 0.5))
+
+    def rate_limited(self, error, attempt):
+        """Pause every caller after a 429 and slow down; returns the pause in seconds"""
+        # Honour Retry-After, doubling it for repeated failures of the same request
+        delay = min(MAX_BACKOFF_SECONDS, retry_after(error) * 2 ** attempt) + random.uniform(0, 0.1)
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + delay)
+            self.clean_requests = 0
+            self._set_rate(max(MIN_REQUESTS_PER_SECOND, self.rate / 2))
+        return delay
+
+class _Pending:
+    """A read in flight that identical concurrent reads wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class ThrottledTable:
+    """pyairtable Table lookalike that paces, retries, batches and coalesces its calls"""
+
+    def __init__(self, table, base_id, name, throttle, inflight, inflight_lock, max_retries=AIRTABLE_MAX_RETRIES):
+        self.table = table
+        self.base_id = base_id
+        self.name = name
+        self.throttle = throttle
+        self.inflight = inflight
+        self.inflight_lock = inflight_lock
+        self.max_retries = max_retries
+
+    def __getattr__(self, attribute):
+        return getattr(self.table, attribute)
+
+    def _wait(self):
+        waited = self.throttle.acquire()
+        if waited > 0.001:
+            metrics.observe('airtable_throttle_wait_seconds', waited)
+
+    def _backoff(self, error, attempt):
+        if not is_rate_limited(error) or attempt >= self.max_retries:
+            raise error
+        delay = self.throttle.rate_limited(error, attempt)
+        metrics.increment('airtable_retries_total', table=self.name)
+        print(f"Airtable rate limit hit on {self.name}; retrying in {delay:.1f}s "
+              f"at {self.throttle.rate:.1f} requests/second")
+
+    def _request(self, function, *args, **kwargs):
+        """One HTTP request: wait for a token, retrying on 429"""
+        attempt = 0
+        while True:
+            self._wait()
+            try:
+                result = function(*args, **kwargs)
+            except Exception as error:
+                self._backoff(error, attempt)
+                attempt += 1
+                continue
+            self.throttle.succeeded()
+            return result
+
+    def _coalesced(self, operation, function, *args, **kwargs):
+        """Run a read, or wait for an identical one already in flight and share its result"""
+        key = (self.base_id, self.name, operation, repr(args), repr(sorted(kwargs.items())))
+        with self.inflight_lock:
+            pending = self.inflight.get(key)
+            leader = pending is None
+            if leader:
+                pending = self.inflight[key] = _Pending()
+        if not leader:
+            metrics.increment('airtable_coalesced_reads_total', table=self.name, operation=operation)
+            pending.done.wait()
+            if pending.error is not None:
+                raise pending.error
+            # Callers may edit the records they get back, so followers get their own copy
+            return copy.deepcopy(pending.result)
+        try:
+            pending.result = function(*args, **kwargs)
+            return pending.result
+        except Exception as error:
+            pending.error = error
+            raise
+        finally:
+            with self.inflight_lock:
+                del self.inflight[key]
+            pending.done.set()
+
+    def iterate(self, *args, **kwargs):
+        """Yield pages, one throttled request each. A 429 mid-scan restarts the scan and
+        skips the pages already yielded (pyairtable cannot resume a failed iteration)."""
+        delivered = 0
+        attempt = 0
+        while True:
+            pages = self.table.iterate(*args, **kwargs)
+            index = 0
+            try:
+                while True:
+                    self._wait()
+                    try:
+                        page = next(pages)
+                    except StopIteration:
+                        return
+                    self.throttle.succeeded()
+                    index += 1
+                    if index > delivered:
+                        delivered = index
+                        attempt = 0
+                        yield page
+            except Exception as error:
+                self._backoff(error, attempt)
+                attempt += 1
+
+    def _all(self, *args, **kwargs):
+        return [record for page in self.iterate(*args, **kwargs) for record in page]
+
+    def all(self, *args, **kwargs):
+        return self._coalesced('all', self._all, *args, **kwargs)
+
+    def first(self, *args, **kwargs):
+        return self._coalesced('first', self._request, self.table.first, *args, **kwargs)
+
+    def get(self, record_id, **kwargs):
+        return self._coalesced('get', self._request, self.table.get, record_id, **kwargs)
+
+    def create(self, fields, **kwargs):
+        return self._request(self.table.create, fields, **kwargs)
+
+    def update(self, record_id, fields, **kwargs):
+        return self._request(self.table.update, record_id, fields, **kwargs)
+
+    def delete(self, record_id):
+        return self._request(self.table.delete, record_id)
+
+    def batch_create(self, records, **kwargs):
+        return [record for chunk in chunked(records, BATCH_SIZE)
+                for record in self._request(self.table.batch_create, chunk, **kwargs)]
+
+    def batch_update(self, records, **kwargs):
+        return [record for chunk in chunked(records, BATCH_SIZE)
+                for record in self._request(self.table.batch_update, chunk, **kwargs)]
+
+    def batch_delete(self, record_ids):
+        return [record for chunk in chunked(record_ids, BATCH_SIZE)
+                for record in self._request(self.table.batch_delete, chunk)]
+
+class ThrottledApi:
+    """Wraps a pyairtable Api so every table it hands out shares its base's throttle"""
+
+    def __init__(self, api, requests_per_second=AIRTABLE_REQUESTS_PER_SECOND, max_retries=AIRTABLE_MAX_RETRIES):
+        self.api = api
+        self.requests_per_second = requests_per_second
+        self.max_retries = max_retries
+        self.throttles = {}
+        self.inflight = {}
+        self.lock = threading.Lock()
+
+    def __getattr__(self, attribute):
+        return getattr(self.api, attribute)
+
+    def throttle(self, base_id):
+        """The limit is per base, so each base gets its own bucket"""
+        with self.lock:
+            if base_id not in self.throttles:
+                self.throttles[base_id] = AdaptiveThrottle(self.requests_per_second)
+            return self.throttles[base_id]
+
+    def table(self, base_id, table_name):
+        return ThrottledTable(self.api.table(base_id, table_name), base_id, table_name, self.throttle(base_id),
+                              self.inflight, self.lock, self.max_retries)
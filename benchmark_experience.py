@@ -0,0 +1,64 @@
+"""Micro-benchmark: experience-interval engine vs the original strptime loop.
+
+    python benchmark_experience.py
+    python benchmark_experience.py --profiles 100000 1000000
+"""
+import time
+import random
+import argparse
+from datetime import datetime
+from utils import calculate_experience_years, calculate_experience_years_batch, parse_date_ordinal
+
+def legacy_experience_years(experience_data):
+    """The original implementation: strptime per date, raw durations summed"""
+    total_years = 0
+    for job in experience_data:
+        start_str = job.get('start', '')
+        end_str = job.get('end', '')
+        if start_str and end_str:
+            try:
+                start_date = datetime.strptime(start_str, '%Y-%m-%d')
+                end_date = datetime.strptime(end_str, '%Y-%m-%d')
+                total_years += (end_date - start_date).days / 365.25
+            except ValueError:
+                continue
+    return total_years
+
+def generate_profiles(count, seed=11):
+    """Synthetic experience lists shaped like the compressed JSON 'experience' section"""
+    rng = random.Random(seed)
+    profiles = []
+    for _ in range(count):
+        jobs = []
+        start_year = rng.randint(2005, 2020)
+        for _ in range(rng.randint(1, 4)):
+            end_year = min(start_year + rng.randint(1, 4), 2025)
+            jobs.append({
+                'start': f"{start_year}-{rng.randint(1, 12):02d}-01",
+                'end': f"{end_year}-{rng.randint(1, 12):02d}-01",
+            })
+            start_year = end_year
+        profiles.append(jobs)
+    return profiles
+
+def time_it(function):
+    started = time.perf_counter()
+    function()
+    return time.perf_counter() - started
+
+def run(sizes):
+    for size in sizes:
+        profiles = generate_profiles(size)
+        legacy = time_it(lambda: [legacy_experience_years(jobs) for jobs in profiles])
+        parse_date_ordinal.cache_clear()
+        scalar = time_it(lambda: [calculate_experience_years(jobs) for jobs in profiles])
+        parse_date_ordinal.cache_clear()
+        batch = time_it(lambda: calculate_experience_years_batch(profiles))
+        print(f"{size:>8} profiles | legacy {legacy:.2f}s | scalar {scalar:.2f}s ({legacy / scalar:.1f}x) | "
+              f"batch {batch:.2f}s ({legacy / batch:.1f}x) | {size / batch:,.0f} profiles/s")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark experience-years calculation")
+    parser.add_argument("--profiles", type=int, nargs="+", default=[10000, 100000])
+    args = parser.parse_args()
+    run(args.profiles)
@@ -0,0 +1,356 @@
+"""Micro-benchmark and regression check for the per-applicant hot paths.
+
+Times the pure-Python functions that run once per applicant (experience
+years, tier-1 and location matching, currency conversion, validation,
+shortlist evaluation and LLM response parsing) over a deterministic stream
+of synthetic profiles: 0-6 jobs with ISO, year-month, month-name, bare-year
+and "Present" dates; clean, abbreviated, city-only, remote and ineligible
+locations; and well-formed, padded, truncated, over-long and chatty LLM
+responses. Profiles are generated a chunk at a time outside the timed loop,
+so a million of them never sit in memory at once. The date, company and
+location caches are cleared before each size and then warm up the way they
+do during a pipeline run.
+
+Each function reports ops/sec (the best of --repeat timed passes per chunk)
+and, from tracemalloc over the first --sample calls, the bytes allocated per
+call (peak above the starting point) and the bytes still held afterwards
+(cache growth). Raw ops/sec depend on the machine and on whatever else it is
+running, so each timing is paired with one of a fixed reference workload
+taken right after it: a function's relative cost (its time per call over the
+reference's, the median over the pairs) stays put when the whole machine is
+faster, slower or busy.
+
+--check and --update-baseline run each size CHECK_ROUNDS times and keep each
+function's median round, along with how far its rounds spread (noise_pct).
+--update-baseline stores that per size in benchmark_hot_paths_baseline.json.
+--check fails when a function's relative cost shows it more than
+--max-slowdown percent (or its recorded noise_pct, if larger) slower than
+the baseline. By default it checks CHECK_SIZES profiles, which suits CI.
+
+    python benchmark_hot_paths.py                                  # 1k, 100k and 1M profiles
+    python benchmark_hot_paths.py --sizes 10000 --update-baseline
+    python benchmark_hot_paths.py --check --max-slowdown 25
+"""
+import os
+import gc
+import sys
+import json
+import time
+import random
+import statistics
+import argparse
+import tracemalloc
+from datetime import date
+from config import TIER_1_COMPANIES
+from llm_evaluation import parse_llm_response
+from matchers import match_company, match_location
+from shortlist_candidates import evaluate_applicant
+from utils import (calculate_experience_years, has_tier1_experience, meets_location_criteria, convert_to_usd,
+                   validate_applicant_data, parse_date_ordinal)
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_hot_paths_baseline.json')
+DEFAULT_SIZES = [1000, 100000, 1000000]
+# What --check runs when --sizes is not given: big enough to warm the caches, small enough for CI
+CHECK_SIZES = [10000]
+# Rounds per size for --check and --update-baseline; each function keeps its median round
+CHECK_ROUNDS = 5
+CHUNK_SIZE = 10000
+# Short timings are mostly noise; cheap functions are looped over their chunk until a pass takes this long
+MIN_PASS_SECONDS = 0.01
+# Fixed so experience years (and so evaluate_applicant's branches) do not drift with the calendar
+TODAY = date(2025, 6, 1)
+
+MONTH_NAMES = ["Jan", "February", "Mar", "April", "May", "June", "Jul", "August", "Sept", "October", "Nov", "December"]
+DATE_FORMATS = [
+    lambda year, month: f"{year}-{month:02d}-01",
+    lambda year, month: f"{year}-{month:02d}-01T00:00:00Z",
+    lambda year, month: f"{year}-{month:02d}",
+    lambda year, month: f"{month:02d}/{year}",
+    lambda year, month: f"{MONTH_NAMES[month - 1]} {year}",
+    lambda year, month: f"{year}",
+]
+OTHER_COMPANIES = ["Acme Corp", "Initech", "Globex", "Umbrella", "Hooli", "Stripe", "Wayne Enterprises", "Pied Piper"]
+TIER_1_VARIANTS = ["{} LLC", "{} Inc.", "{}", "{} Research", "the {} company"]
+LOCATIONS = ["San Francisco, CA, USA", "New York", "Toronto, Canada", "London, UK", "Berlin", "Munich, Germany",
+             "Bengaluru, Karnataka, India", "Austin, TX, US", "Remote", "", "Cape Town, South Africa",
+             "Madrid, Spain", "Sydney, Australia", "Mumbai, IN", "Vancouver, BC"]
+CURRENCIES = ["USD", "USD", "USD", "CAD", "GBP", "EUR", "INR", "JPY"]
+TITLES = ["Software Engineer", "Senior Engineer", "Data Scientist", "Tech Lead", "ML Engineer", "Intern"]
+
+def _experience(rng, count):
+    jobs = []
+    year = rng.randint(2003, 2021)
+    for position in range(count):
+        end_year = min(year + rng.randint(0, 4), 2025)
+        start = rng.choice(DATE_FORMATS)(year, rng.randint(1, 12))
+        if position == count - 1 and rng.random() < 0.3:
+            end = rng.choice(["Present", "current", ""])
+        else:
+            end = rng.choice(DATE_FORMATS)(end_year, rng.randint(1, 12))
+        if rng.random() < 0.25:
+            company = rng.choice(TIER_1_VARIANTS).format(rng.choice(TIER_1_COMPANIES))
+        elif rng.random() < 0.5:
+            company = rng.choice(OTHER_COMPANIES)
+        else:
+            # Long tail of companies nobody else worked at
+            company = f"{rng.choice(OTHER_COMPANIES)} {rng.randint(1, 50000)}"
+        jobs.append({"company": company, "title": rng.choice(TITLES), "start": start, "end": end,
+                     "technologies": rng.sample(["Python", "Go", "React", "AWS", "Kubernetes", "SQL"], 2)})
+        # Some jobs overlap the previous one, most follow it
+        year = end_year - rng.randint(0, 1)
+    return jobs
+
+def _location(rng):
+    if rng.random() < 0.1:
+        return f"Suburb {rng.randint(1, 20000)}, {rng.choice(['Germany', 'Canada', 'Brazil', 'UK'])}"
+    return rng.choice(LOCATIONS)
+
+def _response(rng, applicant_id):
+    summary = (f"Applicant {applicant_id} has {rng.randint(1, 15)} years across backend and data roles, "
+               f"most recently leading a team of {rng.randint(2, 12)}.")
+    follow_ups = "\n".join(f"• Question {n} about their {rng.choice(TITLES).lower()} work?" for n in range(1, 4))
+    shape = rng.randrange(7)
+    if shape == 0:
+        # Padded: blank lines and indentation
+        return f"\n\n  Summary: {summary}\n\n  Score: {rng.randint(1, 10)}\n  Issues: None\n  Follow-Ups:\n  {follow_ups}\n"
+    if shape == 1:
+        # Truncated: stops before Follow-Ups
+        return f"Summary: {summary}\nScore: {rng.randint(1, 10)}\nIssues: Missing salary currency"
+    if shape == 2:
+        # Over-long summary, cut to FIELD_LIMITS
+        return f"Summary: {summary * 8}\nScore: {rng.randint(1, 10)}\nIssues: None\nFollow-Ups:\n{follow_ups}"
+    if shape == 3:
+        # Chatty: text after the last field
+        return (f"Summary: {summary}\nScore: {rng.randint(1, 10)}\nIssues: None\nFollow-Ups:\n{follow_ups}\n\n"
+                "Let me know if you would like a more detailed assessment of this candidate.")
+    if shape == 4:
+        # Unparseable score and multi-line summary
+        return f"Summary: {summary}\nThey also mentor juniors.\nScore: {rng.randint(1, 10)}/10\nIssues: None\nFollow-Ups:\n{follow_ups}"
+    if shape == 5:
+        return ""
+    return f"Summary: {summary}\nScore: {rng.randint(1, 10)}\nIssues: None\nFollow-Ups:\n{follow_ups}"
+
+def generate_cases(count, seed=2024, chunk_size=CHUNK_SIZE):
+    """Yield lists of (applicant_id, profile, llm_response) cases, chunk_size at a time, the same for every run"""
+    rng = random.Random(seed)
+    for offset in range(0, count, chunk_size):
+        chunk = []
+        for applicant_id in range(offset + 1, min(offset + chunk_size, count) + 1):
+            profile = {
+                "personal": {"name": f"Applicant {applicant_id}", "email": f"applicant{applicant_id}@example.com",
+                             "location": _location(rng), "linkedin": ""},
+                "experience": _experience(rng, rng.choice([0, 1, 1, 2, 2, 2, 3, 3, 4, 5, 6])),
+                "salary": {"preferred_rate": rng.randint(15, 250), "minimum_rate": rng.randint(10, 150),
+                           "currency": rng.choice(CURRENCIES), "availability": rng.choice([0, 10, 20, 30, 40])},
+            }
+            # A few incomplete profiles, as validate_applicant_data sees in practice
+            if rng.random() < 0.03:
+                del profile["personal"]["location"]
+            chunk.append((str(applicant_id), profile, _response(rng, applicant_id)))
+        yield chunk
+
+# Each hot path and how to build its arguments from a case
+HOT_PATHS = {
+    'calculate_experience_years': (calculate_experience_years, lambda case: (case[1]['experience'], TODAY)),
+    'has_tier1_experience': (has_tier1_experience, lambda case: (case[1]['experience'],)),
+    'meets_location_criteria': (meets_location_criteria, lambda case: (case[1]['personal'].get('location'),)),
+    'convert_to_usd': (convert_to_usd, lambda case: (case[1]['salary']['preferred_rate'], case[1]['salary']['currency'])),
+    'validate_applicant_data': (validate_applicant_data, lambda case: (case[1],)),
+    'evaluate_applicant': (evaluate_applicant, lambda case: (case[0], case[1])),
+    'parse_llm_response': (parse_llm_response, lambda case: (case[2],)),
+}
+
+REFERENCE_WORDS = ("Senior Engineer", "Google LLC", "2020-03-01", "Berlin, Germany")
+REFERENCE_ARGUMENTS = [(value,) for value in range(1000)]
+
+def reference_call(value):
+    """Fixed mix of the string, dict and small-object work the hot paths do; the yardstick for relative cost"""
+    text = f"{value} {REFERENCE_WORDS[value % len(REFERENCE_WORDS)]}".lower()
+    fields = {"text": text, "words": text.split()}
+    return len(fields["words"]) + fields["text"].count("e")
+
+def clear_caches():
+    parse_date_ordinal.cache_clear()
+    match_company.cache_clear()
+    match_location.cache_clear()
+
+def _time_pass(function, arguments, loops=1):
+    # Like timeit, keep the garbage collector out of the timings: when it runs depends on the whole heap
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        started = time.perf_counter()
+        for _ in range(loops):
+            for args in arguments:
+                function(*args)
+        return time.perf_counter() - started
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+def _loops(function, arguments):
+    """Passes over the calls needed for one timing to last MIN_PASS_SECONDS (like timeit's autorange)"""
+    loops = 1
+    while _time_pass(function, arguments, loops) < MIN_PASS_SECONDS and loops < 1024:
+        loops *= 2
+    return loops
+
+def _seconds_per_call(function, arguments, repeat):
+    """(best seconds per call over `repeat` timings, median relative cost).
+
+    Each timing of the function is paired with one of reference_call taken
+    right after it, so both see the same machine load; the median of the
+    paired ratios ignores the odd pass that caught a burst.
+    """
+    loops = _loops(function, arguments)
+    reference_loops = _loops(reference_call, REFERENCE_ARGUMENTS)
+    timings = []
+    ratios = []
+    for _ in range(max(1, repeat)):
+        elapsed = _time_pass(function, arguments, loops) / (loops * len(arguments))
+        reference = _time_pass(reference_call, REFERENCE_ARGUMENTS, reference_loops) / (
+            reference_loops * len(REFERENCE_ARGUMENTS))
+        timings.append(elapsed)
+        ratios.append(elapsed / reference)
+    return min(timings), statistics.median(ratios)
+
+def _allocations(function, arguments):
+    """(bytes allocated per call at peak, bytes still held per call) over the given calls"""
+    tracemalloc.start()
+    try:
+        allocated = 0
+        start_held = tracemalloc.get_traced_memory()[0]
+        for args in arguments:
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            function(*args)
+            allocated += tracemalloc.get_traced_memory()[1] - before
+        held = tracemalloc.get_traced_memory()[0] - start_held
+    finally:
+        tracemalloc.stop()
+    return allocated / len(arguments), held / len(arguments)
+
+def run(size, repeat=5, sample=2000):
+    """Benchmark every hot path over `size` generated profiles"""
+    clear_caches()
+    seconds = dict.fromkeys(HOT_PATHS, 0.0)
+    # Relative cost summed over calls, to average it over the chunks
+    relative = dict.fromkeys(HOT_PATHS, 0.0)
+    allocations = {}
+    for chunk in generate_cases(size):
+        for name, (function, build_args) in HOT_PATHS.items():
+            arguments = [build_args(case) for case in chunk]
+            # Traced first, while the caches are cold, so cache growth shows up as bytes held
+            if name not in allocations:
+                allocations[name] = _allocations(function, arguments[:sample])
+            per_call, relative_cost = _seconds_per_call(function, arguments, repeat)
+            seconds[name] += per_call * len(arguments)
+            relative[name] += relative_cost * len(arguments)
+    functions = {}
+    for name in HOT_PATHS:
+        allocated, held = allocations[name]
+        functions[name] = {
+            "ops_per_sec": round(size / seconds[name]) if seconds[name] else None,
+            "mean_us": round(seconds[name] / size * 1e6, 3),
+            "relative_cost": round(relative[name] / size, 3),
+            "alloc_bytes_per_call": round(allocated, 1),
+            "retained_bytes_per_call": round(held, 1),
+        }
+    return {"profiles": size, "functions": functions}
+
+def run_rounds(size, rounds=1, repeat=5, sample=2000):
+    """run() `rounds` times; each function keeps its median round plus the spread of its relative cost"""
+    results = [run(size, repeat, sample) for _ in range(max(1, rounds))]
+    functions = {}
+    for name in HOT_PATHS:
+        measured = sorted((result['functions'][name] for result in results), key=lambda m: m['relative_cost'])
+        median = dict(measured[len(measured) // 2])
+        median['noise_pct'] = round(100 * (measured[-1]['relative_cost'] - measured[0]['relative_cost'])
+                                    / median['relative_cost'], 1)
+        functions[name] = median
+    return {"profiles": size, "rounds": len(results), "functions": functions}
+
+def check_against_baseline(results, baseline, max_slowdown):
+    """Return the functions more than max_slowdown percent slower than the baseline, by relative cost.
+
+    Slowdown is measured like ops/sec: 25% slower means 0.75x the baseline speed.
+    A function whose rounds spread more than that when the baseline was
+    recorded (noise_pct) is allowed its recorded spread instead.
+    """
+    failures = []
+    for result in results:
+        expected = baseline.get(str(result['profiles']))
+        if not expected:
+            failures.append(f"{result['profiles']} profiles: no baseline (run --update-baseline)")
+            continue
+        for name, measured in result['functions'].items():
+            recorded = expected.get(name, {}).get('relative_cost')
+            tolerance = max(max_slowdown, expected.get(name, {}).get('noise_pct', 0))
+            if recorded and measured['relative_cost'] * (1 - tolerance / 100) > recorded:
+                failures.append(f"{result['profiles']} profiles, {name}: relative cost {measured['relative_cost']:.3f} "
+                                f"({1 - recorded / measured['relative_cost']:.0%} slower than the baseline "
+                                f"{recorded:.3f}, {tolerance:g}% tolerated)")
+    return failures
+
+def print_report(result, baseline=None):
+    expected = (baseline or {}).get(str(result['profiles']), {})
+    print(f"{result['profiles']:>8} profiles")
+    for name, measured in result['functions'].items():
+        recorded = expected.get(name, {}).get('relative_cost')
+        change = f" ({recorded / measured['relative_cost'] - 1:+.0%} vs baseline)" if recorded else ""
+        print(f"  {name:<28} {measured['ops_per_sec']:>12,} ops/s {measured['relative_cost']:>7.2f}x ref "
+              f"(spread {measured['noise_pct']:>3.0f}%){change:<20} "
+              f"{measured['mean_us']:>8.2f} us | {measured['alloc_bytes_per_call']:>8,.0f} B allocated, "
+              f"{measured['retained_bytes_per_call']:>6,.0f} B held per call")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the per-applicant scoring and parsing functions")
+    parser.add_argument("--sizes", type=int, nargs="+",
+                        help=f"profiles per run (default {DEFAULT_SIZES}, or {CHECK_SIZES} with --check)")
+    parser.add_argument("--repeat", type=int, default=5, help="timed passes per chunk; the fastest counts")
+    parser.add_argument("--rounds", type=int,
+                        help=f"full runs per size, keeping the median (default 1, or {CHECK_ROUNDS} with --check or "
+                             f"--update-baseline)")
+    parser.add_argument("--sample", type=int, default=2000, help="calls traced with tracemalloc per function")
+    parser.add_argument("--output", help="write the full results as JSON to this path")
+    parser.add_argument("--check", action="store_true", help="fail if any function got slower than the stored baseline")
+    parser.add_argument("--max-slowdown", type=float, default=25.0,
+                        help="percent slowdown in relative cost that --check tolerates")
+    parser.add_argument("--update-baseline", action="store_true", help="record these results as the baseline")
+    args = parser.parse_args()
+
+    sizes = args.sizes or (CHECK_SIZES if args.check else DEFAULT_SIZES)
+    rounds = args.rounds or (CHECK_ROUNDS if args.check or args.update_baseline else 1)
+    baseline = {}
+    if os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH) as f:
+            baseline = json.load(f)
+    if args.check and not args.update_baseline and not all(str(size) in baseline for size in sizes):
+        parser.error(f"no baseline for {sizes} profiles in {BASELINE_PATH}; record one with "
+                     f"--sizes {' '.join(map(str, sizes))} --update-baseline")
+
+    results = []
+    for size in sizes:
+        result = run_rounds(size, rounds, args.repeat, args.sample)
+        print_report(result, baseline)
+        results.append(result)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.check:
+        failures = check_against_baseline(results, baseline, args.max_slowdown)
+        if failures:
+            print(f"Throughput regressions (more than {args.max_slowdown:g}% slower, or than the recorded spread):")
+            for failure in failures:
+                print(f"  {failure}")
+            sys.exit(1)
+        print("No throughput regressions")
+
+    if args.update_baseline:
+        for result in results:
+            baseline[str(result['profiles'])] = result['functions']
+        with open(BASELINE_PATH, 'w') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"Baseline updated: {BASELINE_PATH}")
@@ -0,0 +1,78 @@
+"""Micro-benchmark: compiled alias matchers vs the original substring scans.
+
+    python benchmark_matchers.py
+    python benchmark_matchers.py --inputs 50000 --list-sizes 15 1000 5000
+"""
+import time
+import random
+import argparse
+from config import TIER_1_COMPANIES, ELIGIBLE_COUNTRIES
+from matchers import AliasMatcher, match_company, match_location
+
+COMPANY_WORDS = ["Labs", "Systems", "Cloud", "Data", "Networks", "Robotics", "Analytics", "Health", "Capital", "Works"]
+LOCATIONS = ["San Francisco, USA", "Toronto, Canada", "London, UK", "Berlin, Germany", "Bangalore, India",
+             "Cape Town, South Africa", "Madrid, Spain", "Austin, TX, US", "Sydney, Australia", "Mumbai, IN"]
+
+def legacy_has_tier1(experience_data, companies):
+    """The original nested substring scan from utils.has_tier1_experience"""
+    for job in experience_data:
+        company = job.get('company', '').lower()
+        for tier1_company in companies:
+            if tier1_company.lower() in company:
+                return True
+    return False
+
+def legacy_location(location, countries):
+    """The original substring any() from utils.meets_location_criteria"""
+    if not location:
+        return False
+    location_lower = location.lower()
+    return any(country in location_lower for country in countries)
+
+def synthetic_companies(count, rng):
+    return [f"{rng.choice(['Acme', 'Globex', 'Initech', 'Hooli', 'Umbrella'])} {i} {rng.choice(COMPANY_WORDS)}"
+            for i in range(count)]
+
+def time_calls(function, inputs):
+    started = time.perf_counter()
+    for item in inputs:
+        function(item)
+    elapsed = time.perf_counter() - started
+    return len(inputs) / elapsed if elapsed else float('inf')
+
+def run(inputs, list_sizes, seed=7):
+    rng = random.Random(seed)
+    # Unique strings so the LRU cache cannot hide the matching cost ("cold"), then repeats ("warm")
+    company_inputs = [f"{rng.choice(TIER_1_COMPANIES + ['Acme', 'Stripe', 'Initech'])} {rng.choice(COMPANY_WORDS)} {i}"
+                      for i in range(inputs)]
+    location_inputs = [f"{rng.choice(LOCATIONS)} {i}" for i in range(inputs)]
+
+    print(f"{inputs} inputs per measurement (ops/sec, higher is better)")
+    for size in list_sizes:
+        companies = list(TIER_1_COMPANIES) + synthetic_companies(max(0, size - len(TIER_1_COMPANIES)), rng)
+        countries = list(ELIGIBLE_COUNTRIES) + [f"region {i}" for i in range(max(0, size - len(ELIGIBLE_COUNTRIES)))]
+        company_matcher = AliasMatcher(((company, company, 'company') for company in companies), strip_dots=False)
+        location_matcher = AliasMatcher((country, country, 'country') for country in countries)
+
+        legacy_company = time_calls(lambda c: legacy_has_tier1([{'company': c}], companies), company_inputs)
+        compiled_company = time_calls(company_matcher.match, company_inputs)
+        legacy_loc = time_calls(lambda l: legacy_location(l, countries), location_inputs)
+        compiled_loc = time_calls(location_matcher.match, location_inputs)
+        print(f"  {size:>6} aliases | company: legacy {legacy_company:>10,.0f}  compiled {compiled_company:>10,.0f} "
+              f"({compiled_company / legacy_company:.1f}x) | location: legacy {legacy_loc:>10,.0f}  "
+              f"compiled {compiled_loc:>10,.0f} ({compiled_loc / legacy_loc:.1f}x)")
+
+    # The cached module-level functions on realistic, highly repetitive inputs
+    repeated_companies = [rng.choice(TIER_1_COMPANIES + ['Acme Corp', 'Initech']) for _ in range(inputs)]
+    repeated_locations = [rng.choice(LOCATIONS) for _ in range(inputs)]
+    match_company.cache_clear()
+    match_location.cache_clear()
+    print(f"  warm LRU cache | match_company {time_calls(match_company, repeated_companies):,.0f} "
+          f"| match_location {time_calls(match_location, repeated_locations):,.0f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark tier-1 company and location matching")
+    parser.add_argument("--inputs", type=int, default=20000)
+    parser.add_argument("--list-sizes", type=int, nargs="+", default=[len(TIER_1_COMPANIES), 1000, 5000])
+    args = parser.parse_args()
+    run(args.inputs, args.list_sizes)
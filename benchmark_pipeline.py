@@ -0,0 +1,320 @@
+"""End-to-end scaling benchmark for main.main against in-process fakes.
+
+Runs the full pipeline over synthetic bases of increasing size using
+fake_airtable.FakeApi and fake_gemini.FakeGenAI, and reports wall time,
+Airtable calls per stage and peak memory. With --check, any stage that
+makes more Airtable calls than recorded in benchmark_baseline.json fails
+the run.
+
+    python benchmark_pipeline.py --sizes 100 1000
+    python benchmark_pipeline.py --sizes 100 1000 10000 100000 --check
+    python benchmark_pipeline.py --sizes 100 1000 --update-baseline
+    python benchmark_pipeline.py --sizes 100 1000 --streaming
+    python benchmark_pipeline.py --sizes 1000 100000 --mirror
+"""
+import io
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import tracemalloc
+import contextlib
+from config import (APPLICANTS_TABLE, PERSONAL_TABLE, EXPERIENCE_TABLE, SALARY_TABLE, BASE_RATE_LIMIT_PER_SECOND,
+                    AIRTABLE_REQUESTS_PER_SECOND)
+from airtable_client import ThrottledApi
+from fake_airtable import FakeApi
+from fake_gemini import FakeGenAI
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_baseline.json')
+DEFAULT_SIZES = [100, 1000, 10000, 100000]
+STAGES = ['compress', 'shortlist', 'llm']
+# In streaming mode calls are attributed by the thread that made them
+STREAMING_THREAD_STAGES = {
+    'MainThread': 'compress',
+    'stream-compress': 'compress',
+    'stream-shortlist': 'shortlist',
+    'stream-writer': 'llm',
+}
+
+COMPANIES = ["Google", "Acme Corp", "Initech", "Meta", "Globex", "Stripe", "Umbrella", "Microsoft", "Hooli", "Wayne Enterprises"]
+LOCATIONS = ["San Francisco, USA", "Toronto, Canada", "London, UK", "Berlin, Germany", "Bangalore, India",
+             "Cape Town, South Africa", "Madrid, Spain", "Austin, TX, US", "Sydney, Australia", "Mumbai, IN"]
+CURRENCIES = ["USD", "USD", "CAD", "GBP", "EUR", "INR"]
+TECHNOLOGIES = ["Python", "Go", "React", "AWS", "Kubernetes", "PostgreSQL", "TypeScript", "Airflow"]
+
+def generate_applicants(api, count, base_id='appBENCHMARK', seed=42):
+    """Seed a fake base with `count` deterministic synthetic applicants"""
+    rng = random.Random(seed)
+    applicants, personal, experience, salary = [], [], [], []
+
+    for applicant_id in range(1, count + 1):
+        applicants.append({"Applicant ID": applicant_id})
+        personal.append({
+            "Applicant ID": str(applicant_id),
+            "Full Name": f"Applicant {applicant_id}",
+            "Email": f"applicant{applicant_id}@example.com",
+            "Location": rng.choice(LOCATIONS),
+            "LinkedIn URL": f"https://linkedin.com/in/applicant-{applicant_id}"
+        })
+        start_year = rng.randint(2008, 2020)
+        for _ in range(rng.randint(1, 4)):
+            end_year = min(start_year + rng.randint(1, 4), 2025)
+            experience.append({
+                "Applicant ID": str(applicant_id),
+                "Company": rng.choice(COMPANIES),
+                "Title": rng.choice(["Engineer", "Senior Engineer", "Data Scientist", "Tech Lead"]),
+                "Start Date": f"{start_year}-{rng.randint(1, 12):02d}-01",
+                "End Date": f"{end_year}-{rng.randint(1, 12):02d}-01",
+                "Technologies": ", ".join(rng.sample(TECHNOLOGIES, 3))
+            })
+            start_year = end_year
+        salary.append({
+            "Applicant ID": str(applicant_id),
+            "Preferred Rate": rng.randint(30, 150),
+            "Minimum Rate": rng.randint(20, 100),
+            "Currency": rng.choice(CURRENCIES),
+            "Availability": rng.choice([10, 20, 30, 40])
+        })
+
+    api.table(base_id, APPLICANTS_TABLE).seed(applicants)
+    api.table(base_id, PERSONAL_TABLE).seed(personal)
+    api.table(base_id, EXPERIENCE_TABLE).seed(experience)
+    api.table(base_id, SALARY_TABLE).seed(salary)
+
+def install_fakes(fake_api, fake_genai):
+    """Point every pipeline module at the fakes, returning a function that restores them"""
+    import compress_json
+    import decompress_json
+    import shortlist_candidates
+    import llm_evaluation
+    import incremental
+    import main
+    import journal
+    import dedup
+    import webhook_receiver
+    from clients import install_genai
+    from rate_limiter import GeminiRateLimiter
+
+    modules = (compress_json, decompress_json, shortlist_candidates, llm_evaluation, incremental, main,
+               webhook_receiver)
+    journal_dir = tempfile.TemporaryDirectory()
+    patches = [(module, 'api', fake_api) for module in modules]
+    patches += [
+        # The fake Gemini has no quota; keep results independent of any on-disk cache
+        (llm_evaluation, 'rate_limiter', GeminiRateLimiter(10 ** 9, 10 ** 12)),
+        (llm_evaluation, 'evaluation_cache', None),
+        # Journal into a throwaway directory so runs never resume each other
+        (journal, 'default_journal', journal.Journal(journal_dir.name)),
+        (dedup, 'default_index', dedup.DedupIndex(journal_dir.name) if dedup.default_index is not None else None),
+    ]
+    for module in modules:
+        patches.append((module, 'base_id', 'appBENCHMARK'))
+
+    originals = [(module, name, getattr(module, name)) for module, name, _ in patches]
+    for module, name, value in patches:
+        setattr(module, name, value)
+    restore_genai = install_genai(fake_genai)
+
+    def restore():
+        for module, name, value in originals:
+            setattr(module, name, value)
+        restore_genai()
+        journal_dir.cleanup()
+    return restore
+
+def run_benchmark(size, latency=0.0, rate_limit=0, gemini_latency=0.0, streaming=False, mirror=False,
+                  llm_streaming=False, gemini_token_latency=0.0, gemini_trailing_rate=0.0):
+    """Run main.main over a synthetic base of `size` applicants and return its metrics.
+
+    With mirror=True the base is first synced into a temporary local
+    mirror (calls counted under the 'sync' stage) and the pipeline then
+    reprocesses the mirror, so its stages should make no API reads.
+    With a rate_limit the pipeline goes through airtable_client.ThrottledApi,
+    paced at the same fraction of the limit as a real run.
+    With llm_streaming the evaluations use streamed Gemini responses.
+    """
+    import main
+    import llm_evaluation
+    from mirror import LocalMirror, MirrorApi
+
+    fake_api = FakeApi(latency=latency, rate_limit=rate_limit)
+    fake_genai = FakeGenAI(latency=gemini_latency, token_latency=gemini_token_latency,
+                           trailing_rate=gemini_trailing_rate)
+    generate_applicants(fake_api, size)
+    pipeline_api = fake_api
+    if rate_limit:
+        pipeline_api = ThrottledApi(fake_api, rate_limit * AIRTABLE_REQUESTS_PER_SECOND / BASE_RATE_LIMIT_PER_SECOND)
+    mirror_dir = None
+    if mirror:
+        mirror_dir = tempfile.TemporaryDirectory()
+        pipeline_api = MirrorApi(pipeline_api, 'appBENCHMARK', LocalMirror(mirror_dir.name))
+        fake_api.set_stage('sync')
+        pipeline_api.sync()
+        fake_api.set_stage(None)
+    restore = install_fakes(pipeline_api, fake_genai)
+    llm_streaming_default = llm_evaluation.LLM_STREAMING
+    llm_evaluation.LLM_STREAMING = llm_streaming
+
+    stage_times = {}
+    originals = {
+        'compress': main.compress_all_applicants,
+        'shortlist': main.shortlist_applicants,
+        'llm': main.evaluate_all_with_llm,
+    }
+
+    def staged(stage, function):
+        def wrapper(*args, **kwargs):
+            fake_api.set_stage(stage)
+            started = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                stage_times[stage] = stage_times.get(stage, 0.0) + time.perf_counter() - started
+                fake_api.set_stage(None)
+        return wrapper
+
+    main.compress_all_applicants = staged('compress', originals['compress'])
+    main.shortlist_applicants = staged('shortlist', originals['shortlist'])
+    main.evaluate_all_with_llm = staged('llm', originals['llm'])
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            summary = main.main(streaming=streaming, sync_mirror=False)
+    finally:
+        wall_time = time.perf_counter() - started
+        _, peak_memory = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        main.compress_all_applicants = originals['compress']
+        main.shortlist_applicants = originals['shortlist']
+        main.evaluate_all_with_llm = originals['llm']
+        llm_evaluation.LLM_STREAMING = llm_streaming_default
+        restore()
+        if mirror_dir:
+            pipeline_api.mirror.conn.close()
+            mirror_dir.cleanup()
+
+    calls_by_stage = {}
+    for stage, counter in fake_api.calls_by_stage.items():
+        stage = STREAMING_THREAD_STAGES.get(stage, stage) if streaming and stage != 'sync' else stage
+        for key, calls in counter.items():
+            calls_by_stage.setdefault(stage, {})
+            calls_by_stage[stage][key] = calls_by_stage[stage].get(key, 0) + calls
+    total_calls = sum(fake_api.calls.values())
+    return {
+        "applicants": size,
+        "mode": ("streaming" if streaming else "batch") + ("-mirror" if mirror else ""),
+        "wall_time_s": round(wall_time, 3),
+        "time_to_first_result_s": summary.get('first_result_s') if streaming else None,
+        "stage_time_s": {stage: round(seconds, 3) for stage, seconds in stage_times.items()},
+        "airtable_calls": total_calls,
+        "airtable_calls_by_stage": {stage: sum(calls.values()) for stage, calls in calls_by_stage.items()},
+        "airtable_calls_detail": calls_by_stage,
+        # Reads made by the pipeline stages themselves (excludes the mirror sync)
+        "airtable_reads": sum(
+            calls for stage, detail in calls_by_stage.items() if stage != 'sync'
+            for key, calls in detail.items() if key.endswith(('.list', '.get'))
+        ),
+        # Time the same calls would need against a real base at its per-second limit
+        "throttled_airtable_time_s": round(total_calls / BASE_RATE_LIMIT_PER_SECOND, 1),
+        "http_429": fake_api.rate_limited,
+        "gemini_calls": fake_genai.calls,
+        "gemini_tokens": fake_genai.prompt_tokens + fake_genai.output_tokens,
+        "gemini_output_tokens": fake_genai.output_tokens,
+        "llm_streaming": llm_streaming,
+        "peak_memory_mb": round(peak_memory / 1024 / 1024, 1)
+    }
+
+def baseline_key(result):
+    """Baselines are stored per base size, with streaming runs kept separately"""
+    key = str(result['applicants'])
+    return key if result['mode'] == 'batch' else f"{key}-{result['mode']}"
+
+def check_against_baseline(results, baseline):
+    """Return a list of call-count regressions compared with the stored baseline"""
+    failures = []
+    for result in results:
+        expected = baseline.get(baseline_key(result))
+        if not expected:
+            print(f"No baseline for {baseline_key(result)}, skipping check")
+            continue
+        for stage, calls in result['airtable_calls_by_stage'].items():
+            allowed = expected.get(stage)
+            if allowed is not None and calls > allowed:
+                failures.append(f"{result['applicants']} applicants, {stage}: {calls} Airtable calls (baseline {allowed})")
+        if expected.get('gemini') is not None and result['gemini_calls'] > expected['gemini']:
+            failures.append(f"{result['applicants']} applicants: {result['gemini_calls']} Gemini calls "
+                            f"(baseline {expected['gemini']})")
+    return failures
+
+def print_report(result):
+    # Streaming stages overlap, so only batch runs have per-stage timings
+    stages = " | ".join(
+        f"{stage}: {result['airtable_calls_by_stage'].get(stage, 0)} calls"
+        + (f" / {result['stage_time_s'][stage]:.2f}s" if stage in result['stage_time_s'] else "")
+        for stage in STAGES
+    )
+    print(f"{result['applicants']:>7} applicants | wall {result['wall_time_s']:.2f}s | "
+          f"Airtable {result['airtable_calls']} calls (~{result['throttled_airtable_time_s']}s at the rate limit) | "
+          f"Gemini {result['gemini_calls']} calls / {result['gemini_output_tokens']} output tokens | peak {result['peak_memory_mb']} MB | 429s {result['http_429']}")
+    print(f"          {stages}")
+    if 'sync' in result['airtable_calls_by_stage']:
+        print(f"          mirror sync: {result['airtable_calls_by_stage']['sync']} calls | "
+              f"pipeline reads after sync: {result['airtable_reads']}")
+    if result['time_to_first_result_s'] is not None:
+        print(f"          first result after {result['time_to_first_result_s']}s")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline against in-process fakes")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every Airtable call")
+    parser.add_argument("--rate-limit", type=int, default=0,
+                        help="return 429s above this many Airtable calls per second (0 disables)")
+    parser.add_argument("--gemini-latency", type=float, default=0.0, help="seconds added to every Gemini call")
+    parser.add_argument("--gemini-token-latency", type=float, default=0.0,
+                        help="seconds the fake Gemini takes to generate each output token")
+    parser.add_argument("--gemini-trailing-rate", type=float, default=0.0,
+                        help="fraction of Gemini responses that run on past the Follow-Ups line")
+    parser.add_argument("--llm-streaming", action="store_true", help="evaluate with streamed Gemini responses")
+    parser.add_argument("--streaming", action="store_true", help="run main.main in streaming mode")
+    parser.add_argument("--mirror", action="store_true", help="sync into a local mirror first, then reprocess it")
+    parser.add_argument("--output", help="write the full results as JSON to this path")
+    parser.add_argument("--check", action="store_true", help="fail if call counts exceed the stored baseline")
+    parser.add_argument("--update-baseline", action="store_true", help="record these call counts as the baseline")
+    args = parser.parse_args()
+
+    results = []
+    for size in args.sizes:
+        result = run_benchmark(size, args.latency, args.rate_limit, args.gemini_latency, args.streaming, args.mirror,
+                               args.llm_streaming, args.gemini_token_latency, args.gemini_trailing_rate)
+        print_report(result)
+        results.append(result)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.update_baseline:
+        baseline = {}
+        if os.path.exists(BASELINE_PATH):
+            with open(BASELINE_PATH) as f:
+                baseline = json.load(f)
+        for result in results:
+            baseline[baseline_key(result)] = dict(result['airtable_calls_by_stage'], gemini=result['gemini_calls'])
+        with open(BASELINE_PATH, 'w') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"Baseline updated: {BASELINE_PATH}")
+
+    if args.check:
+        with open(BASELINE_PATH) as f:
+            failures = check_against_baseline(results, json.load(f))
+        if failures:
+            print("Call-count regressions:")
+            for failure in failures:
+                print(f"  {failure}")
+            sys.exit(1)
+        print("No call-count regressions")
@@ -0,0 +1,84 @@
+"""Cold-start benchmark: time to import each pipeline entry point in a fresh interpreter.
+
+Every run spawns a new Python process and times the import from inside it,
+so the numbers include all module loading but not the interpreter's own
+start-up. Also reports whether the heavy SDKs were
+imported and the slowest top-level imports from `-X importtime`. With
+--max-ms the run fails if any module takes longer than the budget.
+
+    python benchmark_startup.py
+    python benchmark_startup.py --modules compress_json shortlist_candidates --max-ms 90
+"""
+import os
+import sys
+import argparse
+import statistics
+import subprocess
+
+DEFAULT_MODULES = ["compress_json", "shortlist_candidates", "main"]
+HEAVY_MODULES = ["pyairtable", "google.generativeai", "numpy"]
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def run_python(code, *flags):
+    return subprocess.run([sys.executable, *flags, "-c", code], cwd=REPO_DIR, capture_output=True, text=True,
+                          check=True)
+
+def median_ms(code, runs):
+    """Median wall time of running code in a fresh interpreter"""
+    timer = "import time; _started = time.perf_counter(); {}; print((time.perf_counter() - _started) * 1000)"
+    return statistics.median(float(run_python(timer.format(code)).stdout.split()[-1]) for _ in range(runs))
+
+def heavy_imports(module):
+    """Which of HEAVY_MODULES importing module pulls in"""
+    check = f"import sys, {module}; print(' '.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    return run_python(check).stdout.split()
+
+def slowest_imports(module, count=3):
+    """The imports module makes directly with the largest cumulative time, as (microseconds, name)"""
+    report = run_python(f"import {module}", "-X", "importtime").stderr
+    children = []
+    for line in report.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        # importtime indents two spaces per level and prints a module after everything it imported
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 1:
+            children.append((int(cumulative), name.strip()))
+        elif depth == 0:
+            if name.strip() == module:
+                return sorted(children, reverse=True)[:count]
+            children = []
+    return []
+
+def run_benchmark(modules, runs):
+    results = []
+    for module in modules:
+        results.append({
+            "module": module,
+            "import_ms": round(median_ms(f"import {module}", runs), 1),
+            "heavy_imports": heavy_imports(module),
+            "slowest": slowest_imports(module),
+        })
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark cold-start import time of the pipeline CLIs")
+    parser.add_argument("--modules", nargs="+", default=DEFAULT_MODULES)
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters per module (the median is reported)")
+    parser.add_argument("--max-ms", type=float, help="fail if any module takes longer than this to import")
+    args = parser.parse_args()
+
+    failures = []
+    for result in run_benchmark(args.modules, args.runs):
+        slowest = ", ".join(f"{name} {micros / 1000:.1f}ms" for micros, name in result["slowest"])
+        print(f"{result['module']:>22}: {result['import_ms']:7.1f} ms | heavy SDKs: "
+              f"{', '.join(result['heavy_imports']) or 'none'} | slowest: {slowest}")
+        if args.max_ms is not None and result["import_ms"] > args.max_ms:
+            failures.append(f"{result['module']}: {result['import_ms']} ms (budget {args.max_ms} ms)")
+
+    if failures:
+        print("Start-up regressions:")
+        for failure in failures:
+            print(f"  {failure}")
+        sys.exit(1)
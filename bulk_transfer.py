@@ -0,0 +1,295 @@
+"""Streaming bulk export and import of applicant profiles as NDJSON.
+
+Export pages through Applicants and writes one JSON line per applicant:
+the decoded profile plus its shortlist and LLM fields. Only one page is
+held at a time, and a `.gz` path is gzip-compressed on the fly. The
+profile is stored decoded, so an export can be imported under any
+Compressed JSON codec.
+
+Import memory-maps the file (a `.gz` file is first inflated to a temporary
+file), indexes the line offsets and hands chunks of lines to parallel
+workers. Each worker decodes only its own lines and writes in batches of
+10. There are two modes:
+
+* `create` (an empty base, e.g. a migration or a load-test seed): creates
+  the Applicants rows, then the Personal Details, Work Experience and
+  Salary Preferences rows for the Applicant IDs Airtable assigned. With
+  --preserve-ids the exported IDs are written as-is instead (only for
+  bases where Applicant ID is a plain field).
+* `restore` (the applicants already exist, e.g. a backup of the same base):
+  updates their Compressed JSON, shortlist and LLM fields, and diffs their
+  child rows exactly as decompress_json does, so unchanged rows cost
+  nothing.
+
+Shortlisted Leads are not exported; rerun the shortlist stage after an
+import to recreate them.
+
+    python bulk_transfer.py export backup.ndjson.gz
+    python bulk_transfer.py import backup.ndjson.gz --mode restore
+    python bulk_transfer.py export seed.ndjson.gz --fake-base 100000      # synthetic load-test data
+    python bulk_transfer.py import seed.ndjson.gz --fake-base 0           # time an import into an empty fake base
+"""
+import io
+import os
+import sys
+import gzip
+import json
+import mmap
+import time
+import shutil
+import argparse
+import tempfile
+import contextlib
+from array import array
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+from config import (AIRTABLE_BASE_ID, APPLICANTS_TABLE, BULK_CHUNK_SIZE, BULK_WORKERS)
+from clients import lazy_airtable_api
+from codec import CodecError, decode, encode
+from compress_json import prefetch_child_rows
+from decompress_json import new_write_plan, plan_decompression
+from metrics import metrics
+from utils import applicant_key, applicant_id_formula, chunked
+
+# Always live: exports must reflect Airtable, and imports write straight to it
+api = lazy_airtable_api(mirrored=False)
+base_id = AIRTABLE_BASE_ID
+
+FORMAT = 'applicants-ndjson'
+FORMAT_VERSION = 1
+# Applicants fields carried alongside the profile, by their NDJSON key
+EXPORTED_FIELDS = {
+    'shortlist_status': 'Shortlist Status',
+    'llm_summary': 'LLM Summary',
+    'llm_score': 'LLM Score',
+    'llm_follow_ups': 'LLM Follow-Ups',
+}
+EMPTY_CHILDREN = {'personal': [], 'experience': [], 'salary': []}
+
+def open_text(path, mode):
+    """Open path for text in mode 'r' or 'w', gzip-compressed when it ends in .gz ('-' is stdin/stdout)"""
+    if path == '-':
+        # Leave the standard streams open when the caller's `with` block ends
+        return contextlib.nullcontext(sys.stdin if mode == 'r' else sys.stdout)
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8', compresslevel=6)
+    return open(path, mode, encoding='utf-8')
+
+def export_lines(applicants_table, page_size=100):
+    """Yield the NDJSON lines of an export: a header, then one line per applicant"""
+    yield json.dumps({"format": FORMAT, "version": FORMAT_VERSION,
+                      "exported_at": datetime.now(timezone.utc).isoformat()})
+    for page in applicants_table.iterate(page_size=page_size):
+        for record in page:
+            fields = record['fields']
+            applicant_id = applicant_key(fields.get('Applicant ID'))
+            value = fields.get('Compressed JSON')
+            if applicant_id is None or not value:
+                continue
+            try:
+                profile = decode(value)
+            except CodecError:
+                # stderr, so an export to stdout stays valid NDJSON
+                print(f"Skipping applicant {applicant_id} - invalid JSON", file=sys.stderr)
+                metrics.increment('bulk_export_skipped_total')
+                continue
+            line = {"applicant_id": applicant_id, "profile": profile}
+            for key, field in EXPORTED_FIELDS.items():
+                if fields.get(field) not in (None, ''):
+                    line[key] = fields[field]
+            yield json.dumps(line, separators=(',', ':'), ensure_ascii=False)
+
+def export_profiles(path, page_size=100):
+    """Stream every applicant with a profile to path, returning the number written"""
+    exported = 0
+    with open_text(path, 'w') as out:
+        for line in export_lines(api.table(base_id, APPLICANTS_TABLE), page_size):
+            out.write(line)
+            out.write('\n')
+            exported += 1
+    # The header line is not a profile
+    exported -= 1
+    metrics.increment('bulk_export_records_total', exported)
+    return exported
+
+class LineIndex:
+    """Random access to the lines of an NDJSON file through a memory map.
+
+    Only the offsets of the line starts are held in memory (8 bytes per
+    line); a line is parsed when it is read. A gzip file is inflated to a
+    temporary file first, since compressed data cannot be mapped.
+    """
+
+    def __init__(self, path):
+        if path.endswith('.gz'):
+            self.file = tempfile.TemporaryFile()
+            with gzip.open(path, 'rb') as source:
+                shutil.copyfileobj(source, self.file, 1024 * 1024)
+            self.file.flush()
+        else:
+            self.file = open(path, 'rb')
+        size = os.fstat(self.file.fileno()).st_size
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+        self.offsets = array('Q')
+        position = 0
+        while position < size:
+            end = self.map.find(b'\n', position)
+            end = size if end == -1 else end
+            if end > position:
+                self.offsets.append(position)
+            position = end + 1
+        self.offsets.append(size + 1)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        start, end = self.offsets[index], self.offsets[index + 1] - 1
+        return json.loads(self.map[start:end])
+
+    def close(self):
+        if isinstance(self.map, mmap.mmap):
+            self.map.close()
+        self.file.close()
+
+def applicant_fields(line, preserve_ids=False):
+    """Applicants fields to write for one NDJSON line"""
+    fields = {"Compressed JSON": encode(line['profile'])}
+    for key, field in EXPORTED_FIELDS.items():
+        if key in line:
+            fields[field] = line[key]
+    if preserve_ids:
+        fields["Applicant ID"] = line['applicant_id']
+    return fields
+
+def _send(table_name, operation, records):
+    table = api.table(base_id, table_name)
+    for chunk in chunked(records):
+        getattr(table, operation)(chunk)
+    metrics.increment('bulk_import_records_total', len(records), table=table_name, operation=operation)
+
+def _send_plan(plan):
+    # Same order as decompress_json.apply_write_plan: deletes, then updates, then creates
+    for operation in ('delete', 'update', 'create'):
+        for table_name, records in plan[operation].items():
+            _send(table_name, f'batch_{operation}', records)
+
+def _import_create(lines, preserve_ids):
+    """Create Applicants rows for a chunk of lines, then their child rows"""
+    created = []
+    applicants = api.table(base_id, APPLICANTS_TABLE)
+    for chunk in chunked(lines):
+        created.extend(applicants.batch_create([applicant_fields(line, preserve_ids) for line in chunk]))
+    metrics.increment('bulk_import_records_total', len(lines), table=APPLICANTS_TABLE, operation='batch_create')
+    plan = new_write_plan()
+    for line, record in zip(lines, created):
+        # Link the children to the ID the new row was given (Applicant ID is an autonumber)
+        applicant_id = applicant_key(record['fields'].get('Applicant ID'))
+        if applicant_id is None:
+            raise ValueError("Created Applicants rows have no Applicant ID; use --preserve-ids "
+                             "if the field is not an autonumber")
+        plan_decompression(applicant_id, line['profile'], EMPTY_CHILDREN, plan)
+    _send_plan(plan)
+    return len(lines)
+
+def _import_restore(lines):
+    """Update existing applicants from a chunk of lines and diff their child rows"""
+    by_id = {line['applicant_id']: line for line in lines}
+    applicants = api.table(base_id, APPLICANTS_TABLE)
+    existing = {}
+    for ids in chunked(list(by_id), 50):
+        for record in applicants.all(formula=applicant_id_formula(ids)):
+            existing[applicant_key(record['fields'].get('Applicant ID'))] = record
+    missing = [applicant_id for applicant_id in by_id if applicant_id not in existing]
+    if missing:
+        print(f"Skipping {len(missing)} applicants not in the base (e.g. {missing[0]}); use --mode create")
+    found = [applicant_id for applicant_id in by_id if applicant_id in existing]
+    child_index = prefetch_child_rows(found)
+    updates = []
+    plan = new_write_plan()
+    for applicant_id in found:
+        line = by_id[applicant_id]
+        record = existing[applicant_id]
+        fields = {field: value for field, value in applicant_fields(line).items()
+                  if record['fields'].get(field) != value}
+        if fields.get("Compressed JSON") is not None:
+            try:
+                # The same profile under another codec is left as it is
+                if decode(record['fields'].get('Compressed JSON') or '') == line['profile']:
+                    del fields["Compressed JSON"]
+            except CodecError:
+                pass
+        if fields:
+            updates.append({"id": record['id'], "fields": fields})
+        child_rows = {section: rows.get(applicant_id, []) for section, rows in child_index.items()}
+        plan_decompression(applicant_id, line['profile'], child_rows, plan)
+    if updates:
+        _send(APPLICANTS_TABLE, 'batch_update', updates)
+    _send_plan(plan)
+    return len(found)
+
+def import_profiles(path, mode='create', preserve_ids=False, chunk_size=BULK_CHUNK_SIZE, workers=BULK_WORKERS):
+    """Import an export file, chunk_size lines per task on `workers` threads; returns applicants imported"""
+    index = LineIndex(path)
+    try:
+        header = index[0] if len(index) else {}
+        start = 1 if header.get('format') == FORMAT else 0
+        if header.get('format') == FORMAT and header.get('version', 1) > FORMAT_VERSION:
+            raise ValueError(f"{path} is format version {header['version']}; this version reads {FORMAT_VERSION}")
+
+        def run_chunk(first):
+            lines = [index[i] for i in range(first, min(first + chunk_size, len(index)))]
+            if mode == 'create':
+                return _import_create(lines, preserve_ids)
+            return _import_restore(lines)
+
+        imported = 0
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            for count in executor.map(run_chunk, range(start, len(index), chunk_size)):
+                imported += count
+        return imported
+    finally:
+        index.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk export/import of applicant profiles as NDJSON")
+    parser.add_argument("command", choices=["export", "import"])
+    parser.add_argument("path", help="NDJSON file ('.gz' for gzip; '-' for stdout on export)")
+    parser.add_argument("--mode", choices=["create", "restore"], default="create",
+                        help="import into an empty base (create) or update existing applicants (restore)")
+    parser.add_argument("--preserve-ids", action="store_true",
+                        help="write the exported Applicant IDs (only if the field is not an autonumber)")
+    parser.add_argument("--workers", type=int, default=BULK_WORKERS)
+    parser.add_argument("--chunk-size", type=int, default=BULK_CHUNK_SIZE)
+    parser.add_argument("--fake-base", type=int,
+                        help="use an in-process fake base with this many synthetic applicants instead of Airtable")
+    args = parser.parse_args()
+
+    fake_api = None
+    if args.fake_base is not None:
+        from benchmark_pipeline import generate_applicants, install_fakes
+        from compress_json import compress_all_applicants
+        from fake_airtable import FakeApi
+        from fake_gemini import FakeGenAI
+        fake_api = FakeApi(rate_limit=0)
+        generate_applicants(fake_api, args.fake_base)
+        install_fakes(fake_api, FakeGenAI())
+        # install_fakes patches the imported bulk_transfer module; this script runs as __main__
+        api, base_id = fake_api, 'appBENCHMARK'
+        if args.fake_base:
+            with contextlib.redirect_stdout(io.StringIO()):
+                compress_all_applicants()
+        # Fake bases take any Applicant ID, so keep the exported ones
+        args.preserve_ids = True
+
+    started = time.perf_counter()
+    if args.command == 'export':
+        count = export_profiles(args.path)
+        print(f"Exported {count} applicants to {args.path} in {time.perf_counter() - started:.1f}s",
+              file=sys.stderr if args.path == '-' else sys.stdout)
+    else:
+        count = import_profiles(args.path, args.mode, args.preserve_ids, args.chunk_size, args.workers)
+        print(f"Imported {count} applicants from {args.path} in {time.perf_counter() - started:.1f}s")
+    if fake_api is not None:
+        print(f"Airtable calls: {sum(fake_api.calls.values())} ({dict(fake_api.calls)})",
+              file=sys.stderr if args.path == '-' else sys.stdout)
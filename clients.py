@@ -0,0 +1,121 @@
+"""Process-wide API clients, created on first use.
+
+Importing a pipeline module no longer builds anything: each module holds a
+LazyApi that resolves to the shared client the first time a table is
+requested. pyairtable and google.generativeai are only imported then, so
+a compress or shortlist run never pays for the Gemini SDK.
+
+    api = lazy_airtable_api()        # module level, costs nothing
+    api.table(base_id, ...)          # first call builds the shared Api
+    model = gemini_model()           # cached GenerativeModel for GEMINI_MODEL
+"""
+import threading
+from config import AIRTABLE_ACCESS_TOKEN, AIRTABLE_BASE_ID, AIRTABLE_POOL_SIZE, GEMINI_API_KEY, GEMINI_MODEL
+
+class ClientRegistry:
+    """Named clients built once per process by their factory, safe to request from any thread"""
+
+    def __init__(self):
+        self._clients = {}
+        self._lock = threading.RLock()
+
+    def get(self, name, factory):
+        client = self._clients.get(name)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(name)
+                if client is None:
+                    client = self._clients[name] = factory()
+        return client
+
+    def set(self, name, client):
+        """Install a client (e.g. a fake) under name, returning the one it replaces"""
+        with self._lock:
+            previous = self._clients.get(name)
+            if client is None:
+                self._clients.pop(name, None)
+            else:
+                self._clients[name] = client
+            return previous
+
+    def reset(self, prefix=''):
+        """Forget clients whose name starts with prefix so they are rebuilt on next use"""
+        with self._lock:
+            for name in [name for name in self._clients if name.startswith(prefix)]:
+                del self._clients[name]
+
+registry = ClientRegistry()
+
+def _create_airtable_api():
+    # Deferred: pyairtable (and pydantic under it) is most of the import cost of a pipeline module
+    from pyairtable import Api, retry_strategy
+    from requests.adapters import HTTPAdapter
+
+    # 429s are left to the adaptive throttle in airtable_client; urllib3 still retries connection errors
+    api = Api(AIRTABLE_ACCESS_TOKEN, retry_strategy=retry_strategy(status_forcelist=()))
+    # Size the keep-alive pool for the worker threads sharing this session, keeping pyairtable's retries
+    retries = api.session.get_adapter(str(api.endpoint_url)).max_retries
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=AIRTABLE_POOL_SIZE, max_retries=retries)
+    api.session.mount("https://", adapter)
+    api.session.mount("http://", adapter)
+    return api
+
+def airtable_api(mirrored=True):
+    """The shared Airtable client: one Api and session per process, instrumented for metrics
+    and paced/retried by airtable_client.ThrottledApi.
+
+    With mirrored=True it is served from the local mirror when USE_LOCAL_MIRROR is set.
+    """
+    from airtable_client import ThrottledApi
+    from metrics import instrumented_api
+    api = registry.get('airtable', lambda: ThrottledApi(instrumented_api(_create_airtable_api())))
+    if mirrored:
+        from mirror import mirrored_api
+        return mirrored_api(api, AIRTABLE_BASE_ID)
+    return api
+
+class LazyApi:
+    """Stands in for the shared Airtable client until its first use"""
+
+    def __init__(self, mirrored=True):
+        self._mirrored = mirrored
+
+    def resolve(self):
+        return airtable_api(self._mirrored)
+
+    def __getattr__(self, attribute):
+        return getattr(self.resolve(), attribute)
+
+    def table(self, base_id, table_name):
+        return self.resolve().table(base_id, table_name)
+
+def lazy_airtable_api(mirrored=True):
+    """A module-level handle on the shared Airtable client that builds nothing until used"""
+    return LazyApi(mirrored)
+
+def resolve(api):
+    """The client behind api, whether it is a LazyApi or an already-built (or fake) client"""
+    return api.resolve() if isinstance(api, LazyApi) else api
+
+def _create_genai():
+    import google.generativeai as genai
+    genai.configure(api_key=GEMINI_API_KEY)
+    return genai
+
+def genai():
+    """The configured google.generativeai module, imported on first use"""
+    return registry.get('genai', _create_genai)
+
+def gemini_model(model_name=GEMINI_MODEL):
+    """A GenerativeModel for model_name, built once and reused by every call and thread"""
+    return registry.get(f'gemini_model:{model_name}', lambda: genai().GenerativeModel(model_name))
+
+def install_genai(module):
+    """Use module in place of google.generativeai (e.g. a fake), returning a function that restores it"""
+    previous = registry.set('genai', module)
+    registry.reset('gemini_model:')
+
+    def restore():
+        registry.set('genai', previous)
+        registry.reset('gemini_model:')
+    return restore
@@ -0,0 +1,146 @@
+"""Encoding of the Compressed JSON field.
+
+Values are written as "<prefix><payload>" where the prefix names the
+format, so readers can decode any of them (and legacy pretty-printed
+JSON, which has no prefix):
+
+    cj1:{"personal":{...}}     compact JSON
+    cz1:eJyrVkrLz1eyUkpKLFKqBQAd...   zlib-compressed JSON, base64
+    cm1:gqhwZXJzb25hbIKk...    msgpack, base64 (needs the msgpack package)
+
+    python codec.py migrate                 # re-encode stored values with the configured codec
+    python codec.py migrate --dry-run       # report the size change without writing
+"""
+import zlib
+import json
+import base64
+import binascii
+import argparse
+from config import COMPRESSED_JSON_CODEC, COMPRESSED_JSON_LARGE_CODEC, COMPRESSED_JSON_LARGE_THRESHOLD
+from utils import chunked
+
+try:
+    import msgpack
+except ImportError:  # optional: only needed to read or write the msgpack format
+    msgpack = None
+
+class CodecError(ValueError):
+    """Raised when a stored Compressed JSON value cannot be decoded"""
+
+def _compact(data):
+    return json.dumps(data, separators=(',', ':'), ensure_ascii=False)
+
+def _encode_zlib(data):
+    return base64.b64encode(zlib.compress(_compact(data).encode('utf-8'), 9)).decode('ascii')
+
+def _decode_zlib(payload):
+    return json.loads(zlib.decompress(base64.b64decode(payload)).decode('utf-8'))
+
+def _require_msgpack():
+    if msgpack is None:
+        raise CodecError("The msgpack codec needs the msgpack package (pip install msgpack)")
+
+def _encode_msgpack(data):
+    _require_msgpack()
+    return base64.b64encode(msgpack.packb(data, use_bin_type=True)).decode('ascii')
+
+def _decode_msgpack(payload):
+    _require_msgpack()
+    return msgpack.unpackb(base64.b64decode(payload), raw=False)
+
+# name -> (prefix, encode, decode)
+CODECS = {
+    'json': ('cj1:', _compact, json.loads),
+    'zlib': ('cz1:', _encode_zlib, _decode_zlib),
+    'msgpack': ('cm1:', _encode_msgpack, _decode_msgpack),
+}
+PREFIX_LENGTH = 4
+_DECODERS = {prefix: decode for prefix, _, decode in CODECS.values()}
+_DECODE_ERRORS = (ValueError, TypeError, zlib.error, binascii.Error) + (
+    (msgpack.UnpackException,) if msgpack is not None else ()
+)
+
+def encode(data, codec=None):
+    """Encode a compressed JSON profile for storage.
+
+    Uses COMPRESSED_JSON_CODEC, switching to COMPRESSED_JSON_LARGE_CODEC
+    when the compact JSON is longer than COMPRESSED_JSON_LARGE_THRESHOLD
+    characters. Pass codec to force a format.
+    """
+    if codec is None:
+        codec = COMPRESSED_JSON_CODEC
+        if codec == 'json' and COMPRESSED_JSON_LARGE_CODEC != 'json':
+            compact = _compact(data)
+            if len(compact) <= COMPRESSED_JSON_LARGE_THRESHOLD:
+                return CODECS['json'][0] + compact
+            codec = COMPRESSED_JSON_LARGE_CODEC
+    if codec not in CODECS:
+        raise ValueError(f"Unknown Compressed JSON codec: {codec}")
+    prefix, encoder, _ = CODECS[codec]
+    return prefix + encoder(data)
+
+def decode(value):
+    """Decode a stored value in any supported format, including legacy un-prefixed JSON"""
+    if not value:
+        raise CodecError("Empty Compressed JSON value")
+    decoder = _DECODERS.get(value[:PREFIX_LENGTH])
+    try:
+        if decoder is None:
+            return json.loads(value)
+        return decoder(value[PREFIX_LENGTH:])
+    except _DECODE_ERRORS as error:
+        raise CodecError(f"Cannot decode Compressed JSON: {error}") from error
+
+def format_name(value):
+    """Name of the format a stored value uses ('legacy' for un-prefixed JSON)"""
+    prefix = (value or '')[:PREFIX_LENGTH]
+    for name, (codec_prefix, _, _) in CODECS.items():
+        if prefix == codec_prefix:
+            return name
+    return 'legacy'
+
+def migrate(api, base_id, tables, codec=None, dry_run=False, page_size=100):
+    """Re-encode every stored Compressed JSON value, writing changed ones back in batches of 10.
+
+    Returns {"scanned", "rewritten", "invalid", "chars_before", "chars_after"}.
+    """
+    stats = {"scanned": 0, "rewritten": 0, "invalid": 0, "chars_before": 0, "chars_after": 0}
+    for table_name in tables:
+        table = api.table(base_id, table_name)
+        for page in table.iterate(page_size=page_size):
+            updates = []
+            for record in page:
+                value = record['fields'].get('Compressed JSON')
+                if not value:
+                    continue
+                stats["scanned"] += 1
+                try:
+                    encoded = encode(decode(value), codec)
+                except CodecError:
+                    stats["invalid"] += 1
+                    continue
+                stats["chars_before"] += len(value)
+                stats["chars_after"] += len(encoded)
+                if encoded != value:
+                    updates.append({"id": record['id'], "fields": {"Compressed JSON": encoded}})
+            stats["rewritten"] += len(updates)
+            if not dry_run:
+                for chunk in chunked(updates):
+                    table.batch_update(chunk)
+    return stats
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compressed JSON codec tools")
+    parser.add_argument("command", choices=["migrate"])
+    parser.add_argument("--codec", choices=sorted(CODECS), help="force one format instead of the configured codecs")
+    parser.add_argument("--dry-run", action="store_true", help="report what would change without writing")
+    args = parser.parse_args()
+
+    from clients import airtable_api
+    from config import AIRTABLE_BASE_ID, APPLICANTS_TABLE, SHORTLISTED_TABLE
+    stats = migrate(airtable_api(mirrored=False), AIRTABLE_BASE_ID, [APPLICANTS_TABLE, SHORTLISTED_TABLE],
+                    codec=args.codec, dry_run=args.dry_run)
+    saved = stats["chars_before"] - stats["chars_after"]
+    print(f"Scanned {stats['scanned']} values, {'would rewrite' if args.dry_run else 'rewrote'} {stats['rewritten']}, "
+          f"{stats['invalid']} invalid")
+    print(f"Stored size {stats['chars_before']} -> {stats['chars_after']} characters ({saved} saved)")
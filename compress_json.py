@@ -1,36 +1,21 @@
 import os
+import sys
 import json
-from pyairtable import Api
-from config import AIRTABLE_ACCESS_TOKEN, AIRTABLE_BASE_ID, APPLICANTS_TABLE, PERSONAL_TABLE, EXPERIENCE_TABLE, SALARY_TABLE
-from utils import validate_applicant_data
+from config import AIRTABLE_BASE_ID, APPLICANTS_TABLE, PERSONAL_TABLE, EXPERIENCE_TABLE, SALARY_TABLE
+from clients import lazy_airtable_api
+import dedup
+from codec import encode
+from journal import SKIPPED, stage_run
+from metrics import metrics
+from utils import validate_applicant_data, applicant_key, applicant_id_formula, index_by_applicant, chunked
 
-# Initialize Airtable API
-api = Api(AIRTABLE_ACCESS_TOKEN)
+# Initialize Airtable API (served from the local mirror when USE_LOCAL_MIRROR is set)
+api = lazy_airtable_api()
 base_id = AIRTABLE_BASE_ID
 
-def get_applicant_data(applicant_id):
-    """Fetch all data for a specific applicant across tables"""
-    
-    # Get personal details
-    personal_records = api.table(base_id, PERSONAL_TABLE).all(
-        formula=f"{{Applicant ID}} = '{applicant_id}'"
-    )
-    personal_data = personal_records[0]['fields'] if personal_records else {}
-    
-    # Get work experience
-    experience_records = api.table(base_id, EXPERIENCE_TABLE).all(
-        formula=f"{{Applicant ID}} = '{applicant_id}'"
-    )
-    experience_data = [record['fields'] for record in experience_records]
-    
-    # Get salary preferences
-    salary_records = api.table(base_id, SALARY_TABLE).all(
-        formula=f"{{Applicant ID}} = '{applicant_id}'"
-    )
-    salary_data = salary_records[0]['fields'] if salary_records else {}
-    
-    # Build compressed JSON
-    compressed_json = {
+def build_compressed_json(personal_data, experience_data, salary_data):
+    """Build the compressed JSON object from child table fields"""
+    return {
         "personal": {
             "name": personal_data.get("Full Name", ""),
             "email": personal_data.get("Email", ""),
@@ -53,8 +38,63 @@ def get_applicant_data(applicant_id):
             "availability": salary_data.get("Availability", 0)
         }
     }
+
+def get_applicant_data(applicant_id):
+    """Fetch all data for a specific applicant across tables"""
+    
+    # Get personal details
+    personal_records = api.table(base_id, PERSONAL_TABLE).all(
+        formula=f"{{Applicant ID}} = '{applicant_id}'"
+    )
+    personal_data = personal_records[0]['fields'] if personal_records else {}
+    
+    # Get work experience
+    experience_records = api.table(base_id, EXPERIENCE_TABLE).all(
+        formula=f"{{Applicant ID}} = '{applicant_id}'"
+    )
+    experience_data = [record['fields'] for record in experience_records]
+    
+    # Get salary preferences
+    salary_records = api.table(base_id, SALARY_TABLE).all(
+        formula=f"{{Applicant ID}} = '{applicant_id}'"
+    )
+    salary_data = salary_records[0]['fields'] if salary_records else {}
+    
+    return build_compressed_json(personal_data, experience_data, salary_data)
+
+def prefetch_child_tables(record_map=None):
+    """Page through each child table once and index the rows by applicant ID"""
+    return {
+        'personal': index_by_applicant(api.table(base_id, PERSONAL_TABLE).all(), record_map),
+        'experience': index_by_applicant(api.table(base_id, EXPERIENCE_TABLE).all(), record_map),
+        'salary': index_by_applicant(api.table(base_id, SALARY_TABLE).all(), record_map)
+    }
+
+def prefetch_child_rows(applicant_ids, record_map=None, chunk_size=50):
+    """Fetch child rows for a subset of applicants, one OR query per table per chunk of IDs"""
+    child_index = {'personal': {}, 'experience': {}, 'salary': {}}
+    tables = {'personal': PERSONAL_TABLE, 'experience': EXPERIENCE_TABLE, 'salary': SALARY_TABLE}
+    applicant_ids = list(applicant_ids)
     
-    return compressed_json
+    for chunk in chunked(applicant_ids, chunk_size):
+        formula = applicant_id_formula(chunk)
+        for section, table_name in tables.items():
+            records = api.table(base_id, table_name).all(formula=formula)
+            for applicant_id, rows in index_by_applicant(records, record_map).items():
+                child_index[section].setdefault(applicant_id, []).extend(rows)
+    return child_index
+
+def get_applicant_data_from_index(applicant_id, child_index):
+    """Build the compressed JSON for an applicant from prefetched child rows"""
+    personal_records = child_index['personal'].get(applicant_id, [])
+    experience_records = child_index['experience'].get(applicant_id, [])
+    salary_records = child_index['salary'].get(applicant_id, [])
+    
+    personal_data = personal_records[0]['fields'] if personal_records else {}
+    experience_data = [record['fields'] for record in experience_records]
+    salary_data = salary_records[0]['fields'] if salary_records else {}
+    
+    return build_compressed_json(personal_data, experience_data, salary_data)
 
 def update_applicant_json(applicant_id, compressed_json):
     """Update the applicant record with compressed JSON"""
@@ -66,7 +106,7 @@ def update_applicant_json(applicant_id, compressed_json):
     if records:
         record_id = records[0]['id']
         applicants.update(record_id, {
-            "Compressed JSON": json.dumps(compressed_json, indent=2)
+            "Compressed JSON": encode(compressed_json)
         })
         print(f"Updated compressed JSON for applicant {applicant_id}")
         return True
@@ -74,22 +114,68 @@ def update_applicant_json(applicant_id, compressed_json):
         print(f"Applicant {applicant_id} not found")
         return False
 
-def compress_all_applicants():
-    """Compress data for all applicants who don't have compressed JSON"""
-    applicants = api.table(base_id, APPLICANTS_TABLE).all()
-    
-    for applicant in applicants:
-        applicant_id = applicant['fields'].get('Applicant ID')
-        compressed_json = applicant['fields'].get('Compressed JSON')
-        
-        # Only compress if not already compressed
-        if not compressed_json:
+@metrics.timed_stage('compress')
+def compress_all_applicants(bulk=True, resume=False):
+    """Compress data for all applicants who don't have compressed JSON.
+
+    Progress is journaled; resume=True continues an interrupted run (see journal.py).
+    """
+    run = stage_run('compress', resume, api, base_id)
+    applicants_table = api.table(base_id, APPLICANTS_TABLE)
+    applicants = applicants_table.all()
+    pending = [a for a in applicants
+               if not a['fields'].get('Compressed JSON') and not run.skip(applicant_key(a['fields'].get('Applicant ID')))]
+    
+    if not pending:
+        print("No applicants need compression")
+        run.finish()
+        return 0
+    
+    if not bulk:
+        compressed_count = 0
+        for applicant in pending:
+            applicant_id = applicant['fields'].get('Applicant ID')
             print(f"Compressing data for applicant {applicant_id}...")
             compressed_data = get_applicant_data(applicant_id)
             if validate_applicant_data(compressed_data):
-                update_applicant_json(applicant_id, compressed_data)
+                if update_applicant_json(applicant_id, compressed_data):
+                    compressed_count += 1
+                    dedup.link_profiles([(applicant_key(applicant_id), compressed_data)])
+                    run.mark([applicant_key(applicant_id)])
             else:
                 print(f"Incomplete data for applicant {applicant_id}")
+                run.mark([applicant_key(applicant_id)], SKIPPED)
+        run.finish()
+        return compressed_count
+    
+    # Bulk mode: one paged scan per child table instead of four calls per applicant
+    record_map = {a['id']: applicant_key(a['fields'].get('Applicant ID')) for a in applicants}
+    child_index = prefetch_child_tables(record_map)
+    
+    profiles = []
+    incomplete = []
+    for applicant in pending:
+        applicant_id = applicant_key(applicant['fields'].get('Applicant ID'))
+        compressed_data = get_applicant_data_from_index(applicant_id, child_index)
+        if validate_applicant_data(compressed_data):
+            profiles.append((applicant, applicant_id, compressed_data))
+        else:
+            print(f"Incomplete data for applicant {applicant_id}")
+            incomplete.append(applicant_id)
+    
+    # Link duplicates in the dedup index as profiles are compressed (and record the link when configured)
+    links = dedup.link_profiles([(applicant_id, data) for _, applicant_id, data in profiles])
+    updates = [{"id": applicant['id'],
+                "fields": {"Compressed JSON": encode(compressed_data), **links.get(applicant_id, {})}}
+               for applicant, applicant_id, compressed_data in profiles]
+    owners = [applicant_id for _, applicant_id, _ in profiles]
+    
+    run.mark(incomplete, SKIPPED)
+    batch_calls = run.write(api, base_id, APPLICANTS_TABLE, 'batch_update', updates, owners)
+    run.finish()
+    
+    print(f"Updated compressed JSON for {len(updates)} applicants in {batch_calls} batch calls")
+    return len(updates)
 
 if __name__ == "__main__":
     print("1. Compress specific applicant")
@@ -105,7 +191,8 @@ if __name__ == "__main__":
         else:
             print("Error: Applicant data is incomplete")
     elif choice == "2":
-        compress_all_applicants()
+        compress_all_applicants(resume="--resume" in sys.argv)
         print("Batch compression completed!")
     else:
-        print("Invalid choice")
\ No newline at end of file
+        print("Invalid choice")
+    metrics.write_outputs()
\ No newline at end of file
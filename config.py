@@ -6,9 +6,84 @@ load_dotenv()
 # Airtable Configuration
 AIRTABLE_ACCESS_TOKEN = os.getenv('AIRTABLE_ACCESS_TOKEN')
 AIRTABLE_BASE_ID = os.getenv('AIRTABLE_BASE_ID')
+# Keep-alive connections held by the shared Airtable session (one per concurrent worker is plenty)
+AIRTABLE_POOL_SIZE = int(os.getenv('AIRTABLE_POOL_SIZE', '16'))
 
 # Gemini API Configuration
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
+GEMINI_MODEL = 'models/gemini-2.5-flash-lite'
+
+# LLM evaluation throughput
+GEMINI_CONCURRENCY = int(os.getenv('GEMINI_CONCURRENCY', '8'))
+GEMINI_REQUESTS_PER_MINUTE = int(os.getenv('GEMINI_REQUESTS_PER_MINUTE', '60'))
+GEMINI_TOKENS_PER_MINUTE = int(os.getenv('GEMINI_TOKENS_PER_MINUTE', '250000'))
+LLM_WRITE_MODE = os.getenv('LLM_WRITE_MODE', 'batch')  # 'batch' or 'single'
+LLM_BATCH_SIZE = int(os.getenv('LLM_BATCH_SIZE', '1'))  # applicants per Gemini request
+LLM_BATCH_TOKEN_BUDGET = int(os.getenv('LLM_BATCH_TOKEN_BUDGET', '8000'))  # input tokens per batched request
+LLM_STREAMING = os.getenv('LLM_STREAMING', '0') == '1'  # stream single evaluations and stop once parsed
+
+# LLM evaluation scheduling (llm_scheduler.py): which applicants to evaluate and per-run caps (0 = no limit)
+LLM_EVALUATE = os.getenv('LLM_EVALUATE', 'all')  # 'all', 'not_rejected' or 'shortlisted'
+LLM_MAX_REQUESTS = int(os.getenv('LLM_MAX_REQUESTS', '0'))
+LLM_MAX_TOKENS = int(os.getenv('LLM_MAX_TOKENS', '0'))
+LLM_MAX_COST_USD = float(os.getenv('LLM_MAX_COST_USD', '0'))
+# Gemini 2.5 Flash-Lite list prices, used to estimate cost
+GEMINI_INPUT_COST_PER_MILLION = float(os.getenv('GEMINI_INPUT_COST_PER_MILLION', '0.10'))
+GEMINI_OUTPUT_COST_PER_MILLION = float(os.getenv('GEMINI_OUTPUT_COST_PER_MILLION', '0.40'))
+
+# On-disk cache of LLM evaluations
+LLM_CACHE_ENABLED = os.getenv('LLM_CACHE_ENABLED', '1') == '1'
+LLM_CACHE_DIR = os.getenv('LLM_CACHE_DIR', '.cache')
+LLM_CACHE_MAX_ENTRIES = int(os.getenv('LLM_CACHE_MAX_ENTRIES', '100000'))
+LLM_CACHE_TTL_DAYS = int(os.getenv('LLM_CACHE_TTL_DAYS', '90'))
+
+# Streaming pipeline: pages of applicants buffered between stages
+STREAM_QUEUE_SIZE = int(os.getenv('STREAM_QUEUE_SIZE', '4'))
+
+# Incremental run state (content hashes and last-run watermark)
+PIPELINE_STATE_DIR = os.getenv('PIPELINE_STATE_DIR', '.cache')
+# Journal of per-stage progress and unsent writes in PIPELINE_STATE_DIR, used by --resume (see journal.py)
+JOURNAL_ENABLED = os.getenv('JOURNAL_ENABLED', '1') == '1'
+
+# Webhook receiver (webhook_receiver.py): per-applicant debounce and Airtable's MAC secret (base64)
+WEBHOOK_HOST = os.getenv('WEBHOOK_HOST', '127.0.0.1')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', '8787'))
+WEBHOOK_DEBOUNCE_SECONDS = float(os.getenv('WEBHOOK_DEBOUNCE_SECONDS', '10'))
+WEBHOOK_MAX_DELAY_SECONDS = float(os.getenv('WEBHOOK_MAX_DELAY_SECONDS', '60'))
+WEBHOOK_WORKERS = int(os.getenv('WEBHOOK_WORKERS', '4'))
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET')
+# Changes from these sources are ignored ('publicApi' is our own writes)
+WEBHOOK_IGNORED_SOURCES = {source for source in os.getenv('WEBHOOK_IGNORED_SOURCES', 'publicApi').split(',') if source}
+
+# Bulk NDJSON import (bulk_transfer.py): lines per worker task and parallel workers
+BULK_CHUNK_SIZE = int(os.getenv('BULK_CHUNK_SIZE', '500'))
+BULK_WORKERS = int(os.getenv('BULK_WORKERS', '4'))
+
+# Duplicate-applicant index (dedup.py) in PIPELINE_STATE_DIR: estimated name/experience similarity that
+# counts as a duplicate, and an optional Applicants text field that receives the canonical Applicant ID
+DEDUP_ENABLED = os.getenv('DEDUP_ENABLED', '1') == '1'
+DEDUP_SIMILARITY = float(os.getenv('DEDUP_SIMILARITY', '0.8'))
+DEDUP_LINK_FIELD = os.getenv('DEDUP_LINK_FIELD', '')
+
+# Sharded runner (sharded_runner.py): worker processes, one base each (0 = one per base)
+SHARD_WORKERS = int(os.getenv('SHARD_WORKERS', '0'))
+
+# Local SQLite mirror of the base: reads are served locally, writes are batched back to Airtable
+USE_LOCAL_MIRROR = os.getenv('USE_LOCAL_MIRROR', '0') == '1'
+LOCAL_MIRROR_DIR = os.getenv('LOCAL_MIRROR_DIR', '.cache')
+
+# Storage format of the Compressed JSON field ('json', 'zlib' or 'msgpack'; see codec.py).
+# Profiles whose compact JSON exceeds the threshold use the large codec instead.
+COMPRESSED_JSON_CODEC = os.getenv('COMPRESSED_JSON_CODEC', 'json')
+COMPRESSED_JSON_LARGE_CODEC = os.getenv('COMPRESSED_JSON_LARGE_CODEC', 'zlib')
+COMPRESSED_JSON_LARGE_THRESHOLD = int(os.getenv('COMPRESSED_JSON_LARGE_THRESHOLD', '20000'))
+
+# Run metrics: JSON report and Prometheus textfile written to METRICS_DIR after each run.
+# Comma-separated stage names (compress, decompress, shortlist, llm) to run under cProfile / tracemalloc.
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', '1') == '1'
+METRICS_DIR = os.getenv('METRICS_DIR', os.path.join('.cache', 'metrics'))
+METRICS_PROFILE_STAGES = {stage for stage in os.getenv('METRICS_PROFILE_STAGES', '').split(',') if stage}
+METRICS_TRACEMALLOC_STAGES = {stage for stage in os.getenv('METRICS_TRACEMALLOC_STAGES', '').split(',') if stage}
 
 # Table Names
 APPLICANTS_TABLE = "Applicants"
@@ -17,6 +92,21 @@ EXPERIENCE_TABLE = "Work Experience"
 SALARY_TABLE = "Salary Preferences"
 SHORTLISTED_TABLE = "Shortlisted Leads"
 
+# Airtable accepts at most 10 records per batch create/update/delete call
+BATCH_SIZE = 10
+# Airtable allows 5 requests per second per base
+BASE_RATE_LIMIT_PER_SECOND = 5
+# Client-side throttle (airtable_client.py): pace requests just under the limit and retry 429s
+AIRTABLE_REQUESTS_PER_SECOND = float(os.getenv('AIRTABLE_REQUESTS_PER_SECOND', '4.5'))
+AIRTABLE_MAX_RETRIES = int(os.getenv('AIRTABLE_MAX_RETRIES', '5'))
+# Airtable's 429s carry no Retry-After; its documented penalty is 30 seconds
+AIRTABLE_RETRY_AFTER_DEFAULT = float(os.getenv('AIRTABLE_RETRY_AFTER_DEFAULT', '30'))
+
+# Shortlisting thresholds
+MIN_EXPERIENCE_YEARS = 4
+MAX_HOURLY_RATE_USD = 100
+MIN_AVAILABILITY_HOURS = 20
+
 # Tier-1 Companies for Shortlisting
 TIER_1_COMPANIES = [
     "Google", "Meta", "OpenAI", "Microsoft", "Apple", 
@@ -33,11 +123,12 @@ CURRENCY_RATES = {
     'INR': 0.012
 }
 
-# Eligible Countries
-ELIGIBLE_COUNTRIES = [
-    'us', 'usa', 'united states', 'united states of america',
-    'canada', 'ca',
-    'uk', 'united kingdom', 'great britain', 'england',
-    'germany', 'de', 'deutschland',
-    'india', 'in', 'ind'
-]
\ No newline at end of file
+# Eligible Countries, grouped by canonical name (the group name explains which country matched)
+ELIGIBLE_COUNTRY_GROUPS = {
+    'United States': ['us', 'usa', 'united states', 'united states of america'],
+    'Canada': ['canada', 'ca'],
+    'United Kingdom': ['uk', 'united kingdom', 'great britain', 'england'],
+    'Germany': ['germany', 'de', 'deutschland'],
+    'India': ['india', 'in', 'ind']
+}
+ELIGIBLE_COUNTRIES = [alias for aliases in ELIGIBLE_COUNTRY_GROUPS.values() for alias in aliases]
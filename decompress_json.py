@@ -1,101 +1,228 @@
 import os
+import sys
 import json
-from pyairtable import Api
-from config import AIRTABLE_ACCESS_TOKEN, AIRTABLE_BASE_ID, APPLICANTS_TABLE, PERSONAL_TABLE, EXPERIENCE_TABLE, SALARY_TABLE
+from config import AIRTABLE_BASE_ID, APPLICANTS_TABLE, PERSONAL_TABLE, EXPERIENCE_TABLE, SALARY_TABLE
+from clients import lazy_airtable_api
+from codec import CodecError, decode
+from journal import SKIPPED, UNCHANGED, stage_run
+from compress_json import prefetch_child_tables
+from metrics import metrics
+from utils import applicant_key, chunked
 
 # Initialize Airtable API
-api = Api(AIRTABLE_ACCESS_TOKEN)
+api = lazy_airtable_api(mirrored=False)
 base_id = AIRTABLE_BASE_ID
 
-def decompress_json(applicant_id):
-    """Decompress JSON and update child tables"""
-    
-    # Get the compressed JSON from Applicants table
-    applicants = api.table(base_id, APPLICANTS_TABLE)
-    records = applicants.all(formula=f"{{Applicant ID}} = '{applicant_id}'")
-    
-    if not records:
-        print(f"Applicant {applicant_id} not found")
-        return False
-    
-    compressed_json_str = records[0]['fields'].get('Compressed JSON', '{}')
-    compressed_data = json.loads(compressed_json_str)
-    
-    # Update Personal Details
-    personal_data = compressed_data.get('personal', {})
-    personal_records = api.table(base_id, PERSONAL_TABLE).all(
-        formula=f"{{Applicant ID}} = '{applicant_id}'"
+def _normalize_value(value):
+    """Treat missing, empty and zero values alike (Airtable omits empty fields)"""
+    return None if value in ('', None, 0, []) else value
+
+def fields_match(current_fields, desired_fields):
+    """Check whether a record already holds the desired field values"""
+    return all(
+        _normalize_value(current_fields.get(key)) == _normalize_value(value)
+        for key, value in desired_fields.items()
     )
-    
-    personal_fields = {
+
+def new_write_plan():
+    """Create an empty set of pending creates, updates and deletes per table"""
+    return {'create': {}, 'update': {}, 'delete': {}}
+
+def personal_fields_from_json(personal_data):
+    """Map the personal section of the compressed JSON to table fields"""
+    return {
         "Full Name": personal_data.get('name', ''),
         "Email": personal_data.get('email', ''),
         "Location": personal_data.get('location', ''),
         "LinkedIn URL": personal_data.get('linkedin', '')
     }
-    
-    if personal_records:
-        api.table(base_id, PERSONAL_TABLE).update(personal_records[0]['id'], personal_fields)
+
+def experience_fields_from_json(exp):
+    """Map one experience entry of the compressed JSON to table fields"""
+    return {
+        "Company": exp.get('company', ''),
+        "Title": exp.get('title', ''),
+        "Start Date": exp.get('start', ''),
+        "End Date": exp.get('end', ''),
+        "Technologies": ", ".join(exp.get('technologies', []))
+    }
+
+def salary_fields_from_json(salary_data):
+    """Map the salary section of the compressed JSON to table fields"""
+    return {
+        "Preferred Rate": salary_data.get('preferred_rate', 0),
+        "Minimum Rate": salary_data.get('minimum_rate', 0),
+        "Currency": salary_data.get('currency', 'USD'),
+        "Availability": salary_data.get('availability', 0)
+    }
+
+def _plan_single_row(plan, table_name, applicant_id, existing_records, desired_fields):
+    """Plan the write for a one-row-per-applicant table"""
+    if existing_records:
+        record = existing_records[0]
+        if not fields_match(record['fields'], desired_fields):
+            plan['update'].setdefault(table_name, []).append({"id": record['id'], "fields": desired_fields})
     else:
-        personal_fields["Applicant ID"] = applicant_id
-        api.table(base_id, PERSONAL_TABLE).create(personal_fields)
+        plan['create'].setdefault(table_name, []).append(dict(desired_fields, **{"Applicant ID": applicant_id}))
+
+def diff_experience(existing_records, experience_data):
+    """Diff experience entries against existing rows.
+
+    Returns (updates, creates, deletes): identical rows are left alone,
+    the remaining rows are updated in place and any surplus on either
+    side is created or deleted.
+    """
+    desired_rows = [experience_fields_from_json(exp) for exp in experience_data]
+    unmatched_records = list(existing_records)
+    unmatched_desired = []
     
-    # Update Work Experience (delete existing and create new)
-    experience_data = compressed_data.get('experience', [])
-    existing_exp_records = api.table(base_id, EXPERIENCE_TABLE).all(
-        formula=f"{{Applicant ID}} = '{applicant_id}'"
-    )
+    for desired in desired_rows:
+        for record in unmatched_records:
+            if fields_match(record['fields'], desired):
+                unmatched_records.remove(record)
+                break
+        else:
+            unmatched_desired.append(desired)
     
-    # Delete existing experience records
-    for record in existing_exp_records:
-        api.table(base_id, EXPERIENCE_TABLE).delete(record['id'])
+    updates = [
+        {"id": record['id'], "fields": desired}
+        for record, desired in zip(unmatched_records, unmatched_desired)
+    ]
+    creates = unmatched_desired[len(updates):]
+    deletes = [record['id'] for record in unmatched_records[len(updates):]]
+    return updates, creates, deletes
+
+def plan_decompression(applicant_id, compressed_data, child_rows, plan=None):
+    """Add the writes needed to restore one applicant's child rows to a plan"""
+    if plan is None:
+        plan = new_write_plan()
     
-    # Create new experience records
-    for exp in experience_data:
-        experience_fields = {
-            "Applicant ID": applicant_id,
-            "Company": exp.get('company', ''),
-            "Title": exp.get('title', ''),
-            "Start Date": exp.get('start', ''),
-            "End Date": exp.get('end', ''),
-            "Technologies": ", ".join(exp.get('technologies', []))
-        }
-        api.table(base_id, EXPERIENCE_TABLE).create(experience_fields)
+    _plan_single_row(plan, PERSONAL_TABLE, applicant_id, child_rows['personal'],
+                     personal_fields_from_json(compressed_data.get('personal', {})))
     
-    # Update Salary Preferences
-    salary_data = compressed_data.get('salary', {})
-    salary_records = api.table(base_id, SALARY_TABLE).all(
-        formula=f"{{Applicant ID}} = '{applicant_id}'"
-    )
+    updates, creates, deletes = diff_experience(child_rows['experience'], compressed_data.get('experience', []))
+    if updates:
+        plan['update'].setdefault(EXPERIENCE_TABLE, []).extend(updates)
+    if creates:
+        plan['create'].setdefault(EXPERIENCE_TABLE, []).extend(
+            dict(fields, **{"Applicant ID": applicant_id}) for fields in creates
+        )
+    if deletes:
+        plan['delete'].setdefault(EXPERIENCE_TABLE, []).extend(deletes)
     
-    salary_fields = {
-        "Preferred Rate": salary_data.get('preferred_rate', 0),
-        "Minimum Rate": salary_data.get('minimum_rate', 0),
-        "Currency": salary_data.get('currency', 'USD'),
-        "Availability": salary_data.get('availability', 0)
+    _plan_single_row(plan, SALARY_TABLE, applicant_id, child_rows['salary'],
+                     salary_fields_from_json(compressed_data.get('salary', {})))
+    return plan
+
+def apply_write_plan(plan):
+    """Send a write plan to Airtable in batches of 10, returning the number of calls made"""
+    calls = 0
+    for table_name, records in plan['delete'].items():
+        for chunk in chunked(records):
+            api.table(base_id, table_name).batch_delete(chunk)
+            calls += 1
+    for table_name, records in plan['update'].items():
+        for chunk in chunked(records):
+            api.table(base_id, table_name).batch_update(chunk)
+            calls += 1
+    for table_name, records in plan['create'].items():
+        for chunk in chunked(records):
+            api.table(base_id, table_name).batch_create(chunk)
+            calls += 1
+    return calls
+
+def _load_compressed_json(applicant_id, compressed_json_str):
+    """Parse the stored compressed JSON, returning None when it is invalid"""
+    try:
+        return decode(compressed_json_str) if compressed_json_str else {}
+    except CodecError:
+        print(f"Invalid JSON for applicant {applicant_id}")
+        return None
+
+def decompress_json(applicant_id):
+    """Decompress JSON and update child tables"""
+    
+    # Get the compressed JSON from Applicants table
+    applicants = api.table(base_id, APPLICANTS_TABLE)
+    records = applicants.all(formula=f"{{Applicant ID}} = '{applicant_id}'")
+    
+    if not records:
+        print(f"Applicant {applicant_id} not found")
+        return False
+    
+    compressed_data = _load_compressed_json(applicant_id, records[0]['fields'].get('Compressed JSON'))
+    if compressed_data is None:
+        return False
+    
+    # Fetch the current child rows for this applicant
+    formula = f"{{Applicant ID}} = '{applicant_id}'"
+    child_rows = {
+        'personal': api.table(base_id, PERSONAL_TABLE).all(formula=formula),
+        'experience': api.table(base_id, EXPERIENCE_TABLE).all(formula=formula),
+        'salary': api.table(base_id, SALARY_TABLE).all(formula=formula)
     }
     
-    if salary_records:
-        api.table(base_id, SALARY_TABLE).update(salary_records[0]['id'], salary_fields)
-    else:
-        salary_fields["Applicant ID"] = applicant_id
-        api.table(base_id, SALARY_TABLE).create(salary_fields)
+    plan = plan_decompression(applicant_id, compressed_data, child_rows)
+    write_calls = apply_write_plan(plan)
     
-    print(f"Decompression completed for applicant {applicant_id}")
+    print(f"Decompression completed for applicant {applicant_id} ({write_calls} write calls)")
     return True
 
-def decompress_all_applicants():
-    """Decompress all applicants who have compressed JSON"""
+def _plan_sizes(plan):
+    return {(operation, table_name): len(records)
+            for operation, tables in plan.items() for table_name, records in tables.items()}
+
+@metrics.timed_stage('decompress')
+def decompress_all_applicants(resume=False):
+    """Decompress all applicants who have compressed JSON.
+
+    The whole write plan is journaled before it is sent; resume=True
+    continues an interrupted run (see journal.py).
+    """
+    run = stage_run('decompress', resume, api, base_id)
     applicants = api.table(base_id, APPLICANTS_TABLE).all()
     
+    # Prefetch every child table once instead of querying per applicant
+    record_map = {a['id']: applicant_key(a['fields'].get('Applicant ID')) for a in applicants}
+    child_index = prefetch_child_tables(record_map)
+    plan = new_write_plan()
+    # Applicant behind each planned record, per (operation, table), so the journal knows when one is done
+    owners = {}
+    unchanged = []
+    invalid = []
+    decompressed_count = 0
+    
     for applicant in applicants:
-        applicant_id = applicant['fields'].get('Applicant ID')
+        applicant_id = applicant_key(applicant['fields'].get('Applicant ID'))
         compressed_json = applicant['fields'].get('Compressed JSON')
         
         # Only decompress if compressed data exists
-        if compressed_json:
-            print(f"Decompressing data for applicant {applicant_id}...")
-            decompress_json(applicant_id)
+        if compressed_json and not run.skip(applicant_id):
+            compressed_data = _load_compressed_json(applicant_id, compressed_json)
+            if compressed_data is None:
+                invalid.append(applicant_id)
+                continue
+            child_rows = {section: rows.get(applicant_id, []) for section, rows in child_index.items()}
+            before = _plan_sizes(plan)
+            plan_decompression(applicant_id, compressed_data, child_rows, plan)
+            added = {key: size - before.get(key, 0) for key, size in _plan_sizes(plan).items()}
+            for key, count in added.items():
+                owners.setdefault(key, []).extend([applicant_id] * count)
+            if not any(added.values()):
+                unchanged.append(applicant_id)
+            decompressed_count += 1
+    
+    run.mark(unchanged, UNCHANGED)
+    run.mark(invalid, SKIPPED)
+    entries = []
+    # Same order as apply_write_plan: deletes, then updates, then creates
+    for operation in ('delete', 'update', 'create'):
+        for table_name, records in plan[operation].items():
+            entries += run.log(table_name, f'batch_{operation}', records, owners[(operation, table_name)])
+    write_calls = run.send(api, base_id, entries)
+    run.finish()
+    print(f"Decompressed {decompressed_count} applicants with {write_calls} batch write calls")
+    return decompressed_count
 
 if __name__ == "__main__":
     print("1. Decompress specific applicant")
@@ -106,7 +233,8 @@ if __name__ == "__main__":
         applicant_id = input("Enter Applicant ID to decompress: ")
         decompress_json(applicant_id)
     elif choice == "2":
-        decompress_all_applicants()
+        decompress_all_applicants(resume="--resume" in sys.argv)
         print("Batch decompression completed!")
     else:
-        print("Invalid choice")
\ No newline at end of file
+        print("Invalid choice")
+    metrics.write_outputs()
@@ -0,0 +1,290 @@
+"""Duplicate-applicant index.
+
+Applicants often submit twice with small differences (email case, a
+LinkedIn URL with or without `https://www.` or a trailing slash, a
+shortened name). Every stage that compresses a profile (batch, streaming,
+incremental, webhook) adds it to this index, linking it to the earliest
+applicant it matches (its canonical applicant) by any of:
+
+* the normalized email (lower-cased, `+tag` removed, dots ignored for Gmail);
+* the LinkedIn handle (the part after `/in/`);
+* name and experience-history features whose Jaccard similarity reaches
+  DEDUP_SIMILARITY. Candidates come from MinHash LSH buckets, so a lookup
+  only compares a handful of profiles however large the base grows.
+
+When a duplicate's profile is identical to its canonical applicant's,
+shortlist_applicants skips creating a second Shortlisted Leads row for it
+and evaluate_all_with_llm copies the canonical applicant's evaluation
+instead of paying for a new one (falling back to evaluating the duplicate
+when the canonical applicant has none). A duplicate with different content
+is treated as an update: it is linked, but shortlisted and evaluated on
+its own.
+With DEDUP_LINK_FIELD set, compression also writes the canonical Applicant ID
+to that Applicants field.
+
+The index is SQLite in PIPELINE_STATE_DIR, with lookups served by indexes
+on email, handle and LSH band.
+
+    python dedup.py rebuild     # index profiles compressed before the index existed
+    python dedup.py stats       # indexed applicants and duplicate clusters
+    python dedup.py clear
+"""
+import os
+import re
+import json
+import sys
+import sqlite3
+import hashlib
+import threading
+from array import array
+from config import DEDUP_ENABLED, DEDUP_LINK_FIELD, DEDUP_SIMILARITY, PIPELINE_STATE_DIR
+from metrics import metrics
+from utils import content_hash
+
+NUM_HASHES = 60
+# 12 bands of 5 rows: a pair with 0.8 similarity shares a bucket 99% of the time, one with 0.3 only 3%
+BANDS = 12
+ROWS_PER_BAND = NUM_HASHES // BANDS
+
+_GMAIL_DOMAINS = {'gmail.com', 'googlemail.com'}
+_LINKEDIN_HANDLE = re.compile(r'linkedin\.com/(?:in|pub)/([^/?#]+)', re.IGNORECASE)
+_WORD = re.compile(r'[a-z0-9]+')
+
+def normalize_email(email):
+    """Lower-cased email with any +tag removed (and dots, for Gmail); None when empty"""
+    email = (email or '').strip().lower()
+    if '@' not in email:
+        return None
+    local, _, domain = email.rpartition('@')
+    local = local.split('+', 1)[0]
+    if domain in _GMAIL_DOMAINS:
+        local = local.replace('.', '')
+        domain = 'gmail.com'
+    return f"{local}@{domain}" if local else None
+
+def linkedin_handle(url):
+    """The profile handle of a LinkedIn URL (or a bare handle); None when empty"""
+    url = (url or '').strip()
+    if not url:
+        return None
+    match = _LINKEDIN_HANDLE.search(url)
+    handle = match.group(1) if match else url.rstrip('/').rsplit('/', 1)[-1]
+    handle = handle.strip().lower()
+    return handle or None
+
+def _words(text):
+    return _WORD.findall((text or '').lower())
+
+def shingles(profile):
+    """The features compared: name words, plus each role's company, company and title, and role start month"""
+    features = {f"n:{word}" for word in _words(profile.get('personal', {}).get('name'))}
+    for exp in profile.get('experience', []):
+        company = ' '.join(_words(exp.get('company')))
+        role = f"{company}|{' '.join(_words(exp.get('title')))}"
+        features.update((f"c:{company}", f"r:{role}", f"s:{role}|{(exp.get('start') or '')[:7]}"))
+    return features
+
+def jaccard(features, other):
+    return len(features & other) / len(features | other) if features or other else 0.0
+
+def _hashes(feature):
+    # NUM_HASHES independent 64-bit hashes from one extendable-output digest
+    return array('Q', hashlib.shake_128(feature.encode('utf-8')).digest(8 * NUM_HASHES))
+
+def minhash(features):
+    """MinHash signature of a feature set (None for an empty set)"""
+    if not features:
+        return None
+    return array('Q', map(min, zip(*map(_hashes, features))))
+
+def band_keys(signature):
+    """One LSH bucket key per band (fits SQLite's signed 64-bit integers)"""
+    keys = []
+    for band in range(BANDS):
+        rows = signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]
+        keys.append(int.from_bytes(hashlib.blake2b(rows.tobytes(), digest_size=7).digest(), 'little'))
+    return keys
+
+def _sort_key(applicant_id):
+    # Autonumber IDs compare numerically, so the first submission stays canonical
+    return (0, int(applicant_id), '') if str(applicant_id).isdigit() else (1, 0, str(applicant_id))
+
+class DedupIndex:
+    """SQLite-backed index of applicant identities and MinHash LSH buckets"""
+
+    def __init__(self, index_dir=PIPELINE_STATE_DIR, filename='dedup.sqlite3', threshold=DEDUP_SIMILARITY):
+        self.path = os.path.join(index_dir, filename)
+        self.threshold = threshold
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        # Opened lazily so importing the module never touches the disk
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS applicants (
+                    applicant_id TEXT PRIMARY KEY,
+                    email TEXT,
+                    linkedin TEXT,
+                    features TEXT,
+                    canonical_id TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_dedup_email ON applicants (email);
+                CREATE INDEX IF NOT EXISTS idx_dedup_linkedin ON applicants (linkedin);
+                CREATE INDEX IF NOT EXISTS idx_dedup_canonical ON applicants (canonical_id);
+                CREATE TABLE IF NOT EXISTS bands (
+                    band INTEGER NOT NULL,
+                    bucket INTEGER NOT NULL,
+                    applicant_id TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_dedup_bands ON bands (band, bucket);
+                CREATE INDEX IF NOT EXISTS idx_dedup_band_owner ON bands (applicant_id);
+            """)
+        return self._conn
+
+    def _matches(self, conn, applicant_id, email, handle, features, buckets):
+        """Indexed applicants matching by email, LinkedIn handle or feature similarity"""
+        matches = set()
+        if email:
+            matches.update(row[0] for row in conn.execute("SELECT applicant_id FROM applicants WHERE email = ?",
+                                                          (email,)))
+        if handle:
+            matches.update(row[0] for row in conn.execute("SELECT applicant_id FROM applicants WHERE linkedin = ?",
+                                                          (handle,)))
+        if buckets:
+            candidates = set()
+            for band, bucket in enumerate(buckets):
+                candidates.update(row[0] for row in conn.execute(
+                    "SELECT applicant_id FROM bands WHERE band = ? AND bucket = ?", (band, bucket)))
+            candidates -= matches | {applicant_id}
+            # LSH only proposes candidates; the exact Jaccard similarity of the features decides
+            for candidate in candidates:
+                row = conn.execute("SELECT features FROM applicants WHERE applicant_id = ?", (candidate,)).fetchone()
+                if row and row[0] and jaccard(features, set(json.loads(row[0]))) >= self.threshold:
+                    matches.add(candidate)
+        matches.discard(applicant_id)
+        return matches
+
+    def _add(self, conn, applicant_id, profile):
+        applicant_id = str(applicant_id)
+        personal = profile.get('personal', {})
+        email = normalize_email(personal.get('email'))
+        handle = linkedin_handle(personal.get('linkedin'))
+        features = shingles(profile)
+        # A name alone is not enough to call two applicants the same person
+        signature = minhash(features) if profile.get('experience') else None
+        buckets = band_keys(signature) if signature is not None else []
+        conn.execute("DELETE FROM bands WHERE applicant_id = ?", (applicant_id,))
+        matches = self._matches(conn, applicant_id, email, handle, features, buckets)
+        canonical_ids = {row[0] for match in matches
+                         for row in conn.execute("SELECT canonical_id FROM applicants WHERE applicant_id = ?",
+                                                 (match,))}
+        # The earliest applicant is canonical; clusters this profile bridges are merged under it
+        canonical_id = min(canonical_ids | {applicant_id}, key=_sort_key)
+        conn.executemany("UPDATE applicants SET canonical_id = ? WHERE canonical_id = ?",
+                         [(canonical_id, other) for other in canonical_ids - {canonical_id}])
+        conn.execute("INSERT OR REPLACE INTO applicants VALUES (?, ?, ?, ?, ?)",
+                     (applicant_id, email, handle, json.dumps(sorted(features)) if features else None, canonical_id))
+        conn.executemany("INSERT INTO bands VALUES (?, ?, ?)",
+                         [(band, bucket, applicant_id) for band, bucket in enumerate(buckets)])
+        return canonical_id
+
+    def add(self, applicant_id, profile):
+        """Index (or re-index) a profile, returning its canonical applicant's ID (its own when unique)"""
+        return self.add_many([(applicant_id, profile)])[str(applicant_id)]
+
+    def add_many(self, profiles):
+        """Index (applicant_id, profile) pairs in ID order in one transaction, returning {applicant_id: canonical_id}"""
+        with self._lock:
+            conn = self._connect()
+            canonical = {str(applicant_id): self._add(conn, applicant_id, profile)
+                         for applicant_id, profile in sorted(profiles, key=lambda item: _sort_key(item[0]))}
+            conn.commit()
+        return canonical
+
+    def duplicates(self):
+        """{applicant_id: canonical_id} for every applicant linked to another"""
+        with self._lock:
+            return dict(self._connect().execute(
+                "SELECT applicant_id, canonical_id FROM applicants WHERE applicant_id != canonical_id"))
+
+    def stats(self):
+        with self._lock:
+            conn = self._connect()
+            indexed = conn.execute("SELECT COUNT(*) FROM applicants").fetchone()[0]
+            duplicates, clusters = conn.execute(
+                "SELECT COUNT(*), COUNT(DISTINCT canonical_id) FROM applicants WHERE applicant_id != canonical_id"
+            ).fetchone()
+        return {"indexed": indexed, "duplicates": duplicates, "clusters": clusters}
+
+    def clear(self):
+        with self._lock:
+            self._connect().executescript("DELETE FROM applicants; DELETE FROM bands;")
+            self._conn.commit()
+
+# Shared by every stage in the process; None when DEDUP_ENABLED is off
+default_index = DedupIndex() if DEDUP_ENABLED else None
+
+def duplicates():
+    """{applicant_id: canonical_id} from the default index (empty when dedup is disabled)"""
+    return default_index.duplicates() if default_index is not None else {}
+
+def same_profile(profile, canonical_profile):
+    """True when a duplicate's profile is identical to its canonical applicant's.
+
+    Only then are the canonical applicant's lead and evaluation reused; a
+    resubmission with different content is often an update, so it is
+    evaluated on its own and only linked.
+    """
+    return content_hash(profile) == content_hash(canonical_profile)
+
+def link_profiles(profiles):
+    """Index freshly compressed (applicant_id, profile) pairs.
+
+    Returns {applicant_id: extra Applicants fields}: the DEDUP_LINK_FIELD link
+    for duplicates when that field is configured, otherwise nothing.
+    """
+    if default_index is None or not profiles:
+        return {}
+    links = {}
+    for applicant_id, canonical_id in default_index.add_many(profiles).items():
+        if canonical_id == applicant_id:
+            continue
+        print(f"Applicant {applicant_id} looks like a duplicate of applicant {canonical_id}")
+        metrics.increment('dedup_duplicates_total')
+        if DEDUP_LINK_FIELD:
+            links[applicant_id] = {DEDUP_LINK_FIELD: canonical_id}
+    return links
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else 'stats'
+    index = DedupIndex()
+    if command == 'rebuild':
+        from clients import airtable_api
+        from codec import CodecError, decode
+        from config import AIRTABLE_BASE_ID, APPLICANTS_TABLE
+        from utils import applicant_key
+
+        index.clear()
+        profiles = []
+        for record in airtable_api().table(AIRTABLE_BASE_ID, APPLICANTS_TABLE).all():
+            applicant_id = applicant_key(record['fields'].get('Applicant ID'))
+            try:
+                if applicant_id and record['fields'].get('Compressed JSON'):
+                    profiles.append((applicant_id, decode(record['fields']['Compressed JSON'])))
+            except CodecError:
+                print(f"Skipping applicant {applicant_id} - invalid JSON")
+        index.add_many(profiles)
+        command = 'stats'
+    if command == 'stats':
+        stats = index.stats()
+        print(f"{stats['indexed']} applicants indexed, {stats['duplicates']} duplicates "
+              f"of {stats['clusters']} canonical applicants")
+    elif command == 'clear':
+        index.clear()
+        print("Dedup index cleared")
+    else:
+        print("Usage: python dedup.py [rebuild | stats | clear]")
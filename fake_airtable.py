@@ -0,0 +1,227 @@
+import time
+import threading
+import itertools
+from collections import Counter, deque
+from datetime import datetime, timezone
+import requests
+from utils import parse_simple_formula
+
+PAGE_SIZE = 100
+MAX_RECORDS_PER_BATCH = 10
+
+def _clean_fields(fields):
+    """Airtable omits empty fields from stored records"""
+    return {
+        key: value for key, value in fields.items()
+        if value is not None and value is not False and value != '' and value != []
+    }
+
+class FakeApi:
+    """In-memory stand-in for pyairtable.Api covering the table calls this project makes.
+
+    Every simulated HTTP request is counted per (table, operation) and per
+    stage label, can be delayed by `latency` seconds, and raises a 429
+    HTTPError when more than `rate_limit` requests land within one second
+    (set rate_limit=0 to disable).
+    """
+
+    def __init__(self, latency=0.0, rate_limit=5):
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.tables = {}
+        self.calls = Counter()
+        self.calls_by_stage = {}
+        self.rate_limited = 0
+        self.stage = None
+        self._recent = deque()
+        self._lock = threading.RLock()
+        self._ids = itertools.count(1)
+
+    def table(self, base_id, table_name):
+        with self._lock:
+            key = (base_id, table_name)
+            if key not in self.tables:
+                self.tables[key] = FakeTable(self, table_name)
+            return self.tables[key]
+
+    def new_record_id(self):
+        return f"rec{next(self._ids):014d}"
+
+    def set_stage(self, stage):
+        """Attribute subsequent calls to a named pipeline stage (defaults to the calling thread's name)"""
+        self.stage = stage
+
+    def reset_counters(self):
+        with self._lock:
+            self.calls.clear()
+            self.calls_by_stage.clear()
+            self.rate_limited = 0
+
+    def request(self, table_name, operation):
+        """Account for one simulated HTTP request"""
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            if self.rate_limit:
+                now = time.monotonic()
+                while self._recent and now - self._recent[0] >= 1.0:
+                    self._recent.popleft()
+                if len(self._recent) >= self.rate_limit:
+                    self.rate_limited += 1
+                    response = requests.Response()
+                    response.status_code = 429
+                    response.headers['Retry-After'] = '1'
+                    raise requests.exceptions.HTTPError("429 Client Error: Too Many Requests", response=response)
+                self._recent.append(now)
+            key = f"{table_name}.{operation}"
+            self.calls[key] += 1
+            stage = self.stage or threading.current_thread().name
+            self.calls_by_stage.setdefault(stage, Counter())[key] += 1
+
+class FakeTable:
+    """In-memory table supporting all/iterate/first/get, single and batch writes"""
+
+    def __init__(self, api, name):
+        self.api = api
+        self.name = name
+        self.records = {}
+        self.modified = {}
+        self.indexes = {}
+
+    def _snapshot(self, record_id):
+        record = self.records[record_id]
+        return {"id": record_id, "createdTime": record['createdTime'], "fields": dict(record['fields'])}
+
+    # Equality indexes are built on first use and kept current on every write,
+    # so formula lookups stay O(1) even at 100k records
+
+    def _index_add(self, record_id):
+        fields = self.records[record_id]['fields']
+        for field, index in self.indexes.items():
+            value = fields.get(field)
+            for item in (value if isinstance(value, list) else [value]):
+                if item is not None:
+                    index.setdefault(str(item), set()).add(record_id)
+
+    def _index_remove(self, record_id):
+        fields = self.records[record_id]['fields']
+        for field, index in self.indexes.items():
+            value = fields.get(field)
+            for item in (value if isinstance(value, list) else [value]):
+                if item is not None:
+                    index.get(str(item), set()).discard(record_id)
+
+    def _matching_ids(self, formula):
+        if not formula:
+            return list(self.records)
+        kind, argument = parse_simple_formula(formula)
+        if kind == 'modified_after':
+            return [record_id for record_id in self.records if self.modified[record_id] > argument]
+
+        matched = set()
+        for field, value in argument:
+            if field not in self.indexes:
+                self.indexes[field] = {}
+                for record_id in self.records:
+                    self._index_add(record_id)
+            matched.update(self.indexes[field].get(value, ()))
+        # Keep creation order, as Airtable returns rows in a stable order
+        return sorted(matched, key=lambda record_id: self.records[record_id]['sequence'])
+
+    def iterate(self, formula=None, page_size=PAGE_SIZE, **kwargs):
+        with self.api._lock:
+            snapshot = [self._snapshot(record_id) for record_id in self._matching_ids(formula)]
+        if not snapshot:
+            self.api.request(self.name, 'list')
+            return
+        for start in range(0, len(snapshot), page_size):
+            self.api.request(self.name, 'list')
+            yield snapshot[start:start + page_size]
+
+    def all(self, formula=None, **kwargs):
+        return [record for page in self.iterate(formula=formula, **kwargs) for record in page]
+
+    def first(self, formula=None, **kwargs):
+        for page in self.iterate(formula=formula, page_size=1, **kwargs):
+            return page[0] if page else None
+        return None
+
+    def get(self, record_id):
+        self.api.request(self.name, 'get')
+        with self.api._lock:
+            return self._snapshot(record_id)
+
+    def _create(self, fields):
+        record_id = self.api.new_record_id()
+        self.records[record_id] = {
+            "sequence": next(self.api._ids),
+            "createdTime": datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.000Z'),
+            "fields": _clean_fields(fields)
+        }
+        self.modified[record_id] = time.time()
+        self._index_add(record_id)
+        return self._snapshot(record_id)
+
+    def _update(self, record_id, fields):
+        self._index_remove(record_id)
+        merged = dict(self.records[record_id]['fields'])
+        merged.update(fields)
+        self.records[record_id]['fields'] = _clean_fields(merged)
+        self.modified[record_id] = time.time()
+        self._index_add(record_id)
+        return self._snapshot(record_id)
+
+    def _delete(self, record_id):
+        self._index_remove(record_id)
+        del self.records[record_id]
+        del self.modified[record_id]
+        return {"id": record_id, "deleted": True}
+
+    def create(self, fields):
+        self.api.request(self.name, 'create')
+        with self.api._lock:
+            return self._create(fields)
+
+    def update(self, record_id, fields):
+        self.api.request(self.name, 'update')
+        with self.api._lock:
+            return self._update(record_id, fields)
+
+    def delete(self, record_id):
+        self.api.request(self.name, 'delete')
+        with self.api._lock:
+            return self._delete(record_id)
+
+    # Batch calls are charged one request per 10 records, like pyairtable's own chunking
+
+    def batch_create(self, records):
+        results = []
+        for start in range(0, len(records), MAX_RECORDS_PER_BATCH):
+            self.api.request(self.name, 'batch_create')
+            with self.api._lock:
+                results.extend(self._create(fields) for fields in records[start:start + MAX_RECORDS_PER_BATCH])
+        return results
+
+    def batch_update(self, records):
+        results = []
+        for start in range(0, len(records), MAX_RECORDS_PER_BATCH):
+            self.api.request(self.name, 'batch_update')
+            with self.api._lock:
+                results.extend(
+                    self._update(record['id'], record['fields'])
+                    for record in records[start:start + MAX_RECORDS_PER_BATCH]
+                )
+        return results
+
+    def batch_delete(self, record_ids):
+        results = []
+        for start in range(0, len(record_ids), MAX_RECORDS_PER_BATCH):
+            self.api.request(self.name, 'batch_delete')
+            with self.api._lock:
+                results.extend(self._delete(record_id) for record_id in record_ids[start:start + MAX_RECORDS_PER_BATCH])
+        return results
+
+    def seed(self, records):
+        """Insert records directly, without counting API calls"""
+        with self.api._lock:
+            return [self._create(fields) for fields in records]
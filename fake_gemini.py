@@ -0,0 +1,135 @@
+import re
+import json
+import time
+import zlib
+import random
+import threading
+from types import SimpleNamespace
+
+_APPLICANT_ID = re.compile(r'"applicant_id":"([^"]+)"')
+
+class FakeResponse:
+    """Mimics the parts of a Gemini response this project reads"""
+
+    def __init__(self, text, prompt_tokens):
+        self.text = text
+        self.usage_metadata = SimpleNamespace(
+            prompt_token_count=prompt_tokens,
+            candidates_token_count=len(text) // 4 + 1,
+            total_token_count=prompt_tokens + len(text) // 4 + 1
+        )
+
+class FakeGenerationConfig:
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+# What a model adds when it ignores "without any additional text"
+TRAILING_TEXT = (
+    "\n\nNote: this assessment is based solely on the data provided. Verifying employment dates, "
+    "confirming the candidate's rate expectations and checking references would give a fuller picture "
+    "before making a decision. Let me know if you would like a more detailed breakdown of any section."
+)
+
+class FakeGenAI:
+    """Drop-in replacement for the google.generativeai module.
+
+    Produces deterministic evaluations after `latency` seconds, fails a
+    `failure_rate` fraction of calls, and counts calls and tokens. With
+    `token_latency`, generating each output token takes that long (streamed
+    responses deliver chunks as they are generated, only bill what was read
+    and count as `cancelled` when closed early); `trailing_rate` is the
+    fraction of single-profile responses that run on after the Follow-Ups
+    line.
+    """
+
+    def __init__(self, latency=0.0, failure_rate=0.0, seed=0, token_latency=0.0, trailing_rate=0.0):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.token_latency = token_latency
+        self.trailing_rate = trailing_rate
+        self.random = random.Random(seed)
+        self.calls = 0
+        self.failures = 0
+        self.prompt_tokens = 0
+        self.output_tokens = 0
+        self.cancelled = 0
+        self.types = SimpleNamespace(GenerationConfig=FakeGenerationConfig)
+        self._lock = threading.Lock()
+
+    def configure(self, **kwargs):
+        pass
+
+    def GenerativeModel(self, model_name):
+        return FakeModel(self, model_name)
+
+class FakeModel:
+    def __init__(self, backend, model_name):
+        self.backend = backend
+        self.model_name = model_name
+
+    @staticmethod
+    def _evaluation(key):
+        score = zlib.crc32(key.encode('utf-8')) % 10 + 1
+        return {
+            "summary": f"Synthetic evaluation for {key}: experienced engineer with a consistent work history.",
+            "score": score,
+            "issues": "None" if score > 5 else "Missing end date on most recent role",
+            "follow_ups": ["What is your notice period?", "Which stack do you prefer?", "Are you open to contract extensions?"]
+        }
+
+    def _render(self, prompt, generation_config):
+        if getattr(generation_config, 'response_mime_type', None) == 'application/json':
+            return json.dumps([
+                dict(self._evaluation(applicant_id), applicant_id=applicant_id)
+                for applicant_id in _APPLICANT_ID.findall(prompt)
+            ])
+        # The prompt ends with the format template, so key on a digest of the whole prompt
+        key = f"profile {zlib.crc32(prompt.encode('utf-8')):08x}"
+        evaluation = self._evaluation(key)
+        trailing = TRAILING_TEXT if zlib.crc32(key[::-1].encode('utf-8')) % 1000 < self.backend.trailing_rate * 1000 else ""
+        return (
+            f"Summary: {evaluation['summary']}\n"
+            f"Score: {evaluation['score']}\n"
+            f"Issues: {evaluation['issues']}\n"
+            f"Follow-Ups: " + " ".join(f"• {q}" for q in evaluation['follow_ups'])
+        ) + trailing
+
+    def generate_content(self, prompt, generation_config=None, stream=False, **kwargs):
+        backend = self.backend
+        if backend.latency:
+            time.sleep(backend.latency)
+        with backend._lock:
+            backend.calls += 1
+            failed = backend.random.random() < backend.failure_rate
+            if failed:
+                backend.failures += 1
+        if failed:
+            raise RuntimeError("503 The model is overloaded. Please try again later.")
+
+        response = FakeResponse(self._render(prompt, generation_config), len(prompt) // 4 + 1)
+        with backend._lock:
+            backend.prompt_tokens += response.usage_metadata.prompt_token_count
+        if not stream:
+            if backend.token_latency:
+                time.sleep(backend.token_latency * response.usage_metadata.candidates_token_count)
+            with backend._lock:
+                backend.output_tokens += response.usage_metadata.candidates_token_count
+            return response
+        return self._stream(response)
+
+    def _stream(self, response, chunk_size=40):
+        """Yield the response in chunks as they are generated; the last carries usage metadata"""
+        backend = self.backend
+        chunks = [response.text[i:i + chunk_size] for i in range(0, len(response.text), chunk_size)]
+        try:
+            for i, chunk in enumerate(chunks):
+                tokens = len(chunk) // 4 + 1
+                if backend.token_latency:
+                    time.sleep(backend.token_latency * tokens)
+                with backend._lock:
+                    backend.output_tokens += tokens
+                yield SimpleNamespace(text=chunk, usage_metadata=response.usage_metadata if i == len(chunks) - 1 else None)
+        except GeneratorExit:
+            with backend._lock:
+                backend.cancelled += 1
+            raise
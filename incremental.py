@@ -0,0 +1,318 @@
+import os
+import sys
+import json
+import time
+import sqlite3
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor
+from config import (AIRTABLE_BASE_ID, APPLICANTS_TABLE, PERSONAL_TABLE, EXPERIENCE_TABLE,
+                    SALARY_TABLE, SHORTLISTED_TABLE, GEMINI_CONCURRENCY, PIPELINE_STATE_DIR, LLM_EVALUATE)
+from clients import lazy_airtable_api
+import dedup
+from codec import CodecError, decode, encode
+from compress_json import prefetch_child_tables, prefetch_child_rows, get_applicant_data_from_index
+from shortlist_candidates import evaluate_applicant
+from utils import (applicant_key, applicant_id_formula, chunked, content_hash, index_by_applicant,
+                   modified_since_formula, validate_applicant_data)
+
+# Initialize Airtable API (always live: change detection needs Airtable's own modified times)
+api = lazy_airtable_api(mirrored=False)
+base_id = AIRTABLE_BASE_ID
+
+# Re-read a little before the last watermark to absorb clock skew; content hashes make the overlap harmless
+WATERMARK_OVERLAP = timedelta(minutes=5)
+STATE_COLUMNS = ['record_id', 'compressed_hash', 'shortlist_hash', 'llm_hash', 'llm_skipped_hash']
+
+class PipelineState:
+    """Per-applicant content hashes and the last-run watermark, stored in SQLite"""
+
+    def __init__(self, state_dir=PIPELINE_STATE_DIR):
+        os.makedirs(state_dir, exist_ok=True)
+        self.conn = sqlite3.connect(os.path.join(state_dir, 'pipeline_state.sqlite3'))
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS applicant_state (
+                applicant_id TEXT PRIMARY KEY,
+                record_id TEXT,
+                compressed_hash TEXT,
+                shortlist_hash TEXT,
+                llm_hash TEXT,
+                updated_at REAL,
+                llm_skipped_hash TEXT
+            );
+            CREATE TABLE IF NOT EXISTS watermarks (
+                name TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+        """)
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(applicant_state)")}
+        if 'llm_skipped_hash' not in columns:
+            # State files written before policy skips were recorded
+            self.conn.execute("ALTER TABLE applicant_state ADD COLUMN llm_skipped_hash TEXT")
+
+    def get_watermark(self, name='last_run'):
+        row = self.conn.execute("SELECT value FROM watermarks WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def set_watermark(self, value, name='last_run'):
+        self.conn.execute("INSERT OR REPLACE INTO watermarks VALUES (?, ?)", (name, value))
+        self.conn.commit()
+
+    def get(self, applicant_id):
+        """Return the stored hashes for an applicant (empty dict if never processed)"""
+        row = self.conn.execute(
+            f"SELECT {', '.join(STATE_COLUMNS)} FROM applicant_state WHERE applicant_id = ?", (applicant_id,)
+        ).fetchone()
+        if not row:
+            return {}
+        return dict(zip(STATE_COLUMNS, row))
+
+    def record_map(self):
+        """Map Applicants record IDs to Applicant IDs (resolves linked-record child fields)"""
+        return dict(self.conn.execute("SELECT record_id, applicant_id FROM applicant_state"))
+
+    def save(self, applicant_id, **fields):
+        current = self.get(applicant_id)
+        current.update(fields)
+        self.conn.execute(
+            f"INSERT OR REPLACE INTO applicant_state (applicant_id, {', '.join(STATE_COLUMNS)}, updated_at) "
+            f"VALUES ({', '.join('?' * (len(STATE_COLUMNS) + 2))})",
+            (applicant_id, *(current.get(column) for column in STATE_COLUMNS), time.time())
+        )
+
+    def stale_ids(self):
+        """Applicants whose later stages have not caught up with their compressed JSON (e.g. a failed LLM call)"""
+        return {row[0] for row in self.conn.execute(
+            "SELECT applicant_id FROM applicant_state "
+            "WHERE shortlist_hash IS NOT compressed_hash "
+            "OR (llm_hash IS NOT compressed_hash AND llm_skipped_hash IS NOT compressed_hash)"
+        )}
+
+    def use_llm_policy(self, policy):
+        """Forget applicants skipped under a different LLM_EVALUATE policy, so this one reconsiders them"""
+        if self.get_watermark('llm_evaluate') != policy:
+            self.conn.execute("UPDATE applicant_state SET llm_skipped_hash = NULL")
+            self.set_watermark(policy, 'llm_evaluate')
+
+    def commit(self):
+        self.conn.commit()
+
+    def reset(self):
+        self.conn.executescript("DELETE FROM applicant_state; DELETE FROM watermarks;")
+        self.conn.commit()
+
+def _load_stored_json(compressed_json_str):
+    try:
+        return decode(compressed_json_str)
+    except CodecError:
+        return None
+
+def find_changes(since, state):
+    """Return (applicant records by ID, IDs whose child rows changed, child row index)"""
+    applicants_table = api.table(base_id, APPLICANTS_TABLE)
+
+    if since is None:
+        # First run: everything counts as changed
+        applicants = applicants_table.all()
+        record_map = {a['id']: applicant_key(a['fields'].get('Applicant ID')) for a in applicants}
+        child_index = prefetch_child_tables(record_map)
+        by_id = {record_map[a['id']]: a for a in applicants if record_map[a['id']]}
+        return by_id, set(by_id), child_index
+
+    formula = modified_since_formula(since)
+    record_map = state.record_map()
+    by_id = {}
+    for applicant in applicants_table.all(formula=formula):
+        applicant_id = applicant_key(applicant['fields'].get('Applicant ID'))
+        if applicant_id:
+            by_id[applicant_id] = applicant
+            record_map[applicant['id']] = applicant_id
+
+    child_changed_ids = set()
+    for table_name in (PERSONAL_TABLE, EXPERIENCE_TABLE, SALARY_TABLE):
+        changed_rows = api.table(base_id, table_name).all(formula=formula)
+        child_changed_ids.update(index_by_applicant(changed_rows, record_map))
+
+    # Applicants whose children changed, or whose last run did not finish every stage
+    missing = sorted((child_changed_ids | state.stale_ids()) - set(by_id))
+    for chunk in chunked(missing, 50):
+        for applicant in applicants_table.all(formula=applicant_id_formula(chunk)):
+            by_id[applicant_key(applicant['fields'].get('Applicant ID'))] = applicant
+
+    # New applicants still need compressing even if their children predate the watermark
+    needs_children = child_changed_ids | {
+        applicant_id for applicant_id, applicant in by_id.items()
+        if not applicant['fields'].get('Compressed JSON')
+    }
+    child_index = prefetch_child_rows(needs_children, record_map) if needs_children else {
+        'personal': {}, 'experience': {}, 'salary': {}
+    }
+    return by_id, needs_children, child_index
+
+def existing_shortlisted_ids(applicant_ids):
+    """Return which of the given applicants already have a Shortlisted Leads row"""
+    found = set()
+    for chunk in chunked(sorted(applicant_ids), 50):
+        records = api.table(base_id, SHORTLISTED_TABLE).all(formula=applicant_id_formula(chunk, field='Applicant'))
+        found.update(index_by_applicant(records, field='Applicant'))
+    return found
+
+def run_incremental(full=False):
+    """Process only applicants whose inputs changed since the last run.
+
+    Each stage is re-run for an applicant only when the content hash of
+    its compressed JSON differs from the hash that stage last processed.
+    An applicant with no stored state whose profile is unchanged keeps its
+    existing Shortlist Status and LLM fields instead of being re-run.
+    """
+    state = PipelineState()
+    state.use_llm_policy(LLM_EVALUATE)
+    since = None if full else state.get_watermark()
+    run_started = datetime.now(timezone.utc)
+
+    print(f"Incremental run since {since or 'the beginning'}")
+    by_id, recompute_ids, child_index = find_changes(since, state)
+    print(f"{len(by_id)} applicants changed since last run")
+
+    updates = {}
+    profiles = {}
+    shortlist_ids = []
+    llm_ids = []
+
+    # Stage 1: compression
+    fresh = []
+    for applicant_id, applicant in by_id.items():
+        fields = applicant['fields']
+        stored_data = _load_stored_json(fields.get('Compressed JSON'))
+
+        if applicant_id in recompute_ids:
+            compressed_data = get_applicant_data_from_index(applicant_id, child_index)
+            if not validate_applicant_data(compressed_data):
+                print(f"Incomplete data for applicant {applicant_id}")
+                continue
+        elif stored_data is not None:
+            compressed_data = stored_data
+        else:
+            continue
+
+        digest = content_hash(compressed_data)
+        unchanged = stored_data is not None and content_hash(stored_data) == digest
+        if not unchanged:
+            updates.setdefault(applicant['id'], {})["Compressed JSON"] = encode(compressed_data)
+            fresh.append((applicant_id, compressed_data))
+
+        previous = state.get(applicant_id)
+        if not previous and unchanged:
+            # No state yet (e.g. the first incremental run on an existing base): results already
+            # stored against this exact profile count as done, so they are not paid for again
+            if fields.get('Shortlist Status'):
+                previous['shortlist_hash'] = digest
+            if fields.get('LLM Summary'):
+                previous['llm_hash'] = digest
+        state.save(applicant_id, record_id=applicant['id'], compressed_hash=digest,
+                   shortlist_hash=previous.get('shortlist_hash'), llm_hash=previous.get('llm_hash'))
+        profiles[applicant_id] = (applicant, compressed_data, digest)
+
+        if previous.get('shortlist_hash') != digest:
+            shortlist_ids.append(applicant_id)
+        # Left out by the LLM_EVALUATE policy at this Shortlist Status: it has no LLM fields by design
+        skipped_by_policy = previous.get('llm_skipped_hash') == digest and previous.get('shortlist_hash') == digest
+        if not skipped_by_policy and (previous.get('llm_hash') != digest or not fields.get('LLM Summary')):
+            llm_ids.append(applicant_id)
+
+    for applicant_id, fields in dedup.link_profiles(fresh).items():
+        updates[profiles[applicant_id][0]['id']].update(fields)
+    compressed_count = len(updates)
+
+    # Stage 2: shortlisting
+    new_leads = []
+    shortlisted = {}
+    for applicant_id in shortlist_ids:
+        applicant, compressed_data, digest = profiles[applicant_id]
+        should_shortlist, score_reason = evaluate_applicant(applicant_id, compressed_data)
+        status = "Shortlisted" if should_shortlist else "Rejected"
+        if applicant['fields'].get('Shortlist Status') != status:
+            updates.setdefault(applicant['id'], {})["Shortlist Status"] = status
+            applicant['fields']['Shortlist Status'] = status
+        if should_shortlist:
+            shortlisted[applicant_id] = score_reason
+        state.save(applicant_id, shortlist_hash=digest)
+
+    if shortlisted:
+        already = existing_shortlisted_ids(shortlisted)
+        for applicant_id, score_reason in shortlisted.items():
+            if applicant_id not in already:
+                applicant, compressed_data, _ = profiles[applicant_id]
+                new_leads.append({
+                    "Applicant": applicant_id,
+                    "Compressed JSON": encode(compressed_data),
+                    "Score Reason": score_reason,
+                    "Created At": datetime.now().isoformat()
+                })
+
+    # Stage 3: LLM evaluation (imported lazily; unchanged runs never load the Gemini SDK), filtered
+    # and ordered by the scheduler and charged to its budget like a full run
+    llm_count = 0
+    if llm_ids:
+        from llm_evaluation import evaluate_profile, llm_result_fields
+        from llm_scheduler import BudgetExhausted, EvaluationScheduler
+        # The same policy the state's skips were recorded under
+        scheduler = EvaluationScheduler(policy=LLM_EVALUATE)
+        applicant_ids = {profiles[applicant_id][0]['id']: applicant_id for applicant_id in llm_ids}
+        ordered = scheduler.order([profiles[applicant_id][0] for applicant_id in llm_ids],
+                                  lambda applicant: profiles[applicant_ids[applicant['id']]][1])
+        # Every profile loads, so whatever order() left out was excluded by the policy
+        admitted = {applicant['id'] for applicant, _ in ordered}
+        for record_id, applicant_id in applicant_ids.items():
+            if record_id not in admitted:
+                state.save(applicant_id, llm_skipped_hash=profiles[applicant_id][2])
+        over_budget = object()
+
+        def evaluate(item):
+            applicant, compressed_data = item
+            try:
+                return evaluate_profile(compressed_data, budget=scheduler.account(applicant))
+            except BudgetExhausted:
+                scheduler.left_by_budget(applicant)
+                return over_budget
+
+        with ThreadPoolExecutor(max_workers=max(1, GEMINI_CONCURRENCY)) as executor:
+            for (applicant, _), parsed in zip(ordered, executor.map(evaluate, ordered)):
+                applicant_id = applicant_ids[applicant['id']]
+                if parsed is over_budget:
+                    continue
+                if not parsed:
+                    print(f"Failed to get LLM response for applicant {applicant_id}")
+                    continue
+                _, _, digest = profiles[applicant_id]
+                updates.setdefault(applicant['id'], {}).update(llm_result_fields(parsed))
+                state.save(applicant_id, llm_hash=digest)
+                scheduler.evaluated(applicant)
+                llm_count += 1
+        scheduler.print_report()
+
+    # Write back every stage's changes together
+    applicants_table = api.table(base_id, APPLICANTS_TABLE)
+    for chunk in chunked([{"id": record_id, "fields": fields} for record_id, fields in updates.items()]):
+        applicants_table.batch_update(chunk)
+    for chunk in chunked(new_leads):
+        api.table(base_id, SHORTLISTED_TABLE).batch_create(chunk)
+
+    state.commit()
+    state.set_watermark((run_started - WATERMARK_OVERLAP).strftime('%Y-%m-%dT%H:%M:%S.000Z'))
+
+    print(f"Compressed: {compressed_count} | Shortlist re-evaluated: {len(shortlist_ids)} "
+          f"(new leads: {len(new_leads)}) | LLM evaluated: {llm_count}")
+    return {
+        "changed": len(by_id),
+        "compressed": compressed_count,
+        "shortlist_evaluated": len(shortlist_ids),
+        "new_leads": len(new_leads),
+        "llm_evaluated": llm_count
+    }
+
+if __name__ == "__main__":
+    if "--reset" in sys.argv:
+        PipelineState().reset()
+        print("Incremental state cleared; the next run will process every applicant")
+    else:
+        run_incremental(full="--full" in sys.argv)
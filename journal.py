@@ -0,0 +1,289 @@
+"""Durable per-stage journal for resumable batch runs.
+
+Each batch stage (compress, decompress, shortlist, llm) records the outcome
+of every applicant it finishes, and logs each Airtable write before sending
+it. Logged writes are removed, and their applicants marked done, once the
+request succeeds, so after a crash the journal holds at most the batch that
+was in flight. Gemini results are logged the moment they arrive, before
+they wait for a batch write.
+
+With resume=True a stage first replays its pending updates (safe to send
+twice) and then skips applicants already done. Pending creates and deletes
+are dropped instead and their applicants redone: those stages diff against
+what is already in Airtable, so nothing is created twice. Without resume a
+stage starts a fresh journal.
+
+    python journal.py status    # per-stage progress and pending writes
+    python journal.py clear
+"""
+import os
+import sys
+import json
+import time
+import sqlite3
+import threading
+import itertools
+from collections import Counter
+from config import BATCH_SIZE, JOURNAL_ENABLED, PIPELINE_STATE_DIR
+from utils import chunked
+
+# Outcomes that count as finished work on resume (applicants that failed are left out so they are retried)
+DONE = 'done'
+UNCHANGED = 'unchanged'
+SKIPPED = 'skipped'
+
+# Pending writes of these kinds are replayed on resume; others are redone by the stage
+REPLAYABLE_OPERATIONS = {'batch_update'}
+
+class Journal:
+    """SQLite-backed journal of applicant outcomes and write-ahead Airtable writes"""
+
+    def __init__(self, journal_dir=PIPELINE_STATE_DIR, filename='journal.sqlite3'):
+        self.path = os.path.join(journal_dir, filename)
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        # Opened lazily so importing the module never touches the disk
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            # WAL + NORMAL: every commit survives a crash or kill of this process
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS runs (
+                    stage TEXT PRIMARY KEY,
+                    started_at REAL NOT NULL,
+                    finished_at REAL
+                );
+                CREATE TABLE IF NOT EXISTS outcomes (
+                    stage TEXT NOT NULL,
+                    applicant_id TEXT NOT NULL,
+                    outcome TEXT NOT NULL,
+                    updated_at REAL NOT NULL,
+                    PRIMARY KEY (stage, applicant_id)
+                );
+                CREATE TABLE IF NOT EXISTS pending_writes (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    stage TEXT NOT NULL,
+                    table_name TEXT NOT NULL,
+                    operation TEXT NOT NULL,
+                    record TEXT NOT NULL,
+                    applicant_id TEXT
+                );
+                CREATE INDEX IF NOT EXISTS idx_pending_stage ON pending_writes (stage, id);
+            """)
+        return self._conn
+
+    def start(self, stage):
+        """Begin a fresh run of a stage, returning the number of pending writes discarded"""
+        with self._lock:
+            conn = self._connect()
+            discarded = conn.execute("SELECT COUNT(*) FROM pending_writes WHERE stage = ?", (stage,)).fetchone()[0]
+            conn.execute("DELETE FROM outcomes WHERE stage = ?", (stage,))
+            conn.execute("DELETE FROM pending_writes WHERE stage = ?", (stage,))
+            conn.execute("INSERT OR REPLACE INTO runs VALUES (?, ?, NULL)", (stage, time.time()))
+            conn.commit()
+            return discarded
+
+    def resume(self, stage):
+        """Continue a stage's run (starting one if it never ran), returning the applicants already done"""
+        with self._lock:
+            conn = self._connect()
+            conn.execute("INSERT OR IGNORE INTO runs VALUES (?, ?, NULL)", (stage, time.time()))
+            conn.execute("UPDATE runs SET finished_at = NULL WHERE stage = ?", (stage,))
+            conn.commit()
+            return {row[0] for row in conn.execute("SELECT applicant_id FROM outcomes WHERE stage = ?", (stage,))}
+
+    def finish(self, stage):
+        with self._lock:
+            self._connect().execute("UPDATE runs SET finished_at = ? WHERE stage = ?", (time.time(), stage))
+            self._conn.commit()
+
+    def record(self, stage, applicant_ids, outcome=DONE):
+        """Record the outcome of finished applicants"""
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.executemany("INSERT OR REPLACE INTO outcomes VALUES (?, ?, ?, ?)",
+                             [(stage, applicant_id, outcome, now) for applicant_id in applicant_ids])
+            conn.commit()
+
+    def log_writes(self, stage, table_name, operation, records, owners):
+        """Log writes before they are sent, returning their journal IDs"""
+        with self._lock:
+            conn = self._connect()
+            ids = []
+            for record, owner in zip(records, owners):
+                cursor = conn.execute(
+                    "INSERT INTO pending_writes (stage, table_name, operation, record, applicant_id) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (stage, table_name, operation, json.dumps(record, separators=(',', ':')), owner)
+                )
+                ids.append(cursor.lastrowid)
+            conn.commit()
+            return ids
+
+    def complete_writes(self, stage, write_ids, done_ids=(), outcome=DONE):
+        """Drop sent writes and mark applicants done, in one transaction"""
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.executemany("DELETE FROM pending_writes WHERE id = ?", [(write_id,) for write_id in write_ids])
+            conn.executemany("INSERT OR REPLACE INTO outcomes VALUES (?, ?, ?, ?)",
+                             [(stage, applicant_id, outcome, now) for applicant_id in done_ids])
+            conn.commit()
+
+    def pending(self, stage):
+        """Writes logged but not confirmed, oldest first, as (id, table_name, operation, record, applicant_id)"""
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT id, table_name, operation, record, applicant_id FROM pending_writes WHERE stage = ? ORDER BY id",
+                (stage,)
+            ).fetchall()
+        return [(write_id, table_name, operation, json.loads(record), owner)
+                for write_id, table_name, operation, record, owner in rows]
+
+    def status(self):
+        """Per-stage run times, outcome counts and pending writes"""
+        with self._lock:
+            conn = self._connect()
+            status = {stage: {"started_at": started, "finished_at": finished, "outcomes": {}, "pending_writes": 0}
+                      for stage, started, finished in conn.execute("SELECT stage, started_at, finished_at FROM runs")}
+            for stage, outcome, count in conn.execute(
+                    "SELECT stage, outcome, COUNT(*) FROM outcomes GROUP BY stage, outcome"):
+                status.setdefault(stage, {"outcomes": {}, "pending_writes": 0})["outcomes"][outcome] = count
+            for stage, count in conn.execute("SELECT stage, COUNT(*) FROM pending_writes GROUP BY stage"):
+                status.setdefault(stage, {"outcomes": {}, "pending_writes": 0})["pending_writes"] = count
+        return status
+
+    def clear(self):
+        with self._lock:
+            self._connect().executescript("DELETE FROM runs; DELETE FROM outcomes; DELETE FROM pending_writes;")
+            self._conn.commit()
+
+class StageRun:
+    """One run of a stage: decides what to skip and journals every write it sends.
+
+    An applicant is marked done once every record logged for it has been
+    written; applicants with nothing to write are marked with mark().
+    """
+
+    def __init__(self, journal, stage, resume=False, api=None, base_id=None):
+        self.journal = journal
+        self.stage = stage
+        self.completed = set()
+        self.outstanding = Counter()
+        self.lock = threading.Lock()
+        if journal is None:
+            if resume:
+                print(f"Journal disabled (JOURNAL_ENABLED=0); {stage} starts from scratch")
+            return
+        if resume:
+            replayed = self._replay(api, base_id)
+            self.completed = journal.resume(stage)
+            print(f"Resuming {stage}: {len(self.completed)} applicants already done, {replayed} writes replayed")
+        else:
+            discarded = journal.start(stage)
+            if discarded:
+                print(f"Discarded {discarded} unsent {stage} writes from an interrupted run (use --resume to keep them)")
+
+    def _replay(self, api, base_id):
+        """Resend pending updates; drop other pending writes so the stage recomputes them"""
+        pending = self.journal.pending(self.stage)
+        dropped = {(write_id, owner) for write_id, _, operation, _, owner in pending
+                   if operation not in REPLAYABLE_OPERATIONS}
+        redo = {owner for _, owner in dropped}
+        if dropped:
+            self.journal.complete_writes(self.stage, [write_id for write_id, _ in dropped])
+
+        by_table = {}
+        for write_id, table_name, operation, record, owner in pending:
+            if operation in REPLAYABLE_OPERATIONS:
+                by_table.setdefault(table_name, []).append((write_id, record, owner))
+        replayed = 0
+        for table_name, entries in by_table.items():
+            for chunk in chunked(entries, BATCH_SIZE):
+                api.table(base_id, table_name).batch_update([record for _, record, _ in chunk])
+                done = {owner for _, _, owner in chunk if owner is not None} - redo
+                self.journal.complete_writes(self.stage, [write_id for write_id, _, _ in chunk], done)
+                replayed += len(chunk)
+        return replayed
+
+    def skip(self, applicant_id):
+        """True when a resumed run already finished this applicant"""
+        return applicant_id in self.completed
+
+    def mark(self, applicant_ids, outcome=DONE):
+        """Record applicants that needed no writes (or could not be processed)"""
+        if self.journal is not None and applicant_ids:
+            self.journal.record(self.stage, applicant_ids, outcome)
+
+    def log(self, table_name, operation, records, owners):
+        """Log writes ahead of sending them; returns entries for send() / written()"""
+        with self.lock:
+            self.outstanding.update(owner for owner in owners if owner is not None)
+        if self.journal is None:
+            write_ids = [None] * len(records)
+        else:
+            write_ids = self.journal.log_writes(self.stage, table_name, operation, records, owners)
+        return [(write_id, table_name, operation, record, owner)
+                for write_id, record, owner in zip(write_ids, records, owners)]
+
+    def written(self, entries):
+        """Confirm sent entries, marking owners with nothing left outstanding as done"""
+        done = []
+        with self.lock:
+            for _, _, _, _, owner in entries:
+                if owner is None:
+                    continue
+                self.outstanding[owner] -= 1
+                if self.outstanding[owner] <= 0:
+                    del self.outstanding[owner]
+                    done.append(owner)
+        if self.journal is not None:
+            self.journal.complete_writes(self.stage, [entry[0] for entry in entries], done)
+
+    def send(self, api, base_id, entries):
+        """Send logged entries in batches of 10, confirming each batch as it succeeds; returns calls made"""
+        calls = 0
+        for (table_name, operation), group in itertools.groupby(entries, key=lambda entry: entry[1:3]):
+            table = api.table(base_id, table_name)
+            for chunk in chunked(list(group), BATCH_SIZE):
+                getattr(table, operation)([entry[3] for entry in chunk])
+                self.written(chunk)
+                calls += 1
+        return calls
+
+    def write(self, api, base_id, table_name, operation, records, owners):
+        """Log then send one table's writes"""
+        return self.send(api, base_id, self.log(table_name, operation, records, owners))
+
+    def finish(self):
+        if self.journal is not None:
+            self.journal.finish(self.stage)
+
+# Shared by every stage in the process; None when JOURNAL_ENABLED is off
+default_journal = Journal() if JOURNAL_ENABLED else None
+
+def stage_run(stage, resume=False, api=None, base_id=None):
+    """Start (or with resume=True, continue) a journaled run of a stage"""
+    return StageRun(default_journal, stage, resume, api, base_id)
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else 'status'
+    journal = Journal()
+    if command == 'status':
+        status = journal.status()
+        if not status:
+            print("Journal is empty")
+        for stage, info in sorted(status.items()):
+            state = 'finished' if info.get('finished_at') else 'interrupted or running'
+            outcomes = ", ".join(f"{count} {outcome}" for outcome, count in sorted(info['outcomes'].items())) or "none"
+            print(f"{stage}: {state} | applicants: {outcomes} | pending writes: {info['pending_writes']}")
+    elif command == 'clear':
+        journal.clear()
+        print("Journal cleared")
+    else:
+        print("Usage: python journal.py [status | clear]")
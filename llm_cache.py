@@ -0,0 +1,156 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from config import LLM_CACHE_DIR, LLM_CACHE_MAX_ENTRIES, LLM_CACHE_TTL_DAYS
+
+class EvaluationCache:
+    """On-disk SQLite cache of Gemini evaluations keyed by profile content.
+
+    The key is a hash of the canonicalised compressed JSON together with
+    the prompt version and model name, so identical profiles share one
+    evaluation and a prompt change never serves stale results. The raw
+    response is the text Gemini returned for the profile: the whole reply
+    to a single evaluation, or the applicant's object from a batched JSON
+    array.
+    """
+    
+    def __init__(self, cache_dir=LLM_CACHE_DIR, max_entries=LLM_CACHE_MAX_ENTRIES, ttl_days=LLM_CACHE_TTL_DAYS):
+        self.path = os.path.join(cache_dir, 'llm_cache.sqlite3')
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_days * 86400 if ttl_days else None
+        self.hits = 0
+        self.misses = 0
+        self._puts = 0
+        self._conn = None
+        self._lock = threading.Lock()
+    
+    def _connect(self):
+        # Opened lazily so importing the module never touches the disk
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS evaluations (
+                    key TEXT PRIMARY KEY,
+                    prompt_version TEXT NOT NULL,
+                    model TEXT NOT NULL,
+                    raw_response TEXT NOT NULL,
+                    parsed TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_access ON evaluations (last_access)")
+            self._conn.commit()
+        return self._conn
+    
+    @staticmethod
+    def make_key(compressed_json, prompt_version, model):
+        """Hash the canonicalised profile plus prompt version and model name"""
+        canonical = json.dumps(compressed_json, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+        digest = hashlib.sha256()
+        digest.update(f"{prompt_version}\0{model}\0".encode('utf-8'))
+        digest.update(canonical.encode('utf-8'))
+        return digest.hexdigest()
+    
+    def get(self, key):
+        """Return (raw_response, parsed_tuple) for a key, or None on a miss"""
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute(
+                "SELECT raw_response, parsed, created_at FROM evaluations WHERE key = ?", (key,)
+            ).fetchone()
+            now = time.time()
+            if row is None or (self.ttl_seconds and now - row[2] > self.ttl_seconds):
+                self.misses += 1
+                return None
+            conn.execute("UPDATE evaluations SET last_access = ? WHERE key = ?", (now, key))
+            conn.commit()
+            self.hits += 1
+            return row[0], tuple(json.loads(row[1]))
+    
+    def put(self, key, raw_response, parsed, prompt_version, model):
+        """Store a raw response and its parsed tuple"""
+        with self._lock:
+            conn = self._connect()
+            now = time.time()
+            conn.execute(
+                "INSERT OR REPLACE INTO evaluations VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, prompt_version, model, raw_response, json.dumps(list(parsed)), now, now)
+            )
+            conn.commit()
+            self._puts += 1
+            if self._puts % 100 == 0:
+                self._evict(conn)
+    
+    def _evict(self, conn):
+        removed = 0
+        if self.ttl_seconds:
+            removed += conn.execute(
+                "DELETE FROM evaluations WHERE created_at < ?", (time.time() - self.ttl_seconds,)
+            ).rowcount
+        if self.max_entries:
+            # Least recently used entries go first once the cache is over size
+            removed += conn.execute("""
+                DELETE FROM evaluations WHERE key IN (
+                    SELECT key FROM evaluations ORDER BY last_access DESC LIMIT -1 OFFSET ?
+                )
+            """, (self.max_entries,)).rowcount
+        conn.commit()
+        return removed
+    
+    def evict(self):
+        """Apply TTL and size limits, returning the number of entries removed"""
+        with self._lock:
+            return self._evict(self._connect())
+    
+    def invalidate(self, keep_prompt_version=None, keep_model=None):
+        """Delete cached evaluations, keeping only those for the given prompt version/model"""
+        with self._lock:
+            conn = self._connect()
+            if keep_prompt_version is None:
+                removed = conn.execute("DELETE FROM evaluations").rowcount
+            else:
+                removed = conn.execute(
+                    "DELETE FROM evaluations WHERE prompt_version != ? OR model != ?",
+                    (keep_prompt_version, keep_model)
+                ).rowcount
+            conn.commit()
+            return removed
+    
+    def stats(self):
+        """Return entry count and hit/miss counters for this process"""
+        with self._lock:
+            entries = self._connect().execute("SELECT COUNT(*) FROM evaluations").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "entries": entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "stats"
+    cache = EvaluationCache()
+    
+    if command == "stats":
+        print(json.dumps(cache.stats(), indent=2))
+    elif command == "invalidate":
+        # Run after editing the prompt in call_gemini_api and bumping PROMPT_VERSION
+        from llm_evaluation import PROMPT_VERSION
+        from config import GEMINI_MODEL
+        removed = cache.invalidate(PROMPT_VERSION, GEMINI_MODEL)
+        print(f"Removed {removed} cached evaluations from older prompt versions or models")
+    elif command == "clear":
+        removed = cache.invalidate()
+        print(f"Removed {removed} cached evaluations")
+    elif command == "prune":
+        removed = cache.evict()
+        print(f"Evicted {removed} expired or excess cached evaluations")
+    else:
+        print("Usage: python llm_cache.py [stats|invalidate|clear|prune]")
@@ -1,31 +1,60 @@
 import os
+import re
+import sys
 import json
 import time
-import google.generativeai as genai
-from pyairtable import Api
-from config import AIRTABLE_ACCESS_TOKEN, AIRTABLE_BASE_ID, APPLICANTS_TABLE, GEMINI_API_KEY
+import random
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from config import (AIRTABLE_BASE_ID, APPLICANTS_TABLE, BATCH_SIZE, GEMINI_MODEL,
+                    GEMINI_CONCURRENCY, GEMINI_REQUESTS_PER_MINUTE, GEMINI_TOKENS_PER_MINUTE, LLM_WRITE_MODE,
+                    LLM_CACHE_ENABLED, LLM_BATCH_SIZE, LLM_BATCH_TOKEN_BUDGET, LLM_STREAMING)
+from clients import genai, gemini_model, lazy_airtable_api
+from codec import CodecError, decode
+import dedup
+from journal import stage_run
+from llm_cache import EvaluationCache
+from llm_scheduler import BudgetExhausted, EvaluationScheduler
+from metrics import metrics, TOKEN_BUCKETS
+from rate_limiter import GeminiRateLimiter
+from utils import applicant_key
 
-# Initialize Airtable API
-api = Api(AIRTABLE_ACCESS_TOKEN)
+# Initialize Airtable API (served from the local mirror when USE_LOCAL_MIRROR is set)
+api = lazy_airtable_api()
 base_id = AIRTABLE_BASE_ID
 
-# Configure Gemini
-genai.configure(api_key=GEMINI_API_KEY)
+# Longest text wanted in each field; the prompt asks for these and parse_llm_response enforces them
+FIELD_LIMITS = {'summary': 500, 'issues': 200, 'follow_ups': 500}
+MAX_OUTPUT_TOKENS = 500
+# Streamed calls stop once every field is parsed, so their cap only bounds a reply that runs on:
+# about four characters per token of FIELD_LIMITS, plus the field labels and score
+STREAM_MAX_OUTPUT_TOKENS = sum(FIELD_LIMITS.values()) // 4 + 30
+# Output budget per applicant in a batched request (JSON keys add some overhead)
+BATCH_OUTPUT_TOKENS_PER_APPLICANT = 350
+# A streamed Follow-Ups field is complete once its line ends with this many questions
+FOLLOW_UP_COUNT = 3
 
-def call_gemini_api(compressed_json):
-    """Call Gemini API to evaluate applicant"""
-    try:
-        model = genai.GenerativeModel('models/gemini-2.5-flash-lite')
-        
-        prompt = f"""
+# Bump whenever build_prompt or build_batch_prompt changes, then run `python llm_cache.py invalidate`
+PROMPT_VERSION = "3"
+
+# Shared across worker threads so the whole pool stays under the Gemini quota
+rate_limiter = GeminiRateLimiter(GEMINI_REQUESTS_PER_MINUTE, GEMINI_TOKENS_PER_MINUTE)
+evaluation_cache = EvaluationCache() if LLM_CACHE_ENABLED else None
+
+def compact_json(data):
+    """Serialize JSON without whitespace to save prompt tokens"""
+    return json.dumps(data, separators=(',', ':'), ensure_ascii=False)
+
+def build_prompt(compressed_json):
+    """Build the evaluation prompt for an applicant profile"""
+    return f"""
         You are a recruiting analyst. Given this JSON applicant profile, do four things:
-        1. Provide a concise 75-word summary.
+        1. Provide a concise 75-word summary (at most {FIELD_LIMITS['summary']} characters).
         2. Rate overall candidate quality from 1-10 (higher is better).
-        3. List any data gaps or inconsistencies you notice.
-        4. Suggest up to three follow-up questions to clarify gaps.
+        3. List any data gaps or inconsistencies you notice (at most {FIELD_LIMITS['issues']} characters).
+        4. Suggest up to three follow-up questions to clarify gaps (at most {FIELD_LIMITS['follow_ups']} characters).
         
         Applicant Data:
-        {json.dumps(compressed_json, indent=2)}
+        {compact_json(compressed_json)}
         
         Return exactly in this format without any additional text or markdown:
         Summary: <text>
@@ -33,62 +62,391 @@ def call_gemini_api(compressed_json):
         Issues: <comma-separated list or 'None'>
         Follow-Ups: • <question 1> • <question 2> • <question 3>
         """
-        
-        response = model.generate_content(
+
+def output_token_cap():
+    """The max_output_tokens single evaluations are requested with"""
+    return STREAM_MAX_OUTPUT_TOKENS if LLM_STREAMING else MAX_OUTPUT_TOKENS
+
+def estimate_tokens(text):
+    """Rough token estimate (about four characters per token)"""
+    return len(text) // 4 + 1
+
+def record_gemini_call(mode, seconds, prompt, response=None, error=None):
+    """Record latency, token usage and errors for one Gemini request"""
+    metrics.observe('gemini_latency_seconds', seconds, mode=mode)
+    if error is not None:
+        metrics.increment('gemini_errors_total', mode=mode, error=type(error).__name__)
+        return
+    metrics.increment('gemini_requests_total', mode=mode)
+    # Prefer the usage the API reports; fall back to the local estimate
+    usage = getattr(response, 'usage_metadata', None)
+    prompt_tokens = getattr(usage, 'prompt_token_count', None) or estimate_tokens(prompt)
+    output_tokens = getattr(usage, 'candidates_token_count', None) or estimate_tokens(response.text or '')
+    metrics.observe('gemini_prompt_tokens', prompt_tokens, buckets=TOKEN_BUCKETS, mode=mode)
+    metrics.observe('gemini_output_tokens', output_tokens, buckets=TOKEN_BUCKETS, mode=mode)
+
+def call_gemini_api(compressed_json):
+    """Call Gemini API to evaluate applicant"""
+    if LLM_STREAMING:
+        return call_gemini_stream(compressed_json)
+    prompt = build_prompt(compressed_json)
+    started = time.perf_counter()
+    try:
+        response = gemini_model().generate_content(
             prompt,
-            generation_config=genai.types.GenerationConfig(
-                max_output_tokens=500,
+            generation_config=genai().types.GenerationConfig(
+                max_output_tokens=MAX_OUTPUT_TOKENS,
                 temperature=0.3
             )
         )
+        record_gemini_call('single', time.perf_counter() - started, prompt, response)
         return response.text
     except Exception as e:
+        record_gemini_call('single', time.perf_counter() - started, prompt, error=e)
         print(f"Gemini API call failed: {e}")
         return None
 
+_FIELD_HEADER = re.compile(r'(Summary|Score|Issues|Follow-Ups):')
+_FIELD_NAMES = {'Summary': 'summary', 'Score': 'score', 'Issues': 'issues', 'Follow-Ups': 'follow_ups'}
+RESPONSE_FIELDS = ('summary', 'score', 'issues', 'follow_ups')
+
+class ResponseParser:
+    """Incremental parser for the Summary / Score / Issues / Follow-Ups response format.
+
+    feed() takes text as it arrives and returns the fields it completed: a
+    field is complete when the next one starts, Score when its line ends and
+    Follow-Ups when its line ends holding FOLLOW_UP_COUNT questions (or at
+    close()). Lines after the last field are ignored. Each line is examined
+    once, so parsing is linear in the response length.
+    """
+
+    def __init__(self, on_field=None):
+        self.on_field = on_field
+        self.parts = {}
+        self.completed = []
+        self.current = None
+        self.lines = []
+        self._partial = []
+
+    @property
+    def done(self):
+        return len(self.completed) == len(RESPONSE_FIELDS)
+
+    def _complete(self, field):
+        if field is not None and field not in self.completed:
+            self.completed.append(field)
+            if self.on_field:
+                self.on_field(field, self.value(field))
+
+    def _line(self, raw_line):
+        if self.done:
+            return
+        self.lines.append(raw_line)
+        line = raw_line.strip()
+        match = _FIELD_HEADER.match(line)
+        if match:
+            self._complete(self.current)
+            self.current = _FIELD_NAMES[match.group(1)]
+            self.parts[self.current] = [line[match.end():].strip()]
+            if self.current == 'score':
+                self._complete('score')
+        elif line and self.current in ('summary', 'issues', 'follow_ups'):
+            self.parts[self.current].append(line)
+
+    def feed(self, text):
+        """Consume the next chunk of response text, returning the fields it completed"""
+        already = len(self.completed)
+        pieces = text.split('\n')
+        # Only whole lines are parsed; the tail waits for the next chunk
+        for piece in pieces[:-1]:
+            self._partial.append(piece)
+            self._line(''.join(self._partial))
+            self._partial = []
+            if self.current == 'follow_ups' and self.value('follow_ups').count('•') >= FOLLOW_UP_COUNT:
+                self._complete('follow_ups')
+        self._partial.append(pieces[-1])
+        return self.completed[already:]
+
+    def close(self):
+        """End of response: parse the last line and complete the open field"""
+        already = len(self.completed)
+        if self._partial:
+            self._line(''.join(self._partial))
+            self._partial = []
+        self._complete(self.current)
+        return self.completed[already:]
+
+    def value(self, field):
+        parts = self.parts.get(field)
+        if field == 'score':
+            try:
+                return int(parts[0]) if parts else 0
+            except ValueError:
+                return 0
+        text = " ".join(parts) if parts else ""
+        if field == 'summary':
+            return text
+        return text if text and text != "None" else "None"
+
+    def result(self):
+        """(summary, score, issues, follow_ups) with the same defaults as parse_llm_response"""
+        return tuple(self.value(field) for field in RESPONSE_FIELDS)
+
+    def text(self):
+        """The response as consumed, up to the end of the last parsed line"""
+        return '\n'.join(self.lines)
+
 def parse_llm_response(response_text):
     """Parse the LLM response into structured data"""
-    summary = ""
-    score = 0
-    issues = "None"
-    follow_ups = "None"
+    parser = ResponseParser()
+    if response_text:
+        parser.feed(response_text)
+        parser.close()
+    summary, score, issues, follow_ups = parser.result()
+    return (summary[:FIELD_LIMITS['summary']], score, issues[:FIELD_LIMITS['issues']],
+            follow_ups[:FIELD_LIMITS['follow_ups']])
+
+class _StreamedResponse:
+    """What record_gemini_call needs from a streamed response"""
+
+    def __init__(self, text, usage_metadata):
+        self.text = text
+        self.usage_metadata = usage_metadata
+
+def _cancel_stream(stream):
+    """Cancel the call behind a streamed response so the model stops generating (and billing)"""
+    # The SDK response wraps the transport's stream (gRPC or REST), which is what can be cancelled
+    source = getattr(stream, '_iterator', stream)
+    for name in ('cancel', 'close'):
+        method = getattr(source, name, None)
+        if callable(method):
+            try:
+                method()
+            except Exception as e:
+                print(f"Could not cancel Gemini stream: {e}")
+            return
+
+def call_gemini_stream(compressed_json):
+    """Evaluate an applicant with streamed generation, stopping as soon as every field is parsed"""
+    prompt = build_prompt(compressed_json)
+    started = time.perf_counter()
+    parser = ResponseParser(
+        on_field=lambda field, value: metrics.observe('gemini_stream_field_seconds', time.perf_counter() - started,
+                                                      field=field)
+    )
+    usage = None
+    stream = None
+    try:
+        stream = gemini_model().generate_content(
+            prompt,
+            generation_config=genai().types.GenerationConfig(
+                max_output_tokens=STREAM_MAX_OUTPUT_TOKENS,
+                temperature=0.3
+            ),
+            stream=True
+        )
+        for chunk in stream:
+            usage = getattr(chunk, 'usage_metadata', None) or usage
+            parser.feed(chunk.text or '')
+            if parser.done:
+                # Everything needed is here; stop reading instead of paying for trailing text
+                metrics.increment('gemini_stream_early_stops_total')
+                break
+        parser.close()
+        # Usage is only reported on the last chunk, so an early stop falls back to the local estimate
+        record_gemini_call('stream', time.perf_counter() - started, prompt, _StreamedResponse(parser.text(), usage))
+        return parser.text()
+    except Exception as e:
+        record_gemini_call('stream', time.perf_counter() - started, prompt, error=e)
+        print(f"Gemini API call failed: {e}")
+        return None
+    finally:
+        if stream is not None:
+            # Does nothing once a stream has ended; after an early stop it ends the call
+            _cancel_stream(stream)
+
+def build_batch_prompt(profiles):
+    """Build one prompt evaluating several (applicant_id, compressed_json) profiles"""
+    applicant_lines = "\n".join(
+        compact_json({"applicant_id": str(applicant_id), "profile": compressed_json})
+        for applicant_id, compressed_json in profiles
+    )
+    return f"""
+        You are a recruiting analyst. For EACH applicant profile below (one JSON object per line), do four things:
+        1. Provide a concise 75-word summary (at most {FIELD_LIMITS['summary']} characters).
+        2. Rate overall candidate quality from 1-10 (higher is better).
+        3. List any data gaps or inconsistencies you notice (at most {FIELD_LIMITS['issues']} characters).
+        4. Suggest up to three follow-up questions to clarify gaps (at most {FIELD_LIMITS['follow_ups']} characters).
+        
+        Applicants:
+        {applicant_lines}
+        
+        Return only a JSON array with one object per applicant, in this shape:
+        [{{"applicant_id": "<id>", "summary": "<text>", "score": <integer 1-10>, "issues": "<comma-separated list or None>", "follow_ups": ["<question>", ...]}}]
+        """
+
+def pack_batches(items, batch_size=LLM_BATCH_SIZE, token_budget=LLM_BATCH_TOKEN_BUDGET):
+    """Group (applicant_id, compressed_json, payload) items into batches capped by count and input tokens"""
+    batches = []
+    current = []
+    current_tokens = 0
+    for item in items:
+        item_tokens = estimate_tokens(compact_json(item[1]))
+        if current and (len(current) >= batch_size or current_tokens + item_tokens > token_budget):
+            batches.append(current)
+            current = []
+            current_tokens = 0
+        current.append(item)
+        current_tokens += item_tokens
+    if current:
+        batches.append(current)
+    return batches
+
+def call_gemini_batch(profiles):
+    """Call Gemini once for several applicants, requesting structured JSON output"""
+    prompt = build_batch_prompt(profiles)
+    started = time.perf_counter()
+    try:
+        response = gemini_model().generate_content(
+            prompt,
+            generation_config=genai().types.GenerationConfig(
+                max_output_tokens=BATCH_OUTPUT_TOKENS_PER_APPLICANT * len(profiles),
+                temperature=0.3,
+                response_mime_type="application/json"
+            )
+        )
+        record_gemini_call('batch', time.perf_counter() - started, prompt, response)
+        return response.text
+    except Exception as e:
+        record_gemini_call('batch', time.perf_counter() - started, prompt, error=e)
+        print(f"Gemini batch API call failed: {e}")
+        return None
+
+def validate_batch_item(item):
+    """Check one batch result against the expected schema, returning the parsed tuple or None"""
+    if not isinstance(item, dict):
+        return None
+    summary = item.get('summary')
+    score = item.get('score')
+    issues = item.get('issues', 'None')
+    follow_ups = item.get('follow_ups', [])
     
+    if not isinstance(summary, str) or not summary.strip():
+        return None
+    if isinstance(score, bool) or not isinstance(score, (int, float)) or not 1 <= score <= 10:
+        return None
+    if isinstance(issues, list):
+        issues = ", ".join(str(issue) for issue in issues)
+    if not isinstance(issues, str):
+        return None
+    if isinstance(follow_ups, str):
+        follow_ups = [follow_ups] if follow_ups.strip() else []
+    if not isinstance(follow_ups, list) or not all(isinstance(q, str) for q in follow_ups):
+        return None
+    
+    issues = issues.strip() or "None"
+    follow_ups_text = " ".join(f"• {q.strip().lstrip('•').strip()}" for q in follow_ups[:3]) or "None"
+    return summary.strip()[:500], int(score), issues[:200], follow_ups_text[:500]
+
+def _array_item_texts(array_text):
+    """The exact source text of each element of a valid JSON array"""
+    decoder = json.JSONDecoder()
+    texts = []
+    position = array_text.index('[') + 1
+    while True:
+        while array_text[position] in ' \t\r\n,':
+            position += 1
+        if array_text[position] == ']':
+            return texts
+        _, end = decoder.raw_decode(array_text, position)
+        texts.append(array_text[position:end])
+        position = end
+
+def parse_batch_response(response_text, expected_ids):
+    """Parse a batched JSON response into {applicant_id: (parsed tuple, raw item text)}.
+
+    The raw text is the applicant's object exactly as Gemini returned it.
+    Applicants that are missing, duplicated or malformed are left out so
+    the caller can retry them individually.
+    """
     if not response_text:
-        return summary, score, issues, follow_ups
-    
-    lines = response_text.split('\n')
-    current_section = ""
-    
-    for line in lines:
-        line = line.strip()
-        if line.startswith('Summary:'):
-            current_section = 'summary'
-            summary = line.replace('Summary:', '').strip()
-        elif line.startswith('Score:'):
-            current_section = 'score'
-            score_str = line.replace('Score:', '').strip()
-            try:
-                score = int(score_str)
-            except ValueError:
-                score = 0
-        elif line.startswith('Issues:'):
-            current_section = 'issues'
-            issues = line.replace('Issues:', '').strip()
-        elif line.startswith('Follow-Ups:'):
-            current_section = 'followups'
-            follow_ups = line.replace('Follow-Ups:', '').strip()
-        elif current_section == 'summary' and line and not any(line.startswith(prefix) for prefix in ['Score:', 'Issues:', 'Follow-Ups:']):
-            summary += " " + line
-        elif current_section == 'issues' and line and not any(line.startswith(prefix) for prefix in ['Summary:', 'Score:', 'Follow-Ups:']):
-            issues += " " + line
-        elif current_section == 'followups' and line and not any(line.startswith(prefix) for prefix in ['Summary:', 'Score:', 'Issues:']):
-            follow_ups += " " + line
-    
-    # Clean up responses
-    issues = issues if issues and issues != "None" else "None"
-    follow_ups = follow_ups if follow_ups and follow_ups != "None" else "None"
-    
-    return summary[:500], score, issues[:200], follow_ups[:500]
+        return {}
+    try:
+        items = json.loads(response_text)
+    except json.JSONDecodeError:
+        return {}
+    if not isinstance(items, list):
+        return {}
+    
+    expected = {str(applicant_id) for applicant_id in expected_ids}
+    results = {}
+    for item, raw_item in zip(items, _array_item_texts(response_text)):
+        if not isinstance(item, dict):
+            continue
+        applicant_id = str(item.get('applicant_id', ''))
+        parsed = validate_batch_item(item)
+        if applicant_id in expected and applicant_id not in results and parsed:
+            results[applicant_id] = (parsed, raw_item)
+    return results
+
+def get_llm_response(compressed_data, max_retries=3, limiter=None, budget=None):
+    """Call Gemini with exponential backoff plus jitter, returning the raw response or None.
+
+    With a budget (llm_scheduler.BudgetAccount) every attempt is charged to
+    it first; BudgetExhausted propagates when it cannot cover one.
+    """
+    limiter = limiter or rate_limiter
+    prompt_tokens = estimate_tokens(build_prompt(compressed_data))
+    output_tokens = output_token_cap()
+    token_count = prompt_tokens + output_tokens
+    
+    for attempt in range(max_retries):
+        if budget is not None:
+            budget.reserve(prompt_tokens, output_tokens)
+        limiter.acquire(token_count)
+        response = call_gemini_api(compressed_data)
+        if budget is not None:
+            budget.settle(output_tokens, estimate_tokens(response) if response else 0)
+        if response:
+            return response
+        if attempt < max_retries - 1:
+            metrics.increment('gemini_retries_total')
+            # Jitter keeps concurrent workers from retrying in lockstep
+            wait_time = 2 ** attempt + random.uniform(0, 1)
+            print(f"Retry {attempt + 1} in {wait_time:.1f} seconds...")
+            time.sleep(wait_time)
+    return None
+
+def evaluate_profile(compressed_data, max_retries=3, budget=None):
+    """Return the parsed evaluation for a profile, serving repeats from the cache"""
+    cache_key = None
+    if evaluation_cache is not None:
+        cache_key = evaluation_cache.make_key(compressed_data, PROMPT_VERSION, GEMINI_MODEL)
+        cached = evaluation_cache.get(cache_key)
+        metrics.increment('cache_requests_total', cache='llm', result='hit' if cached else 'miss')
+        if cached:
+            return cached[1]
+    
+    response = get_llm_response(compressed_data, max_retries, budget=budget)
+    if not response:
+        return None
+    
+    parsed = parse_llm_response(response)
+    if cache_key:
+        evaluation_cache.put(cache_key, response, parsed, PROMPT_VERSION, GEMINI_MODEL)
+    return parsed
+
+# Written by llm_result_fields, and copied from a canonical applicant to its duplicates
+LLM_RESULT_FIELDS = ("LLM Summary", "LLM Score", "LLM Follow-Ups")
+
+def llm_result_fields(parsed):
+    """Map a parsed LLM evaluation to the Applicants fields to write"""
+    summary, score, issues, follow_ups = parsed
+    return {
+        "LLM Summary": summary,
+        "LLM Score": score,
+        "LLM Follow-Ups": follow_ups
+    }
 
 def evaluate_with_llm(applicant_id, max_retries=3):
     """Evaluate an applicant using LLM with retry logic"""
@@ -107,54 +465,255 @@ def evaluate_with_llm(applicant_id, max_retries=3):
         return False
     
     try:
-        compressed_data = json.loads(compressed_json_str)
-    except json.JSONDecodeError:
+        compressed_data = decode(compressed_json_str)
+    except CodecError:
         print(f"Invalid JSON for applicant {applicant_id}")
         return False
     
-    # Call Gemini API with retry logic
-    response = None
-    for attempt in range(max_retries):
-        response = call_gemini_api(compressed_data)
-        if response:
-            break
-        wait_time = 2 ** attempt  # Exponential backoff
-        print(f"Retry {attempt + 1} in {wait_time} seconds...")
-        time.sleep(wait_time)
+    # Call Gemini API with retry logic (or reuse a cached evaluation)
+    parsed = evaluate_profile(compressed_data, max_retries)
     
-    if not response:
+    if not parsed:
         print(f"Failed to get LLM response for applicant {applicant_id} after {max_retries} attempts")
         return False
     
     # Parse response and update record
-    summary, score, issues, follow_ups = parse_llm_response(response)
-    
-    applicants.update(record['id'], {
-        "LLM Summary": summary,
-        "LLM Score": score,
-        "LLM Follow-Ups": follow_ups
-    })
+    applicants.update(record['id'], llm_result_fields(parsed))
     
     print(f"✓ LLM evaluation completed for applicant {applicant_id}")
     return True
 
-def evaluate_all_with_llm():
-    """Evaluate all applicants with LLM who haven't been evaluated yet"""
-    applicants = api.table(base_id, APPLICANTS_TABLE).all()
+def _load_profile(applicant):
+    """Parse an Applicants record's compressed JSON, returning None when invalid"""
+    try:
+        return decode(applicant['fields']['Compressed JSON'])
+    except CodecError:
+        print(f"Invalid JSON for applicant {applicant['fields'].get('Applicant ID')}")
+        return None
+
+def _evaluate_record(applicant, max_retries, scheduler=None, compressed_data=None):
+    """Worker task: evaluate one Applicants record.
+
+    Returns (results, retries) where results is a list of
+    (applicant, fields) pairs, matching _evaluate_batch. An applicant the
+    scheduler's budget cannot cover is reported to it and left unevaluated.
+    """
+    applicant_id = applicant['fields'].get('Applicant ID')
+    if compressed_data is None:
+        compressed_data = _load_profile(applicant)
+    if compressed_data is None:
+        return [], []
+    
+    try:
+        parsed = evaluate_profile(compressed_data, max_retries, scheduler.account(applicant) if scheduler else None)
+    except BudgetExhausted:
+        scheduler.left_by_budget(applicant)
+        return [], []
+    if not parsed:
+        print(f"Failed to get LLM response for applicant {applicant_id} after {max_retries} attempts")
+        return [], []
+    return [(applicant, llm_result_fields(parsed))], []
+
+def _evaluate_batch(batch, limiter=None, scheduler=None):
+    """Worker task: evaluate several applicants in one Gemini request.
+
+    Returns (results, retries); applicants missing from or malformed in
+    the response are returned as retries for single-applicant evaluation.
+    The request is charged to the scheduler's budget under the tier of the
+    batch's first (highest priority) applicant.
+    """
+    limiter = limiter or rate_limiter
+    results = []
+    uncached = []
+    for applicant_id, compressed_data, applicant in batch:
+        if evaluation_cache is not None:
+            cached = evaluation_cache.get(evaluation_cache.make_key(compressed_data, PROMPT_VERSION, GEMINI_MODEL))
+            metrics.increment('cache_requests_total', cache='llm', result='hit' if cached else 'miss')
+            if cached:
+                results.append((applicant, llm_result_fields(cached[1])))
+                continue
+        uncached.append((applicant_id, compressed_data, applicant))
+    
+    if not uncached:
+        return results, []
+    
+    profiles = [(applicant_id, compressed_data) for applicant_id, compressed_data, _ in uncached]
+    prompt_tokens = estimate_tokens(build_batch_prompt(profiles))
+    output_tokens = BATCH_OUTPUT_TOKENS_PER_APPLICANT * len(profiles)
+    account = scheduler.account(uncached[0][2]) if scheduler else None
+    if account is not None:
+        try:
+            account.reserve(prompt_tokens, output_tokens)
+        except BudgetExhausted:
+            for _, _, applicant in uncached:
+                scheduler.left_by_budget(applicant)
+            return results, []
+    limiter.acquire(prompt_tokens + output_tokens)
+    response = call_gemini_batch(profiles)
+    if account is not None:
+        account.settle(output_tokens, estimate_tokens(response) if response else 0)
+    parsed_by_id = parse_batch_response(response, [applicant_id for applicant_id, _ in profiles])
+    
+    retries = []
+    for applicant_id, compressed_data, applicant in uncached:
+        if str(applicant_id) not in parsed_by_id:
+            retries.append(applicant)
+            continue
+        parsed, raw_item = parsed_by_id[str(applicant_id)]
+        if evaluation_cache is not None:
+            key = evaluation_cache.make_key(compressed_data, PROMPT_VERSION, GEMINI_MODEL)
+            evaluation_cache.put(key, raw_item, parsed, PROMPT_VERSION, GEMINI_MODEL)
+        results.append((applicant, llm_result_fields(parsed)))
+    
+    if retries:
+        metrics.increment('llm_batch_fallbacks_total', len(retries))
+        print(f"Batch response missing or malformed for {len(retries)} applicants, retrying individually")
+    return results, retries
+
+def _journaled(run, task, *args):
+    """Run a worker task and journal its results on the worker, before they queue for a write"""
+    results, retries = task(*args)
+    journaled = []
+    for applicant, fields in results:
+        entries = run.log(APPLICANTS_TABLE, 'batch_update', [{"id": applicant['id'], "fields": fields}],
+                          [applicant_key(applicant['fields'].get('Applicant ID'))])
+        journaled.append((applicant, fields, entries))
+    return journaled, retries
+
+@metrics.timed_stage('llm')
+def evaluate_all_with_llm(concurrency=GEMINI_CONCURRENCY, write_mode=LLM_WRITE_MODE, max_retries=3,
+                          batch_size=LLM_BATCH_SIZE, resume=False, scheduler=None):
+    """Evaluate all applicants with LLM who haven't been evaluated yet.
+
+    The scheduler (llm_scheduler.EvaluationScheduler, built from config by
+    default) drops applicants its policy excludes, submits the rest highest
+    priority first and stops paying for requests once its budget is spent.
+    Evaluations run on a thread pool of `concurrency` workers sharing one
+    rate limiter. With batch_size > 1, up to that many applicants are
+    packed into each Gemini request (capped by LLM_BATCH_TOKEN_BUDGET) and
+    any that come back missing or malformed are retried one at a time.
+    Results are written back as they complete, either in batches of 10
+    (write_mode='batch') or one record at a time ('single'). Each result is
+    journaled as soon as it arrives, so resume=True replays results that
+    were never written instead of paying for them again (see journal.py).
+    """
+    scheduler = scheduler or EvaluationScheduler()
+    run = stage_run('llm', resume, api, base_id)
+    applicants_table = api.table(base_id, APPLICANTS_TABLE)
+    applicants = applicants_table.all()
+    
+    # Only evaluate if compressed data exists and hasn't been evaluated
+    pending = [
+        applicant for applicant in applicants
+        if applicant['fields'].get('Compressed JSON') not in (None, '', '{}')
+        and not applicant['fields'].get('LLM Summary')
+        and not run.skip(applicant_key(applicant['fields'].get('Applicant ID')))
+    ]
+    
+    # Duplicates whose profile is identical to their canonical applicant's copy its result instead of paying
+    # for their own; a resubmission with different content is evaluated on its own (see dedup.same_profile)
+    duplicate_of = dedup.duplicates()
+    by_key = {applicant_key(applicant['fields'].get('Applicant ID')): applicant for applicant in applicants}
+    duplicates = []
+    for applicant in pending:
+        canonical = by_key.get(duplicate_of.get(applicant_key(applicant['fields'].get('Applicant ID'))))
+        if canonical is None or canonical['fields'].get('Compressed JSON') in (None, '', '{}'):
+            continue
+        profile, canonical_profile = _load_profile(applicant), _load_profile(canonical)
+        if profile is not None and canonical_profile is not None and dedup.same_profile(profile, canonical_profile):
+            duplicates.append(applicant)
+    duplicate_ids = {applicant['id'] for applicant in duplicates}
+    results_by_key = {}
+    
     evaluated_count = 0
+    pending_writes = []
     
-    for applicant in applicants:
-        applicant_id = applicant['fields'].get('Applicant ID')
-        compressed_json = applicant['fields'].get('Compressed JSON')
-        
-        # Only evaluate if compressed data exists and hasn't been evaluated
-        if compressed_json and compressed_json != '{}' and not applicant['fields'].get('LLM Summary'):
-            print(f"Evaluating applicant {applicant_id} with LLM...")
-            if evaluate_with_llm(applicant_id):
-                evaluated_count += 1
-            # Add a small delay to avoid rate limiting
-            time.sleep(1)
+    def flush_writes():
+        run.send(api, base_id, pending_writes)
+        pending_writes.clear()
+    
+    def evaluate(to_evaluate):
+        nonlocal evaluated_count
+        ordered = scheduler.order(to_evaluate, _load_profile)
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+            # The pool runs tasks in submission order, so the highest priority applicants go first
+            if batch_size > 1:
+                items = [(str(applicant['fields'].get('Applicant ID')), compressed_data, applicant)
+                         for applicant, compressed_data in ordered]
+                futures = [executor.submit(_journaled, run, _evaluate_batch, batch, None, scheduler)
+                           for batch in pack_batches(items, batch_size)]
+            else:
+                futures = [executor.submit(_journaled, run, _evaluate_record, applicant, max_retries, scheduler,
+                                           compressed_data)
+                           for applicant, compressed_data in ordered]
+            
+            try:
+                while futures:
+                    done, futures = wait(futures, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        try:
+                            results, retries = future.result()
+                        except Exception as e:
+                            print(f"LLM evaluation task failed: {e}")
+                            continue
+                        
+                        # Items the batch could not evaluate go back into the queue as single requests
+                        for applicant in retries:
+                            futures.add(executor.submit(_journaled, run, _evaluate_record, applicant, max_retries,
+                                                        scheduler))
+                        
+                        # Writes stay on this thread so Airtable only sees one writer
+                        for applicant, fields, entries in results:
+                            if write_mode == 'single':
+                                applicants_table.update(applicant['id'], fields)
+                                run.written(entries)
+                            else:
+                                pending_writes.extend(entries)
+                                if len(pending_writes) >= BATCH_SIZE:
+                                    flush_writes()
+                            evaluated_count += 1
+                            scheduler.evaluated(applicant)
+                            if duplicates:
+                                results_by_key[applicant_key(applicant['fields'].get('Applicant ID'))] = fields
+                            print(f"✓ LLM evaluation completed for applicant {applicant['fields'].get('Applicant ID')}")
+            except BaseException:
+                # Stop paying for evaluations nobody will write; those already running are journaled for --resume
+                executor.shutdown(cancel_futures=True)
+                raise
+    
+    evaluate([applicant for applicant in pending if applicant['id'] not in duplicate_ids])
+    
+    # Copy each canonical applicant's evaluation (from this run, or already in Airtable) to its duplicates.
+    # A canonical applicant with no evaluation (excluded by the policy, over budget or failed) does not hold
+    # its duplicates back: they are evaluated themselves.
+    copies = []
+    owners = []
+    unresolved = []
+    for applicant in duplicates:
+        key = applicant_key(applicant['fields'].get('Applicant ID'))
+        canonical = by_key[duplicate_of[key]]
+        fields = results_by_key.get(duplicate_of[key])
+        if fields is None and canonical['fields'].get('LLM Summary'):
+            fields = {name: canonical['fields'].get(name) for name in LLM_RESULT_FIELDS}
+        if fields is not None:
+            copies.append({"id": applicant['id'], "fields": fields})
+            owners.append(key)
+        else:
+            unresolved.append(applicant)
+    if copies:
+        metrics.increment('dedup_reused_total', len(copies), stage='llm')
+        print(f"Reused {len(copies)} LLM evaluations for duplicate applicants")
+        pending_writes.extend(run.log(APPLICANTS_TABLE, 'batch_update', copies, owners))
+    if unresolved:
+        print(f"Evaluating {len(unresolved)} duplicate applicants whose canonical applicant has no evaluation")
+        evaluate(unresolved)
     
+    flush_writes()
+    run.finish()
+    scheduler.print_report()
+    if evaluation_cache is not None:
+        stats = evaluation_cache.stats()
+        print(f"LLM cache: {stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.0%} hit rate)")
     return evaluated_count
 
 if __name__ == "__main__":
@@ -166,7 +725,8 @@ if __name__ == "__main__":
         applicant_id = input("Enter Applicant ID to evaluate with LLM: ")
         evaluate_with_llm(applicant_id)
     elif choice == "2":
-        count = evaluate_all_with_llm()
+        count = evaluate_all_with_llm(resume="--resume" in sys.argv)
         print(f"LLM evaluation completed! {count} applicants evaluated.")
     else:
-        print("Invalid choice")
\ No newline at end of file
+        print("Invalid choice")
+    metrics.write_outputs()
\ No newline at end of file
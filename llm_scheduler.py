@@ -0,0 +1,244 @@
+"""Priority- and budget-aware ordering of LLM evaluations.
+
+Drops applicants the LLM_EVALUATE policy excludes and ranks the rest by
+Shortlist Status, criteria met, tier-1 experience, years and recency. An
+LLMBudget caps a run's Gemini requests, tokens and cost (LLM_MAX_*).
+
+    python llm_scheduler.py            # rank pending applicants and project spend, without calling Gemini
+"""
+import heapq
+import threading
+from datetime import datetime
+from config import (APPLICANTS_TABLE, LLM_EVALUATE, LLM_MAX_REQUESTS, LLM_MAX_TOKENS, LLM_MAX_COST_USD,
+                    GEMINI_INPUT_COST_PER_MILLION, GEMINI_OUTPUT_COST_PER_MILLION)
+from metrics import metrics
+from shortlist_candidates import shortlist_checks
+
+# Which applicants LLM_EVALUATE lets through, by Shortlist Status
+EVALUATION_POLICIES = {
+    'all': {'Shortlisted', 'Pending', 'Rejected'},
+    'not_rejected': {'Shortlisted', 'Pending'},
+    'shortlisted': {'Shortlisted'},
+}
+STATUS_RANK = {'Shortlisted': 2, 'Pending': 1, 'Rejected': 0}
+MAX_RANKED_YEARS = 20
+
+class BudgetExhausted(Exception):
+    """Raised instead of sending a Gemini request the run's budget cannot cover"""
+
+def request_cost(prompt_tokens, output_tokens):
+    """Estimated USD cost of one Gemini request"""
+    return (prompt_tokens * GEMINI_INPUT_COST_PER_MILLION + output_tokens * GEMINI_OUTPUT_COST_PER_MILLION) / 1e6
+
+def applicant_status(applicant):
+    status = applicant['fields'].get('Shortlist Status') or 'Pending'
+    return status if status in STATUS_RANK else 'Pending'
+
+def created_timestamp(applicant):
+    created = applicant.get('createdTime')
+    if not created:
+        return 0.0
+    try:
+        return datetime.fromisoformat(created.replace('Z', '+00:00')).timestamp()
+    except ValueError:
+        return 0.0
+
+def priority(applicant, profile):
+    """Sort key for an applicant; larger evaluates sooner"""
+    checks = shortlist_checks(profile)
+    criteria_met = sum(1 for name in ('experience_ok', 'compensation_ok', 'location_ok') if checks[name])
+    return (
+        STATUS_RANK[applicant_status(applicant)],
+        criteria_met,
+        checks['tier1_experience'],
+        min(checks['experience_years'], MAX_RANKED_YEARS),
+        created_timestamp(applicant),
+    )
+
+class LLMBudget:
+    """Per-run caps on Gemini requests, tokens and cost, shared by every worker thread"""
+
+    def __init__(self, max_requests=LLM_MAX_REQUESTS, max_tokens=LLM_MAX_TOKENS, max_cost=LLM_MAX_COST_USD):
+        self.max_requests = max_requests
+        self.max_tokens = max_tokens
+        self.max_cost = max_cost
+        self.requests = 0
+        self.tokens = 0
+        self.cost = 0.0
+        self.by_tier = {}
+        self.exhausted = False
+        self.lock = threading.Lock()
+
+    def _fits(self, tokens, cost):
+        return ((not self.max_requests or self.requests + 1 <= self.max_requests)
+                and (not self.max_tokens or self.tokens + tokens <= self.max_tokens)
+                and (not self.max_cost or self.cost + cost <= self.max_cost))
+
+    def reserve(self, prompt_tokens, output_tokens, tier='all'):
+        """Claim one request and its worst-case tokens, or raise BudgetExhausted"""
+        tokens = prompt_tokens + output_tokens
+        cost = request_cost(prompt_tokens, output_tokens)
+        with self.lock:
+            if not self._fits(tokens, cost):
+                if not self.exhausted:
+                    self.exhausted = True
+                    print(f"LLM budget exhausted after {self.requests} requests, {self.tokens} tokens, "
+                          f"${self.cost:.4f}; remaining applicants are left for the next run")
+                raise BudgetExhausted(tier)
+            self.requests += 1
+            self.tokens += tokens
+            self.cost += cost
+            spent = self.by_tier.setdefault(tier, {'requests': 0, 'tokens': 0, 'cost': 0.0})
+            spent['requests'] += 1
+            spent['tokens'] += tokens
+            spent['cost'] += cost
+
+    def settle(self, reserved_output, used_output, tier='all'):
+        """Return the part of a reservation's output budget the response did not use"""
+        unused = max(0, reserved_output - used_output)
+        refund = request_cost(0, unused)
+        with self.lock:
+            self.tokens -= unused
+            self.cost -= refund
+            spent = self.by_tier[tier]
+            spent['tokens'] -= unused
+            spent['cost'] -= refund
+
+    def account(self, tier):
+        """A handle that charges this budget under tier"""
+        return BudgetAccount(self, tier)
+
+class BudgetAccount:
+    """What evaluation workers charge: an LLMBudget plus the priority tier being evaluated"""
+
+    def __init__(self, budget, tier):
+        self.budget = budget
+        self.tier = tier
+
+    def reserve(self, prompt_tokens, output_tokens):
+        self.budget.reserve(prompt_tokens, output_tokens, self.tier)
+
+    def settle(self, reserved_output, used_output):
+        self.budget.settle(reserved_output, used_output, self.tier)
+
+class EvaluationScheduler:
+    """Filters pending applicants by policy and orders them by priority"""
+
+    def __init__(self, budget=None, policy=LLM_EVALUATE):
+        if policy not in EVALUATION_POLICIES:
+            raise ValueError(f"Unknown LLM_EVALUATE policy {policy!r}; use one of {sorted(EVALUATION_POLICIES)}")
+        self.budget = budget if budget is not None else LLMBudget()
+        self.policy = policy
+        self.tiers = {}
+        self.lock = threading.Lock()
+
+    def _tier(self, name):
+        return self.tiers.setdefault(name, {'queued': 0, 'skipped_by_policy': 0, 'evaluated': 0,
+                                            'left_by_budget': 0})
+
+    def order(self, applicants, load_profile):
+        """Return (applicant, profile) pairs allowed by the policy, highest priority first.
+
+        load_profile(applicant) returns the parsed profile or None (skipped).
+        """
+        heap = []
+        for sequence, applicant in enumerate(applicants):
+            if not self._allowed(applicant):
+                continue
+            profile = load_profile(applicant)
+            if profile is None:
+                continue
+            self._queued(applicant)
+            # heapq is a min-heap: negate the key, and the sequence keeps ties in Airtable order
+            heapq.heappush(heap, (tuple(-value for value in priority(applicant, profile)), sequence,
+                                  applicant, profile))
+        return [heapq.heappop(heap)[2:] for _ in range(len(heap))]
+
+    def admit(self, applicant):
+        """Policy check for an applicant evaluated as it arrives rather than through order()"""
+        if not self._allowed(applicant):
+            return False
+        self._queued(applicant)
+        return True
+
+    def _allowed(self, applicant):
+        status = applicant_status(applicant)
+        if status in EVALUATION_POLICIES[self.policy]:
+            return True
+        with self.lock:
+            self._tier(status)['skipped_by_policy'] += 1
+        metrics.increment('llm_scheduler_skipped_total', reason='policy', status=status)
+        return False
+
+    def _queued(self, applicant):
+        with self.lock:
+            self._tier(applicant_status(applicant))['queued'] += 1
+
+    def account(self, applicant):
+        return self.budget.account(applicant_status(applicant))
+
+    def evaluated(self, applicant):
+        with self.lock:
+            self._tier(applicant_status(applicant))['evaluated'] += 1
+
+    def left_by_budget(self, applicant):
+        """Called from worker threads for applicants the budget could not cover"""
+        with self.lock:
+            self._tier(applicant_status(applicant))['left_by_budget'] += 1
+        metrics.increment('llm_scheduler_skipped_total', reason='budget', status=applicant_status(applicant))
+
+    def report(self):
+        """How the run's budget was spent, per Shortlist Status"""
+        budget = self.budget
+        tiers = {}
+        for name in sorted(set(self.tiers) | set(budget.by_tier), key=lambda name: -STATUS_RANK.get(name, -1)):
+            spent = budget.by_tier.get(name, {'requests': 0, 'tokens': 0, 'cost': 0.0})
+            tiers[name] = dict(self._tier(name), requests=spent['requests'], tokens=spent['tokens'],
+                               cost_usd=round(spent['cost'], 6))
+        return {
+            'policy': self.policy,
+            'limits': {'requests': budget.max_requests, 'tokens': budget.max_tokens, 'cost_usd': budget.max_cost},
+            'spent': {'requests': budget.requests, 'tokens': budget.tokens, 'cost_usd': round(budget.cost, 6)},
+            'exhausted': budget.exhausted,
+            'tiers': tiers,
+        }
+
+    def print_report(self):
+        report = self.report()
+        spent = report['spent']
+        print(f"LLM budget ({report['policy']}): {spent['requests']} requests, {spent['tokens']} tokens, "
+              f"${spent['cost_usd']:.4f}" + (" (exhausted)" if report['exhausted'] else ""))
+        for name, tier in report['tiers'].items():
+            print(f"  {name}: {tier['evaluated']}/{tier['queued']} evaluated, {tier['left_by_budget']} left by budget, "
+                  f"{tier['skipped_by_policy']} skipped by policy | {tier['requests']} requests, "
+                  f"{tier['tokens']} tokens, ${tier['cost_usd']:.4f}")
+        for name in ('requests', 'tokens'):
+            metrics.increment(f'llm_budget_{name}_total', spent[name])
+        metrics.increment('llm_budget_cost_usd_total', spent['cost_usd'])
+
+if __name__ == "__main__":
+    from llm_evaluation import (api, base_id, build_prompt, estimate_tokens, output_token_cap, _load_profile)
+
+    applicants = api.table(base_id, APPLICANTS_TABLE).all()
+    pending = [applicant for applicant in applicants
+               if applicant['fields'].get('Compressed JSON') not in (None, '', '{}')
+               and not applicant['fields'].get('LLM Summary')]
+    scheduler = EvaluationScheduler()
+    planned = 0
+    for position, (applicant, profile) in enumerate(scheduler.order(pending, _load_profile), 1):
+        # Worst case: every request uses its whole output budget and nothing is cached
+        try:
+            scheduler.account(applicant).reserve(estimate_tokens(build_prompt(profile)), output_token_cap())
+        except BudgetExhausted:
+            scheduler.left_by_budget(applicant)
+            continue
+        planned += 1
+        if position <= 20:
+            print(f"{position:>4}. applicant {applicant['fields'].get('Applicant ID')} "
+                  f"({applicant_status(applicant)}, priority {priority(applicant, profile)[:4]})")
+    report = scheduler.report()
+    print(f"{planned} of {len(pending)} pending applicants fit the budget: {report['spent']['requests']} requests, "
+          f"{report['spent']['tokens']} tokens, ${report['spent']['cost_usd']:.4f} at most")
+    for name, tier in report['tiers'].items():
+        print(f"  {name}: {tier['queued']} queued, {tier['left_by_budget']} over budget, "
+              f"{tier['skipped_by_policy']} skipped by policy")
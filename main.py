@@ -1,31 +1,316 @@
+import json
 import time
-from compress_json import compress_all_applicants
-from shortlist_candidates import shortlist_applicants
-from llm_evaluation import evaluate_all_with_llm
+import queue
+import argparse
+import threading
+from datetime import datetime
+from config import (AIRTABLE_BASE_ID, APPLICANTS_TABLE, SHORTLISTED_TABLE, BATCH_SIZE,
+                    GEMINI_CONCURRENCY, STREAM_QUEUE_SIZE)
+from clients import lazy_airtable_api, resolve
+import dedup
+from codec import CodecError, decode, encode
+from compress_json import compress_all_applicants, prefetch_child_rows, get_applicant_data_from_index
+from shortlist_candidates import shortlist_applicants, evaluate_applicant
+from llm_evaluation import evaluate_all_with_llm, evaluate_profile, llm_result_fields
+from llm_scheduler import BudgetExhausted, EvaluationScheduler
+from metrics import metrics
+from mirror import MirrorApi
+from utils import applicant_key, applicant_id_formula, chunked, index_by_applicant, validate_applicant_data
 
-def main():
-    """Main orchestrator function to run the complete pipeline"""
+# Initialize Airtable API (served from the local mirror when USE_LOCAL_MIRROR is set)
+api = lazy_airtable_api()
+base_id = AIRTABLE_BASE_ID
+
+# Marks the end of a stage's input
+STOP = object()
+
+# Seconds the LLM writer waits for a batch to fill before writing what it has
+WRITE_FLUSH_INTERVAL = 0.5
+
+def run_streaming(queue_size=STREAM_QUEUE_SIZE, concurrency=GEMINI_CONCURRENCY):
+    """Stream Applicants page by page through compress -> shortlist -> LLM stages.
+
+    Each stage runs on its own thread and hands work downstream through a
+    bounded queue, so a slow stage applies backpressure instead of letting
+    pages pile up in memory, and the first applicants are evaluated while
+    later pages are still being read. Applicants reach Gemini in arrival
+    order, but the LLM_EVALUATE policy and LLM_MAX_* budget still apply.
+    """
+    started = time.perf_counter()
+    scheduler = EvaluationScheduler()
+    stats = {"read": 0, "compressed": 0, "shortlisted": 0, "rejected": 0, "llm_evaluated": 0,
+             "first_result_s": None}
+    stats_lock = threading.Lock()
+    errors = []
+
+    compress_queue = queue.Queue(maxsize=queue_size)
+    shortlist_queue = queue.Queue(maxsize=queue_size)
+    llm_queue = queue.Queue(maxsize=concurrency * 4)
+    write_queue = queue.Queue(maxsize=concurrency * 4)
+
+    def count(key, amount=1):
+        with stats_lock:
+            stats[key] += amount
+
+    def stage(name, inbox, handle, outbox):
+        """Run `handle` on every item until STOP; after a failure keep draining so upstream never blocks"""
+        def run():
+            failed = False
+            try:
+                while True:
+                    item = inbox.get()
+                    if item is STOP:
+                        break
+                    if failed:
+                        continue
+                    try:
+                        with metrics.stage(name):
+                            handle(item)
+                    except Exception as e:
+                        errors.append((name, e))
+                        failed = True
+            finally:
+                if outbox is not None:
+                    outbox.put(STOP)
+        return threading.Thread(target=run, name=f"stream-{name}", daemon=True)
+
+    def compress_page(page):
+        to_compress = {a['id'] for a in page if not a['fields'].get('Compressed JSON')}
+        child_index = None
+        if to_compress:
+            record_map = {a['id']: applicant_key(a['fields'].get('Applicant ID')) for a in page}
+            child_index = prefetch_child_rows([record_map[record_id] for record_id in to_compress], record_map)
+
+        items = []
+        updates = []
+        fresh = []
+        for applicant in page:
+            applicant_id = applicant_key(applicant['fields'].get('Applicant ID'))
+            if applicant['id'] in to_compress:
+                compressed_data = get_applicant_data_from_index(applicant_id, child_index)
+                if not validate_applicant_data(compressed_data):
+                    print(f"Incomplete data for applicant {applicant_id}")
+                    continue
+                compressed_json_str = encode(compressed_data)
+                applicant['fields']['Compressed JSON'] = compressed_json_str
+                updates.append({"id": applicant['id'], "fields": {"Compressed JSON": compressed_json_str}})
+                fresh.append((applicant_id, compressed_data))
+            else:
+                try:
+                    compressed_data = decode(applicant['fields']['Compressed JSON'])
+                except CodecError:
+                    print(f"Skipping applicant {applicant_id} - invalid JSON")
+                    continue
+            items.append((applicant, compressed_data))
+
+        links = dedup.link_profiles(fresh)
+        for (applicant_id, _), update in zip(fresh, updates):
+            update['fields'].update(links.get(applicant_id, {}))
+        for chunk in chunked(updates):
+            api.table(base_id, APPLICANTS_TABLE).batch_update(chunk)
+        count("compressed", len(updates))
+        if items:
+            shortlist_queue.put(items)
+
+    def shortlist_page(items):
+        status_updates = []
+        shortlisted = {}
+        for applicant, compressed_data in items:
+            applicant_id = applicant_key(applicant['fields'].get('Applicant ID'))
+            should_shortlist, score_reason = evaluate_applicant(applicant_id, compressed_data)
+            status = "Shortlisted" if should_shortlist else "Rejected"
+            if applicant['fields'].get('Shortlist Status') != status:
+                status_updates.append({"id": applicant['id'], "fields": {"Shortlist Status": status}})
+                applicant['fields']['Shortlist Status'] = status
+            if should_shortlist:
+                shortlisted[applicant_id] = (applicant, score_reason)
+            count("shortlisted" if should_shortlist else "rejected")
+
+        for chunk in chunked(status_updates):
+            api.table(base_id, APPLICANTS_TABLE).batch_update(chunk)
+
+        if shortlisted:
+            leads_table = api.table(base_id, SHORTLISTED_TABLE)
+            existing = leads_table.all(formula=applicant_id_formula(sorted(shortlisted), field='Applicant'))
+            already = set(index_by_applicant(existing, field='Applicant'))
+            new_leads = [
+                {
+                    "Applicant": applicant_id,
+                    "Compressed JSON": applicant['fields']['Compressed JSON'],
+                    "Score Reason": score_reason,
+                    "Created At": datetime.now().isoformat()
+                }
+                for applicant_id, (applicant, score_reason) in shortlisted.items()
+                if applicant_id not in already
+            ]
+            for chunk in chunked(new_leads):
+                leads_table.batch_create(chunk)
+
+        for applicant, compressed_data in items:
+            if not applicant['fields'].get('LLM Summary') and scheduler.admit(applicant):
+                llm_queue.put((applicant, compressed_data))
+
+    def llm_worker():
+        while True:
+            item = llm_queue.get()
+            if item is STOP:
+                # Let the sibling workers see the end of input too
+                llm_queue.put(STOP)
+                return
+            applicant, compressed_data = item
+            try:
+                with metrics.stage("llm"):
+                    parsed = evaluate_profile(compressed_data, budget=scheduler.account(applicant))
+            except BudgetExhausted:
+                scheduler.left_by_budget(applicant)
+                continue
+            except Exception as e:
+                print(f"LLM evaluation failed for applicant {applicant['fields'].get('Applicant ID')}: {e}")
+                continue
+            if parsed:
+                scheduler.evaluated(applicant)
+                write_queue.put((applicant, llm_result_fields(parsed)))
+
+    def write_results():
+        pending = []
+        done = False
+        failed = False
+        while not done:
+            try:
+                item = write_queue.get(timeout=WRITE_FLUSH_INTERVAL if pending else None)
+            except queue.Empty:
+                item = None
+            if item is STOP:
+                done = True
+            elif item is not None and not failed:
+                pending.append({"id": item[0]['id'], "fields": item[1]})
+            # Write full batches, but don't hold the first result or a partial batch once results slow down
+            idle = item is None
+            if pending and (done or idle or len(pending) >= BATCH_SIZE or stats["first_result_s"] is None):
+                try:
+                    for chunk in chunked(pending):
+                        api.table(base_id, APPLICANTS_TABLE).batch_update(chunk)
+                except Exception as e:
+                    # Keep draining so the LLM workers never block on a dead writer
+                    errors.append(("write", e))
+                    failed = True
+                    pending = []
+                    continue
+                with stats_lock:
+                    if stats["first_result_s"] is None:
+                        stats["first_result_s"] = round(time.perf_counter() - started, 3)
+                    stats["llm_evaluated"] += len(pending)
+                pending = []
+
+    threads = [
+        stage("compress", compress_queue, compress_page, shortlist_queue),
+        stage("shortlist", shortlist_queue, shortlist_page, llm_queue),
+    ]
+    llm_threads = [threading.Thread(target=llm_worker, name=f"stream-llm-{i}", daemon=True)
+                   for i in range(max(1, concurrency))]
+    writer = threading.Thread(target=write_results, name="stream-writer", daemon=True)
+    for thread in threads + llm_threads + [writer]:
+        thread.start()
+
+    # The reader runs on this thread; put() blocks whenever the compress stage falls behind
+    try:
+        for page in api.table(base_id, APPLICANTS_TABLE).iterate(page_size=100):
+            if errors:
+                break
+            count("read", len(page))
+            compress_queue.put(page)
+    finally:
+        compress_queue.put(STOP)
+        for thread in threads + llm_threads:
+            thread.join()
+        write_queue.put(STOP)
+        writer.join()
+        scheduler.print_report()
+
+    if errors:
+        stage_name, error = errors[0]
+        raise RuntimeError(f"Streaming pipeline failed in {stage_name} stage") from error
+    stats["wall_time_s"] = round(time.perf_counter() - started, 3)
+    return stats
+
+def flush_mirror_writes():
+    """Send writes still buffered by the local mirror's write-back queue"""
+    if isinstance(resolve(api), MirrorApi):
+        resolve(api).flush()
+
+def write_run_metrics():
+    """Write the run report and Prometheus textfile for this run"""
+    report_path = metrics.write_outputs()
+    if report_path:
+        print(f"Run metrics written to {report_path}")
+
+def main(incremental=False, streaming=False, sync_mirror=True, resume=False):
+    """Main orchestrator function to run the complete pipeline.
+
+    resume=True continues an interrupted batch run from the journal (see journal.py).
+    """
     print("=== Mercor Contractor Application System ===")
+
+    if isinstance(resolve(api), MirrorApi) and sync_mirror and not incremental:
+        print("Syncing local mirror...")
+        fetched = resolve(api).sync()
+        print(f"Fetched {sum(fetched.values())} changed records")
+
+    if incremental:
+        from incremental import run_incremental
+        print("Starting incremental processing pipeline...")
+        results = run_incremental()
+        write_run_metrics()
+        print(f"\n=== Processing Complete ===")
+        print(f"New shortlisted leads: {results['new_leads']}")
+        print(f"LLM Evaluated: {results['llm_evaluated']} applicants")
+        return results
+
+    if streaming:
+        print("Starting streaming processing pipeline...")
+        results = run_streaming()
+        flush_mirror_writes()
+        write_run_metrics()
+        print(f"\n=== Processing Complete ===")
+        print(f"Shortlisted: {results['shortlisted']} applicants")
+        print(f"LLM Evaluated: {results['llm_evaluated']} applicants")
+        if results['first_result_s'] is not None:
+            print(f"First result written after {results['first_result_s']}s")
+        return results
+
     print("Starting complete processing pipeline...")
-    
+
     # Step 1: Compress all applicant data
     print("\n1. Compressing applicant data...")
-    compress_all_applicants()
-    time.sleep(2)
-    
+    compress_all_applicants(resume=resume)
+
     # Step 2: Shortlist candidates
     print("\n2. Shortlisting candidates...")
-    shortlisted_count = shortlist_applicants()
-    time.sleep(2)
-    
+    shortlisted_count = shortlist_applicants(resume=resume)
+
     # Step 3: LLM evaluation
     print("\n3. Running LLM evaluation...")
-    evaluated_count = evaluate_all_with_llm()
-    
+    evaluated_count = evaluate_all_with_llm(resume=resume)
+    flush_mirror_writes()
+    write_run_metrics()
+
     print(f"\n=== Processing Complete ===")
     print(f"Shortlisted: {shortlisted_count} applicants")
     print(f"LLM Evaluated: {evaluated_count} applicants")
     print("Check your Airtable base for results!")
+    return {"shortlisted": shortlisted_count, "llm_evaluated": evaluated_count}
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Run the applicant processing pipeline")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only process applicants changed since the last run")
+    parser.add_argument("--streaming", action="store_true",
+                        help="stream applicants page by page through all stages concurrently")
+    parser.add_argument("--no-sync", action="store_true",
+                        help="with USE_LOCAL_MIRROR, reprocess the mirror as-is without syncing it first")
+    parser.add_argument("--resume", action="store_true",
+                        help="continue an interrupted batch run: replay unsent results and skip finished applicants")
+    args = parser.parse_args()
+    if args.resume and (args.incremental or args.streaming):
+        parser.error("--resume applies to the batch pipeline only")
+    main(incremental=args.incremental, streaming=args.streaming, sync_mirror=not args.no_sync, resume=args.resume)
@@ -0,0 +1,140 @@
+import re
+from functools import lru_cache
+from collections import namedtuple
+from config import TIER_1_COMPANIES, ELIGIBLE_COUNTRY_GROUPS
+from metrics import metrics
+
+# Result of a successful match: which alias hit and what it stands for
+MatchResult = namedtuple('MatchResult', ['alias', 'canonical', 'kind'])
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+# What separates the words of an alias in the text, and what may not touch either end of it
+_GAP = r"[^a-z0-9]+"
+_WORD_END = r"(?![a-z0-9])"
+_WORD_START = r"(?<![a-z0-9])"
+# Only non-word characters up to the end of the location part, e.g. "UK" in "London, UK (remote)"
+_SEGMENT_END = r"(?=[^a-z0-9]*(?:[,;/|()\[\]\-–]|\Z))"
+
+# Aliases this short only count as a whole location segment's last word ("London, UK",
+# "Austin, TX, US"), never inside other text ("based in Paris", "Rio de Janeiro")
+MAX_CODE_LENGTH = 3
+# Country codes that are also US state abbreviations ("San Jose, CA", "Newark, DE") could mean
+# either place; both are eligible, so they still match, but as e.g. 'Canada or United States'
+US_STATE_CODES = frozenset("""
+    al ak az ar ca co ct de fl ga hi id il in ia ks ky la me md ma mi mn ms mo mt ne nv nh nj nm ny nc nd
+    oh ok or pa ri sc sd tn tx ut vt va wa wv wi wy dc
+""".split())
+
+def tokenize(text, strip_dots=True):
+    """Lowercase text into word tokens.
+
+    With strip_dots, dots are dropped so 'U.S.A.' reads as 'usa';
+    otherwise they separate words, so 'Amazon.com' reads as 'amazon com'.
+    """
+    if strip_dots:
+        text = text.replace('.', '')
+    return _TOKEN.findall(text.lower())
+
+def _trie_pattern(words):
+    """Regex source matching any of words (token tuples), longest first, sharing common prefixes"""
+    trie = {}
+    for tokens in words:
+        node = trie
+        for char in ' '.join(tokens):
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def branch(node):
+        options = [(_GAP if char == ' ' else re.escape(char)) + branch(child)
+                   for char, child in sorted(node.items()) if char]
+        if '' in node:
+            options.append(_WORD_END)
+        return options[0] if len(options) == 1 else '(?:' + '|'.join(options) + ')'
+
+    return _WORD_START + branch(trie) if trie else None
+
+class AliasMatcher:
+    """Word-boundary matcher for multi-word aliases, compiled into one regex.
+
+    The aliases are laid out as a character trie, so re scans a text once
+    and at each position follows a single branch, however many aliases are
+    indexed. A hit is mapped back to its alias through a token hash index.
+    """
+
+    def __init__(self, aliases, codes=(), strip_dots=True):
+        # aliases / codes: iterables of (alias, canonical, kind); strip_dots is passed to tokenize
+        self.strip_dots = strip_dots
+        self.index = {}
+        self.code_index = {}
+        for alias, canonical, kind in aliases:
+            tokens = tuple(tokenize(alias, strip_dots))
+            if tokens:
+                self.index.setdefault(tokens, MatchResult(alias, canonical, kind))
+        for alias, canonical, kind in codes:
+            tokens = tuple(tokenize(alias, strip_dots))
+            if tokens:
+                self.code_index.setdefault(tokens[-1], MatchResult(alias, canonical, kind))
+        pattern = _trie_pattern(self.index)
+        self.pattern = re.compile(pattern) if pattern else None
+        codes_pattern = _trie_pattern((code,) for code in self.code_index)
+        self.code_pattern = re.compile(codes_pattern + _SEGMENT_END) if codes_pattern else None
+
+    def match(self, text):
+        """Return the longest, left-most alias found in text, or None"""
+        if not text:
+            return None
+        if self.strip_dots:
+            text = text.replace('.', '')
+        text = text.lower()
+        if self.pattern:
+            found = self.pattern.search(text)
+            if found:
+                return self.index[tuple(_TOKEN.findall(found.group()))]
+        if self.code_pattern:
+            found = self.code_pattern.search(text)
+            if found:
+                return self.code_index[found.group()]
+        return None
+
+def _build_company_matcher():
+    # Dots split company names, so 'Amazon.com' and 'Salesforce.com' still match
+    return AliasMatcher(((company, company, 'company') for company in TIER_1_COMPANIES), strip_dots=False)
+
+def _build_location_matcher():
+    aliases = []
+    codes = []
+    for country, country_aliases in ELIGIBLE_COUNTRY_GROUPS.items():
+        for alias in country_aliases:
+            code = alias.replace('.', '').lower()
+            if len(code) > MAX_CODE_LENGTH:
+                aliases.append((alias, country, 'country'))
+            elif code in US_STATE_CODES:
+                codes.append((alias, f"{country} or United States", 'country'))
+            else:
+                codes.append((alias, country, 'country'))
+    return AliasMatcher(aliases, codes)
+
+# Built once from config at import time
+company_matcher = _build_company_matcher()
+location_matcher = _build_location_matcher()
+
+@lru_cache(maxsize=65536)
+def match_company(company):
+    """Return the MatchResult for a tier-1 company name, or None"""
+    return company_matcher.match(company)
+
+@lru_cache(maxsize=65536)
+def match_location(location):
+    """Return the MatchResult for an eligible location, or None"""
+    return location_matcher.match(location)
+
+metrics.register_cache('match_company', match_company.cache_info)
+metrics.register_cache('match_location', match_location.cache_info)
+
+def rebuild():
+    """Recompile the matchers after changing the lists in config"""
+    global company_matcher, location_matcher
+    company_matcher = _build_company_matcher()
+    location_matcher = _build_location_matcher()
+    match_company.cache_clear()
+    match_location.cache_clear()
@@ -0,0 +1,345 @@
+import os
+import json
+import time
+import threading
+import functools
+import contextlib
+import tracemalloc
+from config import METRICS_ENABLED, METRICS_DIR, METRICS_PROFILE_STAGES, METRICS_TRACEMALLOC_STAGES
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+TOKEN_BUCKETS = (100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000)
+READ_OPERATIONS = {'all', 'iterate', 'first', 'get'}
+
+class Histogram:
+    """Cumulative bucket counts plus sum and count, as Prometheus expects"""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.sum += value
+        self.count += 1
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "mean": round(self.sum / self.count, 6) if self.count else None,
+            "buckets": {str(bound): count for bound, count in zip(self.buckets, self.counts)}
+        }
+
+def _labels_key(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+class Metrics:
+    """Thread-safe run metrics: counters, histograms and per-stage timings.
+
+    Stage timings accumulate busy time, so stages that overlap (streaming
+    mode) each report the time spent inside them rather than wall time.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.caches = {}
+        self._tracing_users = 0
+        self._owns_tracing = False
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.started = time.time()
+            self.counters = {}
+            self.histograms = {}
+            self.stages = {}
+
+    def increment(self, name, amount=1, **labels):
+        key = (name, _labels_key(labels))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS, **labels):
+        key = (name, _labels_key(labels))
+        with self.lock:
+            if key not in self.histograms:
+                self.histograms[key] = Histogram(buckets)
+            self.histograms[key].observe(value)
+
+    def register_cache(self, name, cache_info):
+        """Report an lru_cache's hit rate; cache_info is the cached function's cache_info"""
+        self.caches[name] = cache_info
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """Time a pipeline stage, optionally under cProfile and/or tracemalloc (see METRICS_*_STAGES)"""
+        profiler = None
+        if name in METRICS_PROFILE_STAGES:
+            import cProfile  # only profiled runs pay for the profiler's imports
+            profiler = cProfile.Profile()
+        trace_memory = name in METRICS_TRACEMALLOC_STAGES
+        if trace_memory:
+            self._start_tracing()
+        if profiler:
+            profiler.enable()
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            if profiler:
+                profiler.disable()
+                self._save_profile(name, profiler)
+            peak_memory = self._stop_tracing() if trace_memory else None
+            with self.lock:
+                entry = self.stages.setdefault(name, {"seconds": 0.0, "runs": 0})
+                entry["seconds"] += elapsed
+                entry["runs"] += 1
+                if peak_memory is not None:
+                    entry["peak_memory_mb"] = max(entry.get("peak_memory_mb", 0), round(peak_memory / 1024 / 1024, 1))
+
+    # Concurrent stages (streaming mode) share one tracemalloc session; the last one out stops it
+
+    def _start_tracing(self):
+        with self.lock:
+            if self._tracing_users == 0 and not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._owns_tracing = True
+            if self._tracing_users == 0:
+                tracemalloc.reset_peak()
+            self._tracing_users += 1
+
+    def _stop_tracing(self):
+        with self.lock:
+            peak_memory = tracemalloc.get_traced_memory()[1]
+            self._tracing_users -= 1
+            if self._tracing_users == 0 and self._owns_tracing:
+                tracemalloc.stop()
+                self._owns_tracing = False
+            return peak_memory
+
+    def timed_stage(self, name):
+        """Decorator form of stage()"""
+        def decorator(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                with self.stage(name):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def _save_profile(self, name, profiler):
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        path = os.path.join(METRICS_DIR, f"profile-{name}.prof")
+        with self.lock:
+            # Repeated runs of a stage (e.g. per streamed page) add up in one file
+            if os.path.exists(path) and name in self.stages:
+                import pstats
+                stats = pstats.Stats(path)
+                stats.add(profiler)
+                stats.dump_stats(path)
+            else:
+                profiler.dump_stats(path)
+
+    def cache_hit_rates(self):
+        """Hit rate per cache: counted caches (cache_requests_total) plus registered lru_caches"""
+        totals = {}
+        with self.lock:
+            for (name, labels), value in self.counters.items():
+                if name == 'cache_requests_total':
+                    labels = dict(labels)
+                    entry = totals.setdefault(labels['cache'], {"hits": 0, "misses": 0})
+                    entry["hits" if labels['result'] == 'hit' else "misses"] += value
+        for name, cache_info in self.caches.items():
+            info = cache_info()
+            totals[name] = {"hits": info.hits, "misses": info.misses}
+        for entry in totals.values():
+            lookups = entry["hits"] + entry["misses"]
+            entry["hit_rate"] = round(entry["hits"] / lookups, 4) if lookups else None
+        return totals
+
+    def snapshot(self):
+        """All metrics as a JSON-serialisable dict"""
+        caches = self.cache_hit_rates()
+        with self.lock:
+            counters = {}
+            for (name, labels), value in sorted(self.counters.items()):
+                counters.setdefault(name, []).append(dict(labels, value=value))
+            histograms = {}
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                histograms.setdefault(name, []).append(dict(labels, **histogram.to_dict()))
+            return {
+                "started_at": self.started,
+                "duration_s": round(time.time() - self.started, 3),
+                "stages": {name: dict(entry, seconds=round(entry["seconds"], 3)) for name, entry in self.stages.items()},
+                "counters": counters,
+                "histograms": histograms,
+                "caches": caches
+            }
+
+    def prometheus_text(self):
+        """Render the metrics in the Prometheus text exposition format"""
+        def labels_text(labels):
+            if not labels:
+                return ""
+            return "{" + ",".join(f'{key}="{str(value).replace(chr(34), chr(39))}"' for key, value in labels) + "}"
+
+        lines = []
+        caches = self.cache_hit_rates()
+        with self.lock:
+            stages = sorted(self.stages.items())
+            for metric, field in (('stage_seconds', 'seconds'), ('stage_runs', 'runs'),
+                                  ('stage_peak_memory_mb', 'peak_memory_mb')):
+                samples = [(name, entry[field]) for name, entry in stages if field in entry]
+                if samples:
+                    lines.append(f"# TYPE pipeline_{metric} gauge")
+                    lines += [f'pipeline_{metric}{{stage="{name}"}} {value:g}' for name, value in samples]
+
+            declared = set()
+            for (name, labels), value in sorted(self.counters.items()):
+                if name not in declared:
+                    lines.append(f"# TYPE pipeline_{name} counter")
+                    declared.add(name)
+                lines.append(f"pipeline_{name}{labels_text(labels)} {value}")
+
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                if name not in declared:
+                    lines.append(f"# TYPE pipeline_{name} histogram")
+                    declared.add(name)
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    lines.append(f"pipeline_{name}_bucket{labels_text(labels + (('le', bound),))} {count}")
+                lines.append(f"pipeline_{name}_bucket{labels_text(labels + (('le', '+Inf'),))} {histogram.count}")
+                lines.append(f"pipeline_{name}_sum{labels_text(labels)} {histogram.sum:.6f}")
+                lines.append(f"pipeline_{name}_count{labels_text(labels)} {histogram.count}")
+
+        lines.append("# TYPE pipeline_cache_hit_ratio gauge")
+        for name, entry in sorted(caches.items()):
+            if entry["hit_rate"] is not None:
+                lines.append(f'pipeline_cache_hit_ratio{{cache="{name}"}} {entry["hit_rate"]}')
+        lines.append(f"pipeline_last_run_timestamp_seconds {time.time():.0f}")
+        return "\n".join(lines) + "\n"
+
+    def write_outputs(self, metrics_dir=None):
+        """Write run_report.json and pipeline.prom (node_exporter textfile format) to METRICS_DIR"""
+        if not METRICS_ENABLED:
+            return None
+        metrics_dir = metrics_dir or METRICS_DIR
+        os.makedirs(metrics_dir, exist_ok=True)
+        report_path = os.path.join(metrics_dir, 'run_report.json')
+        prometheus_path = os.path.join(metrics_dir, 'pipeline.prom')
+        # Write then rename, so collectors never read a half-written file
+        for path, content in ((report_path, json.dumps(self.snapshot(), indent=2)),
+                              (prometheus_path, self.prometheus_text())):
+            with open(path + '.tmp', 'w') as f:
+                f.write(content)
+            os.replace(path + '.tmp', path)
+        return report_path
+
+def _status_code(error):
+    response = getattr(error, 'response', None)
+    return getattr(response, 'status_code', None) or getattr(error, 'status_code', None)
+
+class InstrumentedTable:
+    """Wraps a pyairtable Table, counting requests and records by table and operation"""
+
+    def __init__(self, table, name, metrics):
+        self.table = table
+        self.name = name
+        self.metrics = metrics
+
+    def __getattr__(self, attribute):
+        return getattr(self.table, attribute)
+
+    def _record_error(self, operation, error):
+        status = _status_code(error)
+        self.metrics.increment('airtable_errors_total', table=self.name, operation=operation, status=status or 'none')
+        if status == 429:
+            self.metrics.increment('airtable_rate_limited_total', table=self.name)
+
+    def _call(self, operation, function, *args, requests=1, records=None, **kwargs):
+        kind = 'read' if operation in READ_OPERATIONS else 'write'
+        started = time.perf_counter()
+        try:
+            result = function(*args, **kwargs)
+        except Exception as error:
+            self._record_error(operation, error)
+            raise
+        finally:
+            self.metrics.observe('airtable_request_seconds', time.perf_counter() - started, kind=kind)
+        self.metrics.increment('airtable_requests_total', requests, table=self.name, operation=operation, kind=kind)
+        if records is not None:
+            self.metrics.increment('airtable_records_total', records, table=self.name, operation=operation)
+        return result
+
+    def iterate(self, *args, **kwargs):
+        pages = self.table.iterate(*args, **kwargs)
+        while True:
+            started = time.perf_counter()
+            try:
+                page = next(pages)
+            except StopIteration:
+                return
+            except Exception as error:
+                self._record_error('iterate', error)
+                raise
+            self.metrics.observe('airtable_request_seconds', time.perf_counter() - started, kind='read')
+            self.metrics.increment('airtable_requests_total', table=self.name, operation='iterate', kind='read')
+            self.metrics.increment('airtable_records_total', len(page), table=self.name, operation='iterate')
+            yield page
+
+    def all(self, *args, **kwargs):
+        return [record for page in self.iterate(*args, **kwargs) for record in page]
+
+    def first(self, *args, **kwargs):
+        return self._call('first', self.table.first, *args, **kwargs)
+
+    def get(self, *args, **kwargs):
+        return self._call('get', self.table.get, *args, **kwargs)
+
+    def create(self, fields, **kwargs):
+        return self._call('create', self.table.create, fields, records=1, **kwargs)
+
+    def update(self, record_id, fields, **kwargs):
+        return self._call('update', self.table.update, record_id, fields, records=1, **kwargs)
+
+    def delete(self, record_id):
+        return self._call('delete', self.table.delete, record_id, records=1)
+
+    # pyairtable splits batch calls into requests of 10 records
+
+    def batch_create(self, records, **kwargs):
+        return self._call('batch_create', self.table.batch_create, records,
+                          requests=-(-len(records) // 10), records=len(records), **kwargs)
+
+    def batch_update(self, records, **kwargs):
+        return self._call('batch_update', self.table.batch_update, records,
+                          requests=-(-len(records) // 10), records=len(records), **kwargs)
+
+    def batch_delete(self, record_ids):
+        return self._call('batch_delete', self.table.batch_delete, record_ids,
+                          requests=-(-len(record_ids) // 10), records=len(record_ids))
+
+class InstrumentedApi:
+    """Wraps a pyairtable Api so every table it hands out is instrumented"""
+
+    def __init__(self, api, metrics):
+        self.api = api
+        self.metrics = metrics
+
+    def __getattr__(self, attribute):
+        return getattr(self.api, attribute)
+
+    def table(self, base_id, table_name):
+        return InstrumentedTable(self.api.table(base_id, table_name), table_name, self.metrics)
+
+# Shared by every module for the whole run
+metrics = Metrics()
+
+def instrumented_api(api):
+    """Return api wrapped for call counting, or unchanged when METRICS_ENABLED is off"""
+    return InstrumentedApi(api, metrics) if METRICS_ENABLED else api
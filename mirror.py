@@ -0,0 +1,409 @@
+import os
+import sys
+import json
+import time
+import atexit
+import sqlite3
+import threading
+import itertools
+from datetime import datetime, timedelta, timezone
+from config import (APPLICANTS_TABLE, PERSONAL_TABLE, EXPERIENCE_TABLE, SALARY_TABLE, SHORTLISTED_TABLE, BATCH_SIZE,
+                    USE_LOCAL_MIRROR, LOCAL_MIRROR_DIR)
+from utils import applicant_key, modified_since_formula, parse_simple_formula
+
+# Applicants first, so linked child rows can be resolved to Applicant IDs as they arrive
+MIRRORED_TABLES = [APPLICANTS_TABLE, PERSONAL_TABLE, EXPERIENCE_TABLE, SALARY_TABLE, SHORTLISTED_TABLE]
+APPLICANT_FIELDS = {SHORTLISTED_TABLE: 'Applicant'}
+
+# Re-read a little before the last watermark to absorb clock skew; upserts make the overlap harmless
+SYNC_OVERLAP = timedelta(minutes=5)
+
+def _clean_fields(fields):
+    """Airtable omits empty fields from stored records"""
+    return {
+        key: value for key, value in fields.items()
+        if value is not None and value is not False and value != '' and value != []
+    }
+
+class LocalMirror:
+    """SQLite copy of the base's tables, indexed by table and Applicant ID"""
+
+    def __init__(self, mirror_dir=LOCAL_MIRROR_DIR, filename='mirror.sqlite3'):
+        os.makedirs(mirror_dir, exist_ok=True)
+        self.conn = sqlite3.connect(os.path.join(mirror_dir, filename), check_same_thread=False)
+        self.lock = threading.RLock()
+        self.conn.executescript("""
+            PRAGMA journal_mode = WAL;
+            PRAGMA synchronous = NORMAL;
+            CREATE TABLE IF NOT EXISTS records (
+                table_name TEXT NOT NULL,
+                record_id TEXT NOT NULL,
+                applicant_id TEXT,
+                created_time TEXT,
+                fields TEXT NOT NULL,
+                modified_at REAL NOT NULL,
+                PRIMARY KEY (table_name, record_id)
+            );
+            CREATE INDEX IF NOT EXISTS records_by_applicant ON records (table_name, applicant_id);
+            CREATE TABLE IF NOT EXISTS sync_state (
+                table_name TEXT PRIMARY KEY,
+                watermark TEXT NOT NULL,
+                synced_at REAL NOT NULL
+            );
+        """)
+        self._record_map = None
+
+    def record_map(self):
+        """Map Applicants record IDs to Applicant IDs (resolves linked-record child fields)"""
+        with self.lock:
+            if self._record_map is None:
+                self._record_map = dict(self.conn.execute(
+                    "SELECT record_id, applicant_id FROM records WHERE table_name = ?", (APPLICANTS_TABLE,)
+                ))
+            return self._record_map
+
+    def _applicant_id(self, table_name, fields):
+        value = fields.get(APPLICANT_FIELDS.get(table_name, 'Applicant ID'))
+        if table_name == APPLICANTS_TABLE:
+            return applicant_key(value)
+        return applicant_key(value, self.record_map())
+
+    def upsert(self, table_name, records, modified_at=None, commit=True):
+        """Insert or replace records as returned by the API, keeping first-seen order"""
+        modified_at = modified_at or time.time()
+        with self.lock:
+            rows = []
+            for record in records:
+                rows.append((
+                    table_name, record['id'], self._applicant_id(table_name, record['fields']),
+                    record.get('createdTime'), json.dumps(record['fields']), modified_at
+                ))
+            self.conn.executemany("""
+                INSERT INTO records VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (table_name, record_id) DO UPDATE SET
+                    applicant_id = excluded.applicant_id, fields = excluded.fields, modified_at = excluded.modified_at
+            """, rows)
+            if table_name == APPLICANTS_TABLE:
+                self._record_map = None
+            if commit:
+                self.conn.commit()
+
+    def commit(self):
+        with self.lock:
+            self.conn.commit()
+
+    def apply_update(self, table_name, record_id, fields):
+        """Merge fields into a mirrored record, returning the updated record (None if not mirrored)"""
+        with self.lock:
+            current = self.get(table_name, record_id)
+            if current is None:
+                return None
+            merged = dict(current['fields'])
+            merged.update(fields)
+            current['fields'] = _clean_fields(merged)
+            # Committed when the write-back queue flushes
+            self.upsert(table_name, [current], commit=False)
+            return current
+
+    def delete(self, table_name, record_ids, commit=True):
+        with self.lock:
+            self.conn.executemany("DELETE FROM records WHERE table_name = ? AND record_id = ?",
+                                  [(table_name, record_id) for record_id in record_ids])
+            if table_name == APPLICANTS_TABLE:
+                self._record_map = None
+            if commit:
+                self.conn.commit()
+
+    def replace_table(self, table_name, records, modified_at=None):
+        """Make the mirrored table match records exactly (full sync; also drops deleted rows)"""
+        with self.lock:
+            self.conn.execute("DELETE FROM records WHERE table_name = ?", (table_name,))
+            self.upsert(table_name, records, modified_at)
+
+    def _rows_to_records(self, rows):
+        return [{"id": record_id, "createdTime": created_time, "fields": json.loads(fields)}
+                for record_id, created_time, fields in rows]
+
+    def get(self, table_name, record_id):
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT record_id, created_time, fields FROM records WHERE table_name = ? AND record_id = ?",
+                (table_name, record_id)
+            ).fetchall()
+        records = self._rows_to_records(rows)
+        return records[0] if records else None
+
+    def select(self, table_name, formula=None):
+        """Return the records matching one of the formulas this project sends to Airtable"""
+        query = "SELECT record_id, created_time, fields FROM records WHERE table_name = ?"
+        if not formula:
+            with self.lock:
+                return self._rows_to_records(self.conn.execute(query + " ORDER BY rowid", (table_name,)))
+
+        kind, argument = parse_simple_formula(formula)
+        if kind == 'modified_after':
+            with self.lock:
+                return self._rows_to_records(self.conn.execute(
+                    query + " AND modified_at > ? ORDER BY rowid", (table_name, argument)
+                ))
+
+        applicant_field = APPLICANT_FIELDS.get(table_name, 'Applicant ID')
+        if all(field == applicant_field for field, _ in argument):
+            ids = sorted({value for _, value in argument})
+            records = []
+            with self.lock:
+                # Stay well under SQLite's bound-parameter limit
+                for start in range(0, len(ids), 500):
+                    chunk = ids[start:start + 500]
+                    records.extend(self._rows_to_records(self.conn.execute(
+                        query + f" AND applicant_id IN ({', '.join('?' * len(chunk))}) ORDER BY rowid",
+                        [table_name] + chunk
+                    )))
+            return records
+
+        # Rare: equality on other fields is answered by scanning the table
+        wanted = {}
+        for field, value in argument:
+            wanted.setdefault(field, set()).add(value)
+        matched = []
+        for record in self.select(table_name):
+            for field, values in wanted.items():
+                value = record['fields'].get(field)
+                items = value if isinstance(value, list) else [value]
+                if any(item is not None and str(item) in values for item in items):
+                    matched.append(record)
+                    break
+        return matched
+
+    def get_watermark(self, table_name):
+        with self.lock:
+            row = self.conn.execute("SELECT watermark FROM sync_state WHERE table_name = ?", (table_name,)).fetchone()
+        return row[0] if row else None
+
+    def set_watermark(self, table_name, watermark):
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO sync_state VALUES (?, ?, ?)", (table_name, watermark, time.time()))
+            self.conn.commit()
+
+    def stats(self):
+        with self.lock:
+            counts = dict(self.conn.execute("SELECT table_name, COUNT(*) FROM records GROUP BY table_name"))
+            synced = {row[0]: row[1] for row in self.conn.execute("SELECT table_name, watermark FROM sync_state")}
+        return {table_name: {"records": counts.get(table_name, 0), "watermark": synced.get(table_name)}
+                for table_name in MIRRORED_TABLES}
+
+    def clear(self):
+        with self.lock:
+            self.conn.executescript("DELETE FROM records; DELETE FROM sync_state;")
+            self._record_map = None
+
+def sync(api, base_id, mirror, full=False):
+    """Pull changed records from Airtable into the mirror, returning records fetched per table.
+
+    Incremental syncs fetch only rows modified since each table's last
+    watermark. Deleted rows are only noticed by a full sync.
+    """
+    started = datetime.now(timezone.utc)
+    fetched = {}
+    for table_name in MIRRORED_TABLES:
+        since = None if full else mirror.get_watermark(table_name)
+        table = api.table(base_id, table_name)
+        if since is None:
+            records = table.all()
+            mirror.replace_table(table_name, records)
+        else:
+            records = table.all(formula=modified_since_formula(since))
+            mirror.upsert(table_name, records)
+        mirror.set_watermark(table_name, (started - SYNC_OVERLAP).strftime('%Y-%m-%dT%H:%M:%S.000Z'))
+        fetched[table_name] = len(records)
+    return fetched
+
+class WriteBackQueue:
+    """Buffers writes per table and sends them to Airtable as full batches.
+
+    Updates to the same record are merged before sending. Records created
+    through the queue live in the mirror under a provisional ID until the
+    create is flushed.
+    """
+
+    def __init__(self, api, base_id, mirror, batch_size=BATCH_SIZE):
+        self.api = api
+        self.base_id = base_id
+        self.mirror = mirror
+        self.batch_size = batch_size
+        self.lock = threading.RLock()
+        self.creates = {}   # table -> {provisional_id: fields}
+        self.updates = {}   # table -> {record_id: fields}
+        self.deletes = {}   # table -> [record_id]
+        self._provisional = itertools.count(1)
+
+    def create(self, table_name, fields):
+        with self.lock:
+            provisional_id = f"local{next(self._provisional):014d}"
+            record = {"id": provisional_id, "createdTime": datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.000Z'),
+                      "fields": _clean_fields(fields)}
+            self.mirror.upsert(table_name, [record], commit=False)
+            pending = self.creates.setdefault(table_name, {})
+            pending[provisional_id] = dict(fields)
+            if len(pending) >= self.batch_size:
+                self._flush_creates(table_name)
+            return record
+
+    def update(self, table_name, record_id, fields):
+        with self.lock:
+            record = self.mirror.apply_update(table_name, record_id, fields)
+            pending_creates = self.creates.get(table_name, {})
+            if record_id in pending_creates:
+                pending_creates[record_id].update(fields)
+                return record
+            pending = self.updates.setdefault(table_name, {})
+            pending.setdefault(record_id, {}).update(fields)
+            if len(pending) >= self.batch_size:
+                self._flush_updates(table_name)
+            return record
+
+    def delete(self, table_name, record_id):
+        with self.lock:
+            self.mirror.delete(table_name, [record_id], commit=False)
+            self.updates.get(table_name, {}).pop(record_id, None)
+            if self.creates.get(table_name, {}).pop(record_id, None) is not None:
+                return {"id": record_id, "deleted": True}
+            pending = self.deletes.setdefault(table_name, [])
+            pending.append(record_id)
+            if len(pending) >= self.batch_size:
+                self._flush_deletes(table_name)
+            return {"id": record_id, "deleted": True}
+
+    def _flush_creates(self, table_name):
+        pending = self.creates.pop(table_name, {})
+        if not pending:
+            return
+        provisional_ids = list(pending)
+        created = self.api.table(self.base_id, table_name).batch_create([pending[key] for key in provisional_ids])
+        # Swap provisional rows for the real records Airtable returned
+        self.mirror.delete(table_name, provisional_ids)
+        self.mirror.upsert(table_name, created)
+
+    def _flush_updates(self, table_name):
+        pending = self.updates.pop(table_name, {})
+        if pending:
+            self.api.table(self.base_id, table_name).batch_update(
+                [{"id": record_id, "fields": fields} for record_id, fields in pending.items()]
+            )
+
+    def _flush_deletes(self, table_name):
+        pending = self.deletes.pop(table_name, [])
+        if pending:
+            self.api.table(self.base_id, table_name).batch_delete(pending)
+
+    def flush(self):
+        """Send every buffered write"""
+        with self.lock:
+            for table_name in list(self.creates):
+                self._flush_creates(table_name)
+            for table_name in list(self.updates):
+                self._flush_updates(table_name)
+            for table_name in list(self.deletes):
+                self._flush_deletes(table_name)
+            self.mirror.commit()
+
+    def pending(self):
+        with self.lock:
+            return sum(len(items) for group in (self.creates, self.updates, self.deletes) for items in group.values())
+
+class MirrorTable:
+    """pyairtable Table lookalike: reads come from the mirror, writes go through the write-back queue"""
+
+    def __init__(self, mirror_api, table_name):
+        self.mirror = mirror_api.mirror
+        self.writes = mirror_api.writes
+        self.name = table_name
+
+    def iterate(self, formula=None, page_size=100, **kwargs):
+        records = self.mirror.select(self.name, formula)
+        for start in range(0, len(records), page_size):
+            yield records[start:start + page_size]
+
+    def all(self, formula=None, **kwargs):
+        return self.mirror.select(self.name, formula)
+
+    def first(self, formula=None, **kwargs):
+        records = self.mirror.select(self.name, formula)
+        return records[0] if records else None
+
+    def get(self, record_id):
+        return self.mirror.get(self.name, record_id)
+
+    def create(self, fields):
+        return self.writes.create(self.name, fields)
+
+    def update(self, record_id, fields):
+        return self.writes.update(self.name, record_id, fields)
+
+    def delete(self, record_id):
+        return self.writes.delete(self.name, record_id)
+
+    def batch_create(self, records):
+        return [self.writes.create(self.name, fields) for fields in records]
+
+    def batch_update(self, records):
+        return [self.writes.update(self.name, record['id'], record['fields']) for record in records]
+
+    def batch_delete(self, record_ids):
+        return [self.writes.delete(self.name, record_id) for record_id in record_ids]
+
+class MirrorApi:
+    """pyairtable Api lookalike serving mirrored tables locally and passing other tables through"""
+
+    def __init__(self, api, base_id, mirror=None):
+        self.api = api
+        self.base_id = base_id
+        self.mirror = mirror or LocalMirror()
+        self.writes = WriteBackQueue(api, base_id, self.mirror)
+        self.tables = {}
+
+    def table(self, base_id, table_name):
+        if base_id != self.base_id or table_name not in MIRRORED_TABLES:
+            return self.api.table(base_id, table_name)
+        if table_name not in self.tables:
+            self.tables[table_name] = MirrorTable(self, table_name)
+        return self.tables[table_name]
+
+    def sync(self, full=False):
+        self.writes.flush()
+        return sync(self.api, self.base_id, self.mirror, full=full)
+
+    def flush(self):
+        self.writes.flush()
+
+_shared = {}
+_shared_lock = threading.Lock()
+
+def mirrored_api(api, base_id):
+    """Return api unchanged, or a shared MirrorApi over it when USE_LOCAL_MIRROR is set"""
+    if not USE_LOCAL_MIRROR:
+        return api
+    with _shared_lock:
+        if 'api' not in _shared:
+            _shared['api'] = MirrorApi(api, base_id)
+            atexit.register(_shared['api'].flush)
+        return _shared['api']
+
+if __name__ == "__main__":
+    from clients import airtable_api
+    from config import AIRTABLE_BASE_ID
+
+    command = sys.argv[1] if len(sys.argv) > 1 else 'sync'
+    mirror = LocalMirror()
+    if command == 'sync':
+        fetched = sync(airtable_api(mirrored=False), AIRTABLE_BASE_ID, mirror, full="--full" in sys.argv)
+        for table_name, count in fetched.items():
+            print(f"{table_name}: {count} records fetched")
+    elif command == 'stats':
+        for table_name, info in mirror.stats().items():
+            print(f"{table_name}: {info['records']} records (synced through {info['watermark'] or 'never'})")
+    elif command == 'clear':
+        mirror.clear()
+        print("Local mirror cleared; the next sync will fetch every record")
+    else:
+        print("Usage: python mirror.py [sync [--full] | stats | clear]")
@@ -0,0 +1,79 @@
+import threading
+import time
+import multiprocessing
+
+class TokenBucket:
+    """Thread-safe token bucket that refills continuously at a fixed rate"""
+    
+    def __init__(self, rate_per_minute, capacity=None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or rate_per_minute
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+    
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+    
+    def acquire(self, amount=1):
+        """Block until `amount` tokens are available, then take them"""
+        # A single request larger than the bucket would otherwise wait forever
+        amount = min(amount, self.capacity)
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                wait_time = (amount - self.tokens) / self.rate
+            time.sleep(wait_time)
+
+class GeminiRateLimiter:
+    """Shared limiter enforcing both requests-per-minute and tokens-per-minute"""
+    
+    def __init__(self, requests_per_minute, tokens_per_minute):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+    
+    def acquire(self, token_count):
+        """Wait for one request slot and `token_count` tokens"""
+        self.requests.acquire(1)
+        self.tokens.acquire(token_count)
+
+class SharedTokenBucket(TokenBucket):
+    """TokenBucket kept in shared memory, so several worker processes draw on one quota.
+
+    Build it in the parent and pass it to workers as they start (e.g. Pool initargs).
+    """
+    
+    def __init__(self, rate_per_minute, capacity=None, context=multiprocessing):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or rate_per_minute
+        # time.monotonic() is system-wide, so every process refills from the same clock
+        self.state = context.RawArray('d', [float(self.capacity), time.monotonic()])
+        self.lock = context.Lock()
+    
+    @property
+    def tokens(self):
+        return self.state[0]
+    
+    @tokens.setter
+    def tokens(self, value):
+        self.state[0] = value
+    
+    @property
+    def updated(self):
+        return self.state[1]
+    
+    @updated.setter
+    def updated(self, value):
+        self.state[1] = value
+
+class SharedGeminiRateLimiter(GeminiRateLimiter):
+    """GeminiRateLimiter whose buckets are shared by every process it is handed to"""
+    
+    def __init__(self, requests_per_minute, tokens_per_minute, context=multiprocessing):
+        self.requests = SharedTokenBucket(requests_per_minute, context=context)
+        self.tokens = SharedTokenBucket(tokens_per_minute, context=context)
@@ -0,0 +1,221 @@
+"""Run the pipeline over several Airtable bases at once, one worker process per base.
+
+Every base shares this project's schema. Each worker sets AIRTABLE_BASE_ID
+(and a per-base PIPELINE_STATE_DIR, LOCAL_MIRROR_DIR and METRICS_DIR, so
+journals, mirrors, dedup indexes and metrics never mix) before it imports the
+pipeline, so the modules' usual `base_id = AIRTABLE_BASE_ID` picks up its
+base. Airtable's 5 requests/second is per base and every worker paces its own
+client, so bases never slow each other down. Gemini's quota belongs to the
+API key instead: all workers draw on one SharedGeminiRateLimiter, so together
+they stay within GEMINI_REQUESTS_PER_MINUTE and GEMINI_TOKENS_PER_MINUTE.
+The LLM evaluation cache is content-keyed and stays shared.
+
+A run takes about as long as its slowest base rather than the sum of all of
+them. Each worker's output goes to run.log in its state directory; the
+runner prints a line per finished base and writes shard_report.json
+(per-base results, stage timings, Airtable and Gemini requests, totals) to
+METRICS_DIR.
+
+    python sharded_runner.py appAAAA appBBBB appCCCC
+    python sharded_runner.py --bases-file bases.txt --workers 4 --streaming
+    python sharded_runner.py --fake-base 400,200,100   # synthetic bases on fake Airtable and Gemini
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import traceback
+import contextlib
+import multiprocessing
+
+# Config (and every pipeline module) is imported inside the worker, after its environment names its base;
+# spawned workers re-import this module, so nothing here may import config at module level
+
+# Set in each worker by _init_worker
+_gemini_limiter = None
+
+def read_bases_file(path):
+    """Base IDs from a file: one per line, optionally followed by a label; # starts a comment"""
+    bases = []
+    with open(path) as f:
+        for line in f:
+            line = line.split('#', 1)[0].strip()
+            if line:
+                bases.append(line.split()[0])
+    return bases
+
+def _init_worker(gemini_limiter):
+    global _gemini_limiter
+    _gemini_limiter = gemini_limiter
+
+def _counter_total(snapshot, name):
+    return sum(sample['value'] for sample in snapshot['counters'].get(name, []))
+
+def _install_fake_base(size, latency, gemini_latency):
+    """Seed a fake base for this worker and point the pipeline at it, paced like a real base"""
+    from airtable_client import ThrottledApi
+    from benchmark_pipeline import generate_applicants, install_fakes
+    from fake_airtable import FakeApi
+    from fake_gemini import FakeGenAI
+
+    fake_api = FakeApi(latency=latency)
+    generate_applicants(fake_api, size)
+    install_fakes(ThrottledApi(fake_api), FakeGenAI(latency=gemini_latency))
+    return fake_api
+
+def run_base(task):
+    """Worker: run the pipeline for one base and return its results, timings and request counts"""
+    base_id = task['base_id']
+    os.environ.update({
+        'AIRTABLE_BASE_ID': base_id,
+        'PIPELINE_STATE_DIR': task['state_dir'],
+        'LOCAL_MIRROR_DIR': task['state_dir'],
+        'METRICS_DIR': task['metrics_dir'],
+    })
+    os.makedirs(task['state_dir'], exist_ok=True)
+    log_path = os.path.join(task['state_dir'], 'run.log')
+    started = time.time()
+    outcome = {"base_id": base_id, "status": "ok", "error": None, "results": None, "log": log_path}
+    fake_api = None
+    with open(log_path, 'w') as log, contextlib.redirect_stdout(log), contextlib.redirect_stderr(log):
+        try:
+            import main
+            import llm_evaluation
+            if task['fake_size'] is not None:
+                fake_api = _install_fake_base(task['fake_size'], task['fake_latency'], task['gemini_latency'])
+            if _gemini_limiter is not None:
+                llm_evaluation.rate_limiter = _gemini_limiter
+            outcome["results"] = main.main(incremental=task['incremental'], streaming=task['streaming'],
+                                           resume=task['resume'])
+        except Exception as e:
+            traceback.print_exc()
+            outcome.update(status="failed", error=f"{type(e).__name__}: {e}")
+    from metrics import metrics
+
+    snapshot = metrics.snapshot()
+    airtable_requests = (sum(fake_api.calls.values()) if fake_api is not None
+                         else _counter_total(snapshot, 'airtable_requests_total'))
+    outcome.update(
+        seconds=round(time.time() - started, 3),
+        stages={name: entry['seconds'] for name, entry in snapshot['stages'].items()},
+        airtable_requests=airtable_requests,
+        gemini_requests=_counter_total(snapshot, 'gemini_requests_total'),
+    )
+    return outcome
+
+def aggregate(outcomes, wall_seconds, workers):
+    """One report over every base: per-base outcomes plus totals and the parallel speedup"""
+    outcomes = sorted(outcomes, key=lambda outcome: outcome['base_id'])
+    totals = {"airtable_requests": sum(outcome['airtable_requests'] for outcome in outcomes),
+              "gemini_requests": sum(outcome['gemini_requests'] for outcome in outcomes)}
+    for outcome in outcomes:
+        for name, value in (outcome['results'] or {}).items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                totals[name] = totals.get(name, 0) + value
+    serial_seconds = sum(outcome['seconds'] for outcome in outcomes)
+    return {
+        "workers": workers,
+        "wall_seconds": round(wall_seconds, 3),
+        "serial_seconds": round(serial_seconds, 3),
+        "slowest_base_seconds": max((outcome['seconds'] for outcome in outcomes), default=0),
+        "speedup": round(serial_seconds / wall_seconds, 2) if wall_seconds else None,
+        "failed": [outcome['base_id'] for outcome in outcomes if outcome['status'] != 'ok'],
+        "totals": totals,
+        "bases": outcomes,
+    }
+
+def run_shards(base_ids, workers=None, incremental=False, streaming=False, resume=False,
+               fake_sizes=None, fake_latency=0.0, gemini_latency=0.0, gemini_quota=None):
+    """Run the pipeline for every base in its own worker process and return the aggregated report.
+
+    fake_sizes seeds one synthetic base per entry instead of using base_ids.
+    gemini_quota overrides (requests_per_minute, tokens_per_minute) for the shared limiter.
+    """
+    from config import (GEMINI_REQUESTS_PER_MINUTE, GEMINI_TOKENS_PER_MINUTE, METRICS_DIR, METRICS_ENABLED,
+                        PIPELINE_STATE_DIR, SHARD_WORKERS)
+    from rate_limiter import SharedGeminiRateLimiter
+
+    if fake_sizes:
+        base_ids = [f"appFAKE{index:02d}x{size}" for index, size in enumerate(fake_sizes, 1)]
+    if not base_ids:
+        raise ValueError("No bases to run")
+    if len(set(base_ids)) != len(base_ids):
+        raise ValueError("Each base may only be listed once")
+    workers = min(workers or SHARD_WORKERS or len(base_ids), len(base_ids))
+    tasks = [{
+        "base_id": base_id,
+        "state_dir": os.path.abspath(os.path.join(PIPELINE_STATE_DIR, 'shards', base_id)),
+        "metrics_dir": os.path.abspath(os.path.join(METRICS_DIR, 'shards', base_id)),
+        "incremental": incremental,
+        "streaming": streaming,
+        "resume": resume,
+        "fake_size": fake_sizes[index] if fake_sizes else None,
+        "fake_latency": fake_latency,
+        "gemini_latency": gemini_latency,
+    } for index, base_id in enumerate(base_ids)]
+
+    # Spawned (not forked) workers start clean, so each imports config with its own base in the environment
+    context = multiprocessing.get_context('spawn')
+    requests_per_minute, tokens_per_minute = gemini_quota or (GEMINI_REQUESTS_PER_MINUTE, GEMINI_TOKENS_PER_MINUTE)
+    gemini_limiter = SharedGeminiRateLimiter(requests_per_minute, tokens_per_minute, context=context)
+    print(f"Running {len(tasks)} bases on {workers} worker processes "
+          f"(shared Gemini quota: {requests_per_minute} requests / {tokens_per_minute} tokens per minute)")
+
+    started = time.time()
+    outcomes = []
+    # One task per process: a worker's modules have its base baked in, so it must not be reused for another
+    with context.Pool(workers, initializer=_init_worker, initargs=(gemini_limiter,), maxtasksperchild=1) as pool:
+        for outcome in pool.imap_unordered(run_base, tasks):
+            outcomes.append(outcome)
+            detail = (", ".join(f"{name} {value}" for name, value in (outcome['results'] or {}).items()
+                                if isinstance(value, (int, float)))
+                      if outcome['status'] == 'ok' else outcome['error'])
+            print(f"{'✓' if outcome['status'] == 'ok' else '✗'} {outcome['base_id']}: {outcome['seconds']:.2f}s | "
+                  f"{detail} | Airtable {outcome['airtable_requests']} / Gemini {outcome['gemini_requests']} requests")
+    report = aggregate(outcomes, time.time() - started, workers)
+
+    print(f"{len(outcomes)} bases in {report['wall_seconds']:.2f}s (slowest base {report['slowest_base_seconds']:.2f}s, "
+          f"{report['serial_seconds']:.2f}s run one after another; {report['speedup']}x)")
+    if report['failed']:
+        print(f"Failed bases: {', '.join(report['failed'])} (see their run.log)")
+    if METRICS_ENABLED:
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        report_path = os.path.join(METRICS_DIR, 'shard_report.json')
+        with open(report_path + '.tmp', 'w') as f:
+            json.dump(report, f, indent=2)
+        os.replace(report_path + '.tmp', report_path)
+        print(f"Shard report written to {report_path}")
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the pipeline for several Airtable bases in parallel")
+    parser.add_argument("bases", nargs="*", help="Airtable base IDs")
+    parser.add_argument("--bases-file", help="file listing base IDs, one per line")
+    parser.add_argument("--workers", type=int, help="worker processes (default SHARD_WORKERS, or one per base)")
+    parser.add_argument("--incremental", action="store_true", help="only process applicants changed since the last run")
+    parser.add_argument("--streaming", action="store_true", help="overlap stages page by page")
+    parser.add_argument("--resume", action="store_true", help="continue each base's interrupted batch run")
+    parser.add_argument("--fake-base", help="comma-separated sizes: run synthetic bases on fake Airtable and Gemini")
+    parser.add_argument("--latency", type=float, default=0.0, help="simulated seconds per fake Airtable request")
+    parser.add_argument("--gemini-latency", type=float, default=0.0, help="simulated seconds per fake Gemini call")
+    parser.add_argument("--gemini-rpm", type=int, help="override the shared Gemini requests-per-minute quota")
+    parser.add_argument("--gemini-tpm", type=int, help="override the shared Gemini tokens-per-minute quota")
+    args = parser.parse_args()
+
+    base_ids = list(args.bases)
+    if args.bases_file:
+        base_ids += read_bases_file(args.bases_file)
+    fake_sizes = [int(size) for size in args.fake_base.split(',')] if args.fake_base else None
+    gemini_quota = None
+    if args.gemini_rpm or args.gemini_tpm:
+        from config import GEMINI_REQUESTS_PER_MINUTE, GEMINI_TOKENS_PER_MINUTE
+        gemini_quota = (args.gemini_rpm or GEMINI_REQUESTS_PER_MINUTE, args.gemini_tpm or GEMINI_TOKENS_PER_MINUTE)
+    elif fake_sizes:
+        # The fake Gemini has no quota of its own; keep the shared limiter out of the way unless asked
+        gemini_quota = (10 ** 9, 10 ** 12)
+    if not base_ids and not fake_sizes:
+        parser.error("give base IDs, --bases-file or --fake-base")
+    report = run_shards(base_ids, args.workers, args.incremental, args.streaming, args.resume,
+                        fake_sizes, args.latency, args.gemini_latency, gemini_quota)
+    sys.exit(1 if report['failed'] else 0)
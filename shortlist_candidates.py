@@ -1,16 +1,23 @@
 import os
+import sys
 import json
-from pyairtable import Api
 from datetime import datetime
-from config import AIRTABLE_ACCESS_TOKEN, AIRTABLE_BASE_ID, APPLICANTS_TABLE, SHORTLISTED_TABLE
-from utils import calculate_experience_years, has_tier1_experience, meets_location_criteria, convert_to_usd, format_currency
+from config import (AIRTABLE_BASE_ID, APPLICANTS_TABLE, SHORTLISTED_TABLE,
+                    MIN_EXPERIENCE_YEARS, MAX_HOURLY_RATE_USD, MIN_AVAILABILITY_HOURS)
+from clients import lazy_airtable_api
+import dedup
+from codec import CodecError, decode
+from journal import SKIPPED, UNCHANGED, stage_run
+from metrics import metrics
+from utils import (calculate_experience_years, has_tier1_experience, meets_location_criteria, convert_to_usd,
+                   format_currency, applicant_key, index_by_applicant)
 
-# Initialize Airtable API
-api = Api(AIRTABLE_ACCESS_TOKEN)
+# Initialize Airtable API (served from the local mirror when USE_LOCAL_MIRROR is set)
+api = lazy_airtable_api()
 base_id = AIRTABLE_BASE_ID
 
-def evaluate_applicant(applicant_id, compressed_json):
-    """Evaluate if applicant meets shortlist criteria"""
+def shortlist_checks(compressed_json):
+    """The values and pass/fail results of each shortlist criterion for a profile"""
     personal_data = compressed_json.get('personal', {})
     experience_data = compressed_json.get('experience', [])
     salary_data = compressed_json.get('salary', {})
@@ -18,7 +25,6 @@ def evaluate_applicant(applicant_id, compressed_json):
     # Experience criteria: ≥4 years OR tier-1 company
     experience_years = calculate_experience_years(experience_data)
     tier1_experience = has_tier1_experience(experience_data)
-    experience_ok = experience_years >= 4 or tier1_experience
     
     # Compensation criteria: Preferred Rate ≤ $100 USD/hour AND Availability ≥ 20 hrs/week
     currency = salary_data.get('currency', 'USD')
@@ -27,17 +33,36 @@ def evaluate_applicant(applicant_id, compressed_json):
     
     # Convert to USD
     usd_rate = convert_to_usd(preferred_rate, currency)
-    compensation_ok = usd_rate <= 100 and availability >= 20
     
     # Location criteria
     location = personal_data.get('location', '')
-    location_ok = meets_location_criteria(location)
+    return {
+        'experience_years': experience_years,
+        'tier1_experience': tier1_experience,
+        'usd_rate': usd_rate,
+        'availability': availability,
+        'location': location,
+        'experience_ok': experience_years >= MIN_EXPERIENCE_YEARS or tier1_experience,
+        'compensation_ok': usd_rate <= MAX_HOURLY_RATE_USD and availability >= MIN_AVAILABILITY_HOURS,
+        'location_ok': meets_location_criteria(location),
+    }
+
+def evaluate_applicant(applicant_id, compressed_json):
+    """Evaluate if applicant meets shortlist criteria"""
+    checks = shortlist_checks(compressed_json)
+    experience_years = checks['experience_years']
+    usd_rate = checks['usd_rate']
+    availability = checks['availability']
+    location = checks['location']
+    experience_ok = checks['experience_ok']
+    compensation_ok = checks['compensation_ok']
+    location_ok = checks['location_ok']
     
     # Generate score reason
     score_reason_parts = []
     
     if experience_ok:
-        if experience_years >= 4:
+        if experience_years >= MIN_EXPERIENCE_YEARS:
             score_reason_parts.append(f"{experience_years:.1f} years of experience")
         else:
             score_reason_parts.append("Worked at tier-1 company")
@@ -47,10 +72,10 @@ def evaluate_applicant(applicant_id, compressed_json):
     if compensation_ok:
         score_reason_parts.append(f"Rate {format_currency(usd_rate)}/hr, {availability} hrs/wk available")
     else:
-        if usd_rate > 100:
-            score_reason_parts.append(f"Rate {format_currency(usd_rate)}/hr exceeds $100 limit")
-        if availability < 20:
-            score_reason_parts.append(f"Only {availability} hrs/wk available (needs 20+)")
+        if usd_rate > MAX_HOURLY_RATE_USD:
+            score_reason_parts.append(f"Rate {format_currency(usd_rate)}/hr exceeds ${MAX_HOURLY_RATE_USD} limit")
+        if availability < MIN_AVAILABILITY_HOURS:
+            score_reason_parts.append(f"Only {availability} hrs/wk available (needs {MIN_AVAILABILITY_HOURS}+)")
     
     if location_ok:
         score_reason_parts.append("Location acceptable")
@@ -59,13 +84,48 @@ def evaluate_applicant(applicant_id, compressed_json):
     
     return all([experience_ok, compensation_ok, location_ok]), " | ".join(score_reason_parts)
 
-def shortlist_applicants():
-    """Evaluate all applicants and shortlist those who meet criteria"""
-    applicants = api.table(base_id, APPLICANTS_TABLE).all()
+@metrics.timed_stage('shortlist')
+def shortlist_applicants(resume=False):
+    """Evaluate all applicants and shortlist those who meet criteria.
+
+    Progress is journaled; resume=True continues an interrupted run (see journal.py).
+    """
+    run = stage_run('shortlist', resume, api, base_id)
+    applicants_table = api.table(base_id, APPLICANTS_TABLE)
+    leads_table = api.table(base_id, SHORTLISTED_TABLE)
+    applicants = applicants_table.all()
     shortlisted_count = 0
     
+    # Prefetch existing leads once instead of querying per shortlisted applicant
+    record_map = {a['id']: applicant_key(a['fields'].get('Applicant ID')) for a in applicants}
+    existing_leads = set(index_by_applicant(leads_table.all(), record_map, field='Applicant'))
+    # Duplicates identical to their canonical applicant reuse its lead instead of getting a second one (see dedup.py)
+    duplicate_of = dedup.duplicates()
+    by_key = {record_map[a['id']]: a for a in applicants}
+    
+    def same_as_canonical(lead_key, compressed_data):
+        canonical = by_key.get(duplicate_of.get(lead_key))
+        if canonical is None or not canonical['fields'].get('Compressed JSON'):
+            return False
+        try:
+            return dedup.same_profile(compressed_data, decode(canonical['fields']['Compressed JSON']))
+        except CodecError:
+            return False
+    
+    status_updates = []
+    new_leads = []
+    # Applicant behind each write, for the journal
+    status_owners = []
+    lead_owners = []
+    unchanged = []
+    invalid = []
+    skipped_writes = 0
+    
     for applicant in applicants:
         applicant_id = applicant['fields'].get('Applicant ID')
+        lead_key = applicant_key(applicant_id)
+        if run.skip(lead_key):
+            continue
         compressed_json_str = applicant['fields'].get('Compressed JSON', '{}')
         
         if not compressed_json_str:
@@ -73,42 +133,62 @@ def shortlist_applicants():
             continue
             
         try:
-            compressed_data = json.loads(compressed_json_str)
-        except json.JSONDecodeError:
+            compressed_data = decode(compressed_json_str)
+        except CodecError:
             print(f"Skipping applicant {applicant_id} - invalid JSON")
+            invalid.append(lead_key)
             continue
             
+        writes = len(status_updates) + len(new_leads)
         should_shortlist, score_reason = evaluate_applicant(applicant_id, compressed_data)
         
-        # Update shortlist status
-        api.table(base_id, APPLICANTS_TABLE).update(applicant['id'], {
-            "Shortlist Status": "Shortlisted" if should_shortlist else "Rejected"
-        })
+        # Update shortlist status only when it actually changes
+        status = "Shortlisted" if should_shortlist else "Rejected"
+        if applicant['fields'].get('Shortlist Status') == status:
+            skipped_writes += 1
+        else:
+            status_updates.append({"id": applicant['id'], "fields": {"Shortlist Status": status}})
+            status_owners.append(lead_key)
         
         # Create Shortlisted Leads record if applicable
         if should_shortlist:
-            # Check if already exists
-            existing_records = api.table(base_id, SHORTLISTED_TABLE).all(
-                formula=f"{{Applicant}} = '{applicant_id}'"
-            )
-            
-            if not existing_records:
-                api.table(base_id, SHORTLISTED_TABLE).create({
+            if duplicate_of.get(lead_key) in existing_leads and same_as_canonical(lead_key, compressed_data):
+                skipped_writes += 1
+                metrics.increment('dedup_reused_total', stage='shortlist')
+                print(f"Applicant {applicant_id} is a duplicate of already shortlisted applicant {duplicate_of[lead_key]}")
+            elif lead_key not in existing_leads:
+                new_leads.append({
                     "Applicant": applicant_id,
                     "Compressed JSON": compressed_json_str,
                     "Score Reason": score_reason,
                     "Created At": datetime.now().isoformat()
                 })
+                lead_owners.append(lead_key)
+                existing_leads.add(lead_key)
                 print(f"✓ Shortlisted applicant {applicant_id}")
                 shortlisted_count += 1
             else:
+                skipped_writes += 1
                 print(f"Applicant {applicant_id} already shortlisted")
         else:
             print(f"✗ Rejected applicant {applicant_id}: {score_reason}")
+        if len(status_updates) + len(new_leads) == writes:
+            unchanged.append(lead_key)
+    
+    run.mark(unchanged, UNCHANGED)
+    run.mark(invalid, SKIPPED)
+    # Journal every write before sending any, so an applicant is only done once both of its writes land
+    entries = (run.log(APPLICANTS_TABLE, 'batch_update', status_updates, status_owners)
+               + run.log(SHORTLISTED_TABLE, 'batch_create', new_leads, lead_owners))
+    write_calls = run.send(api, base_id, entries)
+    run.finish()
     
+    print(f"Shortlist writes: {len(status_updates) + len(new_leads)} records sent in {write_calls} batch calls, "
+          f"{skipped_writes} unchanged writes skipped")
     return shortlisted_count
 
 if __name__ == "__main__":
     print("Starting shortlist evaluation...")
-    count = shortlist_applicants()
-    print(f"Shortlisting completed! {count} applicants shortlisted.")
\ No newline at end of file
+    count = shortlist_applicants(resume="--resume" in sys.argv)
+    print(f"Shortlisting completed! {count} applicants shortlisted.")
+    metrics.write_outputs()
\ No newline at end of file
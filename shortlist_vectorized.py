@@ -0,0 +1,198 @@
+import json
+import argparse
+import numpy as np
+from config import (APPLICANTS_TABLE, CURRENCY_RATES, MIN_EXPERIENCE_YEARS, MAX_HOURLY_RATE_USD,
+                    MIN_AVAILABILITY_HOURS)
+from codec import CodecError, decode
+from utils import calculate_experience_years_batch, has_tier1_experience, meets_location_criteria, format_currency
+
+# Rows evaluated at once during a sweep, bounding the (rows x thresholds) mask size
+SWEEP_CHUNK_ROWS = 50000
+
+class ProfileColumns:
+    """Compressed JSON profiles loaded into column arrays for vectorized rule evaluation"""
+
+    def __init__(self, applicant_ids, experience_years, tier1, usd_rate, availability, location_code,
+                 location_ok_by_code, locations, availability_raw):
+        self.applicant_ids = applicant_ids
+        self.experience_years = experience_years
+        self.tier1 = tier1
+        self.usd_rate = usd_rate
+        self.availability = availability
+        self.location_code = location_code
+        self.location_ok = location_ok_by_code[location_code]
+        # Original values, kept only for rendering Score Reason text exactly like the scalar path
+        self.locations = locations
+        self.availability_raw = availability_raw
+
+    def __len__(self):
+        return len(self.applicant_ids)
+
+def load_columns(profiles):
+    """Build ProfileColumns from (applicant_id, compressed_json) pairs; JSON may be a dict or a string"""
+    applicant_ids = []
+    experience_lists = []
+    tier1 = []
+    preferred_rates = []
+    currency_rates = []
+    availability_raw = []
+    location_codes = []
+    locations = []
+    code_by_location = {}
+
+    for applicant_id, compressed_json in profiles:
+        if isinstance(compressed_json, str):
+            compressed_json = decode(compressed_json)
+        personal_data = compressed_json.get('personal', {})
+        experience_data = compressed_json.get('experience', [])
+        salary_data = compressed_json.get('salary', {})
+
+        applicant_ids.append(applicant_id)
+        experience_lists.append(experience_data)
+        tier1.append(has_tier1_experience(experience_data))
+        preferred_rates.append(salary_data.get('preferred_rate', 0))
+        currency_rates.append(CURRENCY_RATES.get(salary_data.get('currency', 'USD'), 1))
+        availability_raw.append(salary_data.get('availability', 0))
+
+        # Locations repeat heavily, so each distinct string is matched only once
+        location = personal_data.get('location', '')
+        if location not in code_by_location:
+            code_by_location[location] = len(locations)
+            locations.append(location)
+        location_codes.append(code_by_location[location])
+
+    location_ok_by_code = np.array([meets_location_criteria(location) for location in locations], dtype=bool)
+    return ProfileColumns(
+        applicant_ids=applicant_ids,
+        experience_years=np.array(calculate_experience_years_batch(experience_lists), dtype=np.float64),
+        tier1=np.array(tier1, dtype=bool),
+        usd_rate=np.array(preferred_rates, dtype=np.float64) * np.array(currency_rates, dtype=np.float64),
+        availability=np.array(availability_raw, dtype=np.float64),
+        location_code=np.array(location_codes, dtype=np.int64),
+        location_ok_by_code=location_ok_by_code if len(locations) else np.zeros(0, dtype=bool),
+        locations=locations,
+        availability_raw=availability_raw
+    )
+
+def evaluate_masks(columns, min_years=MIN_EXPERIENCE_YEARS, rate_cap=MAX_HOURLY_RATE_USD,
+                   min_availability=MIN_AVAILABILITY_HOURS):
+    """Evaluate the shortlist rules for every profile at once, returning a dict of boolean masks"""
+    experience_ok = (columns.experience_years >= min_years) | columns.tier1
+    rate_ok = columns.usd_rate <= rate_cap
+    availability_ok = columns.availability >= min_availability
+    compensation_ok = rate_ok & availability_ok
+    return {
+        "experience_ok": experience_ok,
+        "compensation_ok": compensation_ok,
+        "rate_ok": rate_ok,
+        "availability_ok": availability_ok,
+        "location_ok": columns.location_ok,
+        "shortlisted": experience_ok & compensation_ok & columns.location_ok
+    }
+
+def score_reason(columns, masks, row, min_years=MIN_EXPERIENCE_YEARS, rate_cap=MAX_HOURLY_RATE_USD,
+                 min_availability=MIN_AVAILABILITY_HOURS):
+    """Render the Score Reason for one row, matching shortlist_candidates.evaluate_applicant"""
+    parts = []
+    experience_years = columns.experience_years[row]
+    usd_rate = float(columns.usd_rate[row])
+    availability = columns.availability_raw[row]
+
+    if masks["experience_ok"][row]:
+        if experience_years >= min_years:
+            parts.append(f"{experience_years:.1f} years of experience")
+        else:
+            parts.append("Worked at tier-1 company")
+    else:
+        parts.append("Insufficient experience")
+
+    if masks["compensation_ok"][row]:
+        parts.append(f"Rate {format_currency(usd_rate)}/hr, {availability} hrs/wk available")
+    else:
+        if not masks["rate_ok"][row]:
+            parts.append(f"Rate {format_currency(usd_rate)}/hr exceeds ${rate_cap} limit")
+        if not masks["availability_ok"][row]:
+            parts.append(f"Only {availability} hrs/wk available (needs {min_availability}+)")
+
+    if masks["location_ok"][row]:
+        parts.append("Location acceptable")
+    else:
+        parts.append(f"Location '{columns.locations[columns.location_code[row]]}' not in target regions")
+
+    return " | ".join(parts)
+
+def evaluate_all(columns, with_reasons=True, **thresholds):
+    """Return [(applicant_id, should_shortlist, score_reason)] like evaluate_applicant for each profile"""
+    masks = evaluate_masks(columns, **thresholds)
+    shortlisted = masks["shortlisted"]
+    return [
+        (
+            applicant_id,
+            bool(shortlisted[row]),
+            score_reason(columns, masks, row, **thresholds) if with_reasons else None
+        )
+        for row, applicant_id in enumerate(columns.applicant_ids)
+    ]
+
+def sweep(columns, min_years=(MIN_EXPERIENCE_YEARS,), rate_caps=(MAX_HOURLY_RATE_USD,),
+          min_availability=(MIN_AVAILABILITY_HOURS,)):
+    """Count shortlisted profiles for every combination of threshold values in one pass.
+
+    Returns an int array of shape (len(min_years), len(rate_caps),
+    len(min_availability)) where counts[i, j, k] is the number of
+    applicants shortlisted with min_years[i], rate_caps[j] and
+    min_availability[k].
+    """
+    min_years = np.asarray(min_years, dtype=np.float64)
+    rate_caps = np.asarray(rate_caps, dtype=np.float64)
+    min_availability = np.asarray(min_availability, dtype=np.float64)
+    counts = np.zeros((len(min_years), len(rate_caps), len(min_availability)), dtype=np.int64)
+
+    for start in range(0, len(columns), SWEEP_CHUNK_ROWS):
+        rows = slice(start, start + SWEEP_CHUNK_ROWS)
+        # Location is threshold-independent, so drop ineligible rows before broadcasting
+        eligible = columns.location_ok[rows]
+        years = columns.experience_years[rows][eligible]
+        tier1 = columns.tier1[rows][eligible]
+        usd_rate = columns.usd_rate[rows][eligible]
+        availability = columns.availability[rows][eligible]
+
+        experience_ok = (years[:, None] >= min_years[None, :]) | tier1[:, None]      # (n, Y)
+        rate_ok = usd_rate[:, None] <= rate_caps[None, :]                           # (n, R)
+        availability_ok = availability[:, None] >= min_availability[None, :]        # (n, A)
+        counts += np.einsum(
+            'ny,nr,na->yra',
+            experience_ok.astype(np.int64), rate_ok.astype(np.int64), availability_ok.astype(np.int64)
+        )
+    return counts
+
+def load_columns_from_airtable():
+    """Load every applicant's compressed JSON from Airtable into columns"""
+    import shortlist_candidates
+    records = shortlist_candidates.api.table(shortlist_candidates.base_id, APPLICANTS_TABLE).all()
+    profiles = []
+    for record in records:
+        compressed_json_str = record['fields'].get('Compressed JSON')
+        if not compressed_json_str:
+            continue
+        try:
+            profiles.append((record['fields'].get('Applicant ID'), decode(compressed_json_str)))
+        except CodecError:
+            continue
+    return load_columns(profiles)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="What-if analysis of shortlist thresholds")
+    parser.add_argument("--min-years", type=float, nargs="+", default=[MIN_EXPERIENCE_YEARS])
+    parser.add_argument("--rate-caps", type=float, nargs="+", default=[MAX_HOURLY_RATE_USD])
+    parser.add_argument("--min-availability", type=float, nargs="+", default=[MIN_AVAILABILITY_HOURS])
+    args = parser.parse_args()
+
+    columns = load_columns_from_airtable()
+    counts = sweep(columns, args.min_years, args.rate_caps, args.min_availability)
+    print(f"{len(columns)} profiles loaded")
+    for i, years in enumerate(args.min_years):
+        for j, rate_cap in enumerate(args.rate_caps):
+            for k, availability in enumerate(args.min_availability):
+                print(f"min {years:g} yrs | rate cap ${rate_cap:g} | min {availability:g} hrs/wk: "
+                      f"{counts[i, j, k]} shortlisted")
@@ -1,43 +1,122 @@
+import re
 import json
-from datetime import datetime
-from config import CURRENCY_RATES, ELIGIBLE_COUNTRIES, TIER_1_COMPANIES
+import hashlib
+from datetime import date, datetime, timezone
+from functools import lru_cache
+from config import BATCH_SIZE, CURRENCY_RATES
+from matchers import match_company, match_location
+from metrics import metrics
 
-def calculate_experience_years(experience_data):
-    """Calculate total years of experience from experience data"""
-    total_years = 0
-    
+_MONTHS = {
+    name: number
+    for number, names in enumerate([
+        ('jan', 'january'), ('feb', 'february'), ('mar', 'march'), ('apr', 'april'), ('may',),
+        ('jun', 'june'), ('jul', 'july'), ('aug', 'august'), ('sep', 'sept', 'september'),
+        ('oct', 'october'), ('nov', 'november'), ('dec', 'december')
+    ], start=1)
+    for name in names
+}
+_ONGOING = {'present', 'current', 'now', 'ongoing', 'today'}
+_NUMERIC_DATE = re.compile(r"^(\d{4})(?:[-/.](\d{1,2})(?:[-/.](\d{1,2}))?)?(?:[t ].*)?$")
+_MONTH_FIRST_DATE = re.compile(r"^(\d{1,2})[-/.](\d{4})$")
+_NAMED_MONTH_DATE = re.compile(r"^([a-z]+)\.?,?\s+(\d{4})$")
+
+# Returned by parse_date_ordinal for "Present" and friends; resolved to today's ordinal by the caller
+ONGOING = -1
+
+@lru_cache(maxsize=65536)
+def parse_date_ordinal(value):
+    """Parse a date string into a proleptic Gregorian ordinal.
+
+    Accepts ISO dates and timestamps (2020-03-15, 2020-03-15T00:00:00Z),
+    year-month (2020-03, 03/2020), month names (Mar 2020, March 2020)
+    and a bare year. Dates without a day use the 1st. Returns ONGOING for
+    "Present"/"Current" and None for anything unparseable.
+    """
+    text = value.strip().lower()
+    if text in _ONGOING:
+        return ONGOING
+    try:
+        match = _NUMERIC_DATE.match(text)
+        if match:
+            year, month, day = match.groups()
+            return date(int(year), int(month or 1), int(day or 1)).toordinal()
+        match = _MONTH_FIRST_DATE.match(text)
+        if match:
+            return date(int(match.group(2)), int(match.group(1)), 1).toordinal()
+        match = _NAMED_MONTH_DATE.match(text)
+        if match and match.group(1) in _MONTHS:
+            return date(int(match.group(2)), _MONTHS[match.group(1)], 1).toordinal()
+    except ValueError:
+        pass
+    return None
+
+metrics.register_cache('parse_date', parse_date_ordinal.cache_info)
+
+def experience_intervals(experience_data, today_ordinal):
+    """Return (start, end) ordinal pairs for each job with a usable date range.
+
+    A missing or "Present" end date counts up to today_ordinal.
+    """
+    intervals = []
     for job in experience_data:
-        start_str = job.get('start', '')
-        end_str = job.get('end', '')
-        
-        if start_str and end_str:
-            try:
-                start_date = datetime.strptime(start_str, '%Y-%m-%d')
-                end_date = datetime.strptime(end_str, '%Y-%m-%d')
-                years = (end_date - start_date).days / 365.25
-                total_years += years
-            except ValueError:
-                # Handle different date formats if needed
-                continue
-    
-    return total_years
+        start_str = job.get('start') or ''
+        if not start_str:
+            continue
+        start = parse_date_ordinal(start_str)
+        end = parse_date_ordinal(job.get('end') or 'present')
+        if start is None or start == ONGOING or end is None:
+            continue
+        if end == ONGOING:
+            end = today_ordinal
+        if end > start:
+            intervals.append((start, end))
+    return intervals
+
+def merged_days(intervals):
+    """Total days covered by the intervals, counting overlapping spans once"""
+    total = 0
+    current_start = current_end = None
+    for start, end in sorted(intervals):
+        if current_end is None or start > current_end:
+            if current_end is not None:
+                total += current_end - current_start
+            current_start, current_end = start, end
+        elif end > current_end:
+            current_end = end
+    if current_end is not None:
+        total += current_end - current_start
+    return total
+
+def calculate_experience_years(experience_data, today=None):
+    """Calculate distinct years of experience; overlapping jobs are counted once"""
+    today_ordinal = (today or date.today()).toordinal()
+    return merged_days(experience_intervals(experience_data, today_ordinal)) / 365.25
+
+def calculate_experience_years_batch(experience_lists, today=None):
+    """calculate_experience_years for many applicants, returning a list in the same order"""
+    today_ordinal = (today or date.today()).toordinal()
+    return [merged_days(experience_intervals(experience_data, today_ordinal)) / 365.25
+            for experience_data in experience_lists]
+
+def tier1_company_match(experience_data):
+    """Return the MatchResult for the first tier-1 company in the experience data, or None"""
+    for job in experience_data:
+        result = match_company(job.get('company', '') or '')
+        if result:
+            return result
+    return None
 
 def has_tier1_experience(experience_data):
     """Check if applicant worked at a tier-1 company"""
-    for job in experience_data:
-        company = job.get('company', '').lower()
-        for tier1_company in TIER_1_COMPANIES:
-            if tier1_company.lower() in company:
-                return True
-    return False
+    return tier1_company_match(experience_data) is not None
 
 def meets_location_criteria(location):
     """Check if location is in allowed countries"""
     if not location:
         return False
     
-    location_lower = location.lower()
-    return any(country in location_lower for country in ELIGIBLE_COUNTRIES)
+    return match_location(location) is not None
 
 def convert_to_usd(amount, currency):
     """Convert amount to USD using conversion rates"""
@@ -66,4 +145,70 @@ def format_currency(amount, currency='USD'):
         'INR': '₹'
     }
     symbol = symbols.get(currency, '$')
-    return f"{symbol}{amount:,.2f}"
\ No newline at end of file
+    return f"{symbol}{amount:,.2f}"
+
+def chunked(items, size=BATCH_SIZE):
+    """Split a list into chunks of at most `size` items (Airtable batch limit)"""
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+def content_hash(compressed_json):
+    """Hash a compressed JSON profile independent of key order and whitespace"""
+    canonical = json.dumps(compressed_json, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+def applicant_key(value, record_map=None):
+    """Normalize an Applicant ID field value (text, number or linked record) to a string key"""
+    if isinstance(value, list):
+        if not value:
+            return None
+        value = value[0]
+        # Linked record fields return record IDs instead of the Applicant ID
+        if record_map and value in record_map:
+            return record_map[value]
+    if value is None or value == '':
+        return None
+    return str(value)
+
+def applicant_id_formula(applicant_ids, field='Applicant ID'):
+    """Build an Airtable formula matching any of the given applicant IDs"""
+    clauses = [f"{{{field}}} = '{applicant_id}'" for applicant_id in applicant_ids]
+    if len(clauses) == 1:
+        return clauses[0]
+    return f"OR({', '.join(clauses)})"
+
+def modified_since_formula(since):
+    """Airtable formula selecting records modified after an ISO timestamp"""
+    return f"IS_AFTER(LAST_MODIFIED_TIME(), '{since}')"
+
+def index_by_applicant(records, record_map=None, field='Applicant ID'):
+    """Group records by the applicant they belong to"""
+    index = {}
+    for record in records:
+        key = applicant_key(record['fields'].get(field), record_map)
+        if key is not None:
+            index.setdefault(key, []).append(record)
+    return index
+
+
+_EQUALS_CLAUSE = re.compile(r"\{([^}]+)\}\s*=\s*'([^']*)'")
+_MODIFIED_AFTER = re.compile(r"^IS_AFTER\(LAST_MODIFIED_TIME\(\),\s*'([^']+)'\)$")
+
+def parse_simple_formula(formula):
+    """Parse the formulas this project sends to Airtable.
+
+    Supports {Field} = 'value', OR(...) of such clauses and
+    IS_AFTER(LAST_MODIFIED_TIME(), '<ISO timestamp>'). Returns
+    ('equals', [(field, value), ...]) or ('modified_after', epoch_seconds).
+    """
+    formula = formula.strip()
+    match = _MODIFIED_AFTER.match(formula)
+    if match:
+        timestamp = datetime.strptime(match.group(1), '%Y-%m-%dT%H:%M:%S.%fZ').replace(tzinfo=timezone.utc)
+        return 'modified_after', timestamp.timestamp()
+    
+    clauses = _EQUALS_CLAUSE.findall(formula)
+    body = formula[3:-1] if formula.startswith('OR(') and formula.endswith(')') else formula
+    if not clauses or _EQUALS_CLAUSE.sub('', body).replace(',', '').strip():
+        raise ValueError(f"Unsupported formula: {formula}")
+    return 'equals', clauses
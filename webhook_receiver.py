@@ -0,0 +1,454 @@
+"""Event-driven processing of single applicants from Airtable webhooks.
+
+A small HTTP server receives webhook deliveries and processes just the
+applicants they mention, so a new submission is scored within seconds and
+API usage follows the number of submissions rather than the size of the
+base. It accepts three kinds of body:
+
+* `{"applicant_id": "17"}` or `{"applicant_ids": [...]}`, e.g. from an
+  Airtable automation's "Send webhook" or script action;
+* webhook payloads in Airtable's format (`{"payloads": [...]}` as returned by
+  the list-payloads endpoint, or a single payload with `changedTablesById`);
+* Airtable's notification ping (`{"base": ..., "webhook": ...}`), on which
+  the new payloads are fetched from the webhook, resuming from the cursor
+  stored in the pipeline state.
+
+The three forms of one submission arrive as separate events, so events are
+debounced per Applicant ID: an applicant is processed WEBHOOK_DEBOUNCE_SECONDS
+after its last event (or WEBHOOK_MAX_DELAY_SECONDS after its first). Changes
+made through the API (our own writes) are ignored, and processing is
+idempotent, so a repeated event costs a few reads and no writes.
+
+    python webhook_receiver.py serve [--port 8787]
+    python webhook_receiver.py replay payloads.jsonl          # feed recorded deliveries through the debouncer
+    python webhook_receiver.py replay --fake-base 10000 --submissions 50 --debounce 0.2
+"""
+import sys
+import hmac
+import json
+import time
+import base64
+import hashlib
+import argparse
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from config import (AIRTABLE_BASE_ID, APPLICANTS_TABLE, PERSONAL_TABLE, EXPERIENCE_TABLE, SALARY_TABLE,
+                    SHORTLISTED_TABLE, PIPELINE_STATE_DIR, WEBHOOK_HOST, WEBHOOK_PORT,
+                    WEBHOOK_DEBOUNCE_SECONDS, WEBHOOK_MAX_DELAY_SECONDS, WEBHOOK_WORKERS, WEBHOOK_SECRET,
+                    WEBHOOK_IGNORED_SOURCES)
+from clients import lazy_airtable_api
+import dedup
+from codec import CodecError, decode, encode
+from compress_json import get_applicant_data
+from metrics import metrics
+from utils import applicant_key, applicant_id_formula
+
+# Always live: an event means Airtable has data the local mirror has not seen yet
+api = lazy_airtable_api(mirrored=False)
+base_id = AIRTABLE_BASE_ID
+
+class Debouncer:
+    """Collapses bursts of events per key and runs handler(key) once each burst settles.
+
+    A key is handled `delay` seconds after its latest event, or `max_delay`
+    after its first, whichever is sooner. Handlers run on a pool of
+    `workers` threads, never twice at once for the same key; events that
+    arrive while a key is being handled schedule it again.
+    """
+
+    def __init__(self, handler, delay=WEBHOOK_DEBOUNCE_SECONDS, max_delay=WEBHOOK_MAX_DELAY_SECONDS,
+                 workers=WEBHOOK_WORKERS):
+        self.handler = handler
+        self.delay = delay
+        self.max_delay = max_delay
+        self.pending = {}
+        self.running = set()
+        self.condition = threading.Condition()
+        self.executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='webhook')
+        self.closed = False
+        self.thread = threading.Thread(target=self._loop, name='webhook-debouncer', daemon=True)
+        self.thread.start()
+
+    def submit(self, key):
+        now = time.monotonic()
+        with self.condition:
+            first_seen, _, events = self.pending.get(key, (now, None, 0))
+            due = min(now + self.delay, first_seen + self.max_delay)
+            self.pending[key] = (first_seen, due, events + 1)
+            self.condition.notify()
+        if events:
+            metrics.increment('webhook_debounced_events_total')
+
+    def _next_due(self):
+        """Keys ready to run, and how long until the next one is (None when idle)"""
+        now = time.monotonic()
+        ready, wait = [], None
+        for key, (first_seen, due, events) in self.pending.items():
+            if key in self.running:
+                continue
+            if due <= now:
+                ready.append((key, first_seen))
+            else:
+                wait = due - now if wait is None else min(wait, due - now)
+        return ready, wait
+
+    def _loop(self):
+        while True:
+            with self.condition:
+                ready, wait = self._next_due()
+                while not ready and not self.closed:
+                    self.condition.wait(wait)
+                    ready, wait = self._next_due()
+                if self.closed and not ready:
+                    return
+                for key, _ in ready:
+                    del self.pending[key]
+                    self.running.add(key)
+            for key, first_seen in ready:
+                self.executor.submit(self._run, key, first_seen)
+
+    def _run(self, key, first_seen):
+        try:
+            self.handler(key)
+        except Exception as e:
+            print(f"Processing applicant {key} failed: {e}")
+            metrics.increment('webhook_applicants_total', result='error')
+        finally:
+            metrics.observe('webhook_event_to_result_seconds', time.monotonic() - first_seen)
+            with self.condition:
+                self.running.discard(key)
+                self.condition.notify_all()
+
+    def idle(self):
+        with self.condition:
+            return not self.pending and not self.running
+
+    def drain(self, timeout=None):
+        """Wait until every submitted key has been handled; returns False on timeout"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.condition:
+            while self.pending or self.running:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self.condition.wait(remaining)
+        return True
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        self.thread.join()
+        self.executor.shutdown(wait=True)
+
+def submission_complete(profile):
+    """True once all three forms of a submission have arrived"""
+    personal = profile['personal']
+    return bool(personal.get('name') or personal.get('email')) and bool(profile['experience']) \
+        and bool(profile['salary'].get('preferred_rate'))
+
+# Created on first use, so the LLM_EVALUATE policy and LLM_MAX_* budget span the receiver's lifetime
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+def evaluation_scheduler():
+    """The receiver's shared EvaluationScheduler"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            from llm_scheduler import EvaluationScheduler
+            _scheduler = EvaluationScheduler()
+        return _scheduler
+
+def process_applicant(applicant_id):
+    """Compress, shortlist and evaluate one applicant, writing the Applicants record once.
+
+    Returns what was done: 'not_found', 'incomplete', 'unchanged' or 'updated'.
+    Applicants the budget cannot cover keep their fields for the next batch run.
+    """
+    from incremental import existing_shortlisted_ids
+    from llm_evaluation import evaluate_profile, llm_result_fields
+    from llm_scheduler import BudgetExhausted
+    from shortlist_candidates import evaluate_applicant
+
+    applicants = api.table(base_id, APPLICANTS_TABLE)
+    records = applicants.all(formula=applicant_id_formula([applicant_id]))
+    if not records:
+        print(f"Applicant {applicant_id} not found")
+        return 'not_found'
+    record = records[0]
+    profile = get_applicant_data(applicant_id)
+
+    try:
+        stored = decode(record['fields']['Compressed JSON']) if record['fields'].get('Compressed JSON') else None
+    except CodecError:
+        stored = None
+    fields = {}
+    if stored != profile:
+        fields["Compressed JSON"] = encode(profile)
+        fields.update(dedup.link_profiles([(applicant_key(applicant_id), profile)]).get(applicant_key(applicant_id), {}))
+
+    if not submission_complete(profile):
+        # Keep what has arrived; shortlisting and evaluation wait for the remaining forms
+        if fields:
+            applicants.update(record['id'], fields)
+        metrics.increment('webhook_applicants_total', result='incomplete')
+        print(f"Applicant {applicant_id}: waiting for the remaining forms")
+        return 'incomplete'
+
+    should_shortlist, score_reason = evaluate_applicant(applicant_id, profile)
+    status = "Shortlisted" if should_shortlist else "Rejected"
+    if record['fields'].get('Shortlist Status') != status:
+        fields["Shortlist Status"] = status
+        record['fields']['Shortlist Status'] = status
+    if should_shortlist and not existing_shortlisted_ids([applicant_id]):
+        api.table(base_id, SHORTLISTED_TABLE).create({
+            "Applicant": record['fields'].get('Applicant ID'),
+            "Compressed JSON": fields.get("Compressed JSON") or record['fields']['Compressed JSON'],
+            "Score Reason": score_reason,
+            "Created At": datetime.now().isoformat()
+        })
+        print(f"✓ Shortlisted applicant {applicant_id}")
+
+    scheduler = evaluation_scheduler()
+    if ("Compressed JSON" in fields or not record['fields'].get('LLM Summary')) and scheduler.admit(record):
+        try:
+            parsed = evaluate_profile(profile, budget=scheduler.account(record))
+        except BudgetExhausted:
+            scheduler.left_by_budget(record)
+        else:
+            if parsed:
+                fields.update(llm_result_fields(parsed))
+                scheduler.evaluated(record)
+            else:
+                print(f"Failed to get LLM response for applicant {applicant_id}")
+
+    if not fields:
+        metrics.increment('webhook_applicants_total', result='unchanged')
+        return 'unchanged'
+    applicants.update(record['id'], fields)
+    metrics.increment('webhook_applicants_total', result='updated')
+    print(f"✓ Processed applicant {applicant_id} ({status})")
+    return 'updated'
+
+def payload_record_ids(payload):
+    """{table: [record IDs]} created or changed by one Airtable webhook payload (a dict in the API's format)"""
+    source = (payload.get('actionMetadata') or {}).get('source')
+    if source in WEBHOOK_IGNORED_SOURCES:
+        return {}
+    changed = {}
+    for table, changes in (payload.get('changedTablesById') or {}).items():
+        record_ids = list(changes.get('createdRecordsById') or {}) + list(changes.get('changedRecordsById') or {})
+        if record_ids:
+            changed.setdefault(table, []).extend(record_ids)
+    return changed
+
+def _sdk_payload_record_ids(payload):
+    """payload_record_ids for pyairtable's WebhookPayload model"""
+    source = getattr(payload.action_metadata, 'source', None) if payload.action_metadata else None
+    if source in WEBHOOK_IGNORED_SOURCES:
+        return {}
+    return {table: list(changes.created_records_by_id) + list(changes.changed_records_by_id)
+            for table, changes in (payload.changed_tables_by_id or {}).items()}
+
+def applicant_ids_for_records(changed):
+    """Resolve changed records (in Applicants or a child table) to their Applicant IDs"""
+    applicant_ids = set()
+    for table, record_ids in changed.items():
+        for record_id in dict.fromkeys(record_ids):
+            value = api.table(base_id, table).get(record_id)['fields'].get('Applicant ID')
+            # Child tables may link to the Applicants record instead of holding the ID
+            if isinstance(value, list) and value and str(value[0]).startswith('rec'):
+                value = api.table(base_id, APPLICANTS_TABLE).get(value[0])['fields'].get('Applicant ID')
+            key = applicant_key(value)
+            if key is not None:
+                applicant_ids.add(key)
+    return applicant_ids
+
+class WebhookReceiver:
+    """Turns webhook bodies into debounced per-applicant processing"""
+
+    def __init__(self, debouncer=None, secret=WEBHOOK_SECRET, state_dir=PIPELINE_STATE_DIR):
+        self.debouncer = debouncer or Debouncer(process_applicant)
+        self.secret = secret
+        self.state_dir = state_dir
+        self.cursor_lock = threading.Lock()
+
+    def verify(self, body, signature):
+        """Check Airtable's X-Airtable-Content-MAC header when a MAC secret is configured"""
+        if not self.secret:
+            return True
+        expected = hmac.new(base64.b64decode(self.secret), body, hashlib.sha256).hexdigest()
+        return hmac.compare_digest(f"hmac-sha256={expected}", signature or '')
+
+    def _fetch_payloads(self, webhook_id):
+        """Changed records from the webhook's payloads since the stored cursor"""
+        from incremental import PipelineState
+
+        changed = {}
+        with self.cursor_lock:
+            state = PipelineState(self.state_dir)
+            name = f'webhook_cursor:{webhook_id}'
+            cursor = int(state.get_watermark(name) or 1)
+            webhook = api.base(base_id).webhook(webhook_id)
+            for payload in webhook.payloads(cursor=cursor):
+                for table, record_ids in _sdk_payload_record_ids(payload).items():
+                    changed.setdefault(table, []).extend(record_ids)
+                cursor = payload.cursor + 1
+            state.set_watermark(str(cursor), name)
+        return changed
+
+    def applicant_ids(self, body):
+        """Applicant IDs a webhook body refers to"""
+        if 'applicant_id' in body or 'applicant_ids' in body:
+            metrics.increment('webhook_events_total', kind='applicant')
+            ids = body.get('applicant_ids') or [body.get('applicant_id')]
+            return {key for key in (applicant_key(value) for value in ids) if key is not None}
+        if 'webhook' in body and 'changedTablesById' not in body:
+            metrics.increment('webhook_events_total', kind='ping')
+            return applicant_ids_for_records(self._fetch_payloads(body['webhook']['id']))
+        metrics.increment('webhook_events_total', kind='payload')
+        changed = {}
+        for payload in body.get('payloads', [body]):
+            for table, record_ids in payload_record_ids(payload).items():
+                changed.setdefault(table, []).extend(record_ids)
+        return applicant_ids_for_records(changed)
+
+    def handle(self, body):
+        """Queue the applicants a body refers to, returning their IDs"""
+        applicant_ids = self.applicant_ids(body)
+        for applicant_id in applicant_ids:
+            self.debouncer.submit(applicant_id)
+        return applicant_ids
+
+def make_handler(receiver):
+    class WebhookHandler(BaseHTTPRequestHandler):
+        def _reply(self, status, body):
+            data = json.dumps(body).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            self._reply(200, {"status": "ok", "idle": receiver.debouncer.idle()})
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+            if not receiver.verify(body, self.headers.get('X-Airtable-Content-MAC')):
+                self._reply(401, {"error": "invalid signature"})
+                return
+            try:
+                applicant_ids = receiver.handle(json.loads(body or b'{}'))
+            except (ValueError, KeyError, TypeError) as e:
+                self._reply(400, {"error": f"unrecognised webhook body: {e}"})
+                return
+            except Exception as e:
+                print(f"Webhook handling failed: {e}")
+                self._reply(500, {"error": str(e)})
+                return
+            self._reply(200, {"queued": sorted(applicant_ids)})
+
+        def log_message(self, format, *args):
+            pass
+    return WebhookHandler
+
+def serve(host=WEBHOOK_HOST, port=WEBHOOK_PORT):
+    receiver = WebhookReceiver()
+    server = ThreadingHTTPServer((host, port), make_handler(receiver))
+    print(f"Listening for Airtable webhooks on http://{host}:{port}/ "
+          f"(debounce {receiver.debouncer.delay}s, max {receiver.debouncer.max_delay}s)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print("Finishing queued applicants...")
+        receiver.debouncer.drain()
+        receiver.debouncer.close()
+        if _scheduler is not None:
+            _scheduler.print_report()
+
+def synthetic_submissions(fake_api, applicant_ids, fake_base_id='appBENCHMARK'):
+    """Webhook payloads for the three form submissions of each applicant in a fake base"""
+    bodies = []
+    for table_name in (PERSONAL_TABLE, EXPERIENCE_TABLE, SALARY_TABLE):
+        table = fake_api.table(fake_base_id, table_name)
+        for applicant_id in applicant_ids:
+            record_ids = [record_id for record_id, record in table.records.items()
+                          if record['fields'].get('Applicant ID') == str(applicant_id)]
+            bodies.append({"payloads": [{
+                "actionMetadata": {"source": "forms"},
+                "changedTablesById": {table_name: {"createdRecordsById": {record_id: {} for record_id in record_ids}}}
+            }]})
+    return bodies
+
+def replay(bodies, receiver, interval=0.0):
+    """Feed recorded webhook bodies through receiver, then wait for processing to finish"""
+    started = time.perf_counter()
+    for body in bodies:
+        receiver.handle(body.get('body', body) if isinstance(body, dict) else body)
+        if interval:
+            time.sleep(interval)
+    receiver.debouncer.drain()
+    return time.perf_counter() - started
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Process applicants from Airtable webhook events")
+    commands = parser.add_subparsers(dest='command', required=True)
+    serve_parser = commands.add_parser('serve', help="run the webhook receiver")
+    serve_parser.add_argument('--host', default=WEBHOOK_HOST)
+    serve_parser.add_argument('--port', type=int, default=WEBHOOK_PORT)
+    replay_parser = commands.add_parser('replay', help="feed recorded webhook bodies through the pipeline")
+    replay_parser.add_argument('path', nargs='?', help="JSON lines file of webhook bodies")
+    replay_parser.add_argument('--interval', type=float, default=0.0, help="seconds between deliveries")
+    replay_parser.add_argument('--debounce', type=float, default=WEBHOOK_DEBOUNCE_SECONDS)
+    replay_parser.add_argument('--fake-base', type=int,
+                               help="replay against an in-process fake base of this many applicants")
+    replay_parser.add_argument('--submissions', type=int, default=10,
+                               help="with --fake-base and no file, synthesise this many three-form submissions")
+    args = parser.parse_args()
+
+    if args.command == 'serve':
+        serve(args.host, args.port)
+        sys.exit(0)
+
+    restore = None
+    if args.fake_base:
+        from benchmark_pipeline import generate_applicants, install_fakes
+        from fake_airtable import FakeApi
+        from fake_gemini import FakeGenAI
+        fake_api = FakeApi(rate_limit=0)
+        generate_applicants(fake_api, args.fake_base)
+        restore = install_fakes(fake_api, FakeGenAI())
+        # install_fakes patches the imported webhook_receiver module; this script runs as __main__
+        api, base_id = fake_api, 'appBENCHMARK'
+    if args.path:
+        with open(args.path) as f:
+            bodies = [json.loads(line) for line in f if line.strip()]
+    elif args.fake_base:
+        bodies = synthetic_submissions(fake_api, range(args.fake_base - args.submissions + 1, args.fake_base + 1))
+    else:
+        parser.error("give a file of webhook bodies, or --fake-base")
+
+    receiver = WebhookReceiver(Debouncer(process_applicant, delay=args.debounce, max_delay=args.debounce * 6))
+    try:
+        elapsed = replay(bodies, receiver, args.interval)
+    finally:
+        receiver.debouncer.close()
+        if restore:
+            restore()
+    processed = sum(count for (name, labels), count in metrics.counters.items() if name == 'webhook_applicants_total')
+    latency = metrics.histograms.get(('webhook_event_to_result_seconds', ()))
+    print(f"Replayed {len(bodies)} deliveries in {elapsed:.2f}s: {processed} applicant runs")
+    if _scheduler is not None:
+        _scheduler.print_report()
+    if latency and latency.count:
+        print(f"Event to result: mean {latency.sum / latency.count:.2f}s (debounce {args.debounce}s)")
+    if args.fake_base:
+        print(f"Airtable calls: {sum(fake_api.calls.values())} for a base of {args.fake_base} applicants "
+              f"({dict(fake_api.calls)})")